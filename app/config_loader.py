@@ -1,6 +1,6 @@
 #app/config_loader.py
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 import yaml
 from app.logger import get_logger
 
@@ -10,6 +10,27 @@ class ConfigError(Exception):
     """Исключение при ошибках конфигурации."""
     pass
 
+# Числовые параметры источника: ключ → (только целое, минимум, минимум допустим)
+SOURCE_NUMBERS = {
+    "scan_workers": (True, 1, True),     # потоков обхода подпапок
+    "interval_sec": (False, 0, False),   # интервал демона
+    "wait_sec": (False, 0, True),        # сколько ждать недоступный источник
+    "timeout_sec": (False, 0, True),     # крайний срок синхронизации (0 — без срока)
+}
+
+
+def source_number_error(source: Dict[str, Any], key: str) -> Optional[str]:
+    """Чем должен быть параметр key источника, если его значение неверно; None — нет или верно."""
+    if key not in source:
+        return None
+    integer, minimum, inclusive = SOURCE_NUMBERS[key]
+    value = source[key]
+    kinds = (int,) if integer else (int, float)
+    if isinstance(value, kinds) and not isinstance(value, bool) and (value >= minimum if inclusive else value > minimum):
+        return None
+    kind = "целым числом" if integer else "числом"
+    return f"{kind} {'≥' if inclusive else '>'} {minimum}"
+
 def load_config(config_path: str = "") -> dict:
     """
     🔹 Загружает YAML-конфиг.
@@ -77,6 +98,10 @@ def validate_config(config: Dict[str, Any]) -> None:
             raise ConfigError(f"❌ 'buro' у источника #{idx} должен быть строкой.")
         if not isinstance(source.get("mounted", True), bool):
             raise ConfigError(f"❌ 'mounted' у источника #{idx} должен быть bool.")
+        for key in SOURCE_NUMBERS:
+            error = source_number_error(source, key)
+            if error:
+                raise ConfigError(f"❌ '{key}' у источника #{idx} должен быть {error}.")
 
     destination = config.get("destination")
     if not isinstance(destination, dict):
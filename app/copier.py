@@ -0,0 +1,437 @@
+# app/copier.py
+import errno
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Callable, List, Optional
+from app import hashing
+from app.database import delete_transfer, get_writer, load_transfer, save_transfer
+from app.logger import get_logger
+
+logger = get_logger()
+
+FICLONE = 0x40049409  # ioctl reflink (Linux: btrfs, XFS, ...)
+
+# Ошибки, при которых бэкенд просто не поддерживается для этой пары файлов — пробуем следующий
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EOPNOTSUPP,
+                getattr(errno, "ENOTSUP", errno.EOPNOTSUPP), errno.ENOTTY, errno.EPERM}
+
+COPY_BACKENDS = ["reflink", "copy_file_range", "sendfile", "readinto"]
+BUFFER_SIZE = 1024 * 1024
+
+DEFAULT_COPY = {
+    "backend": "auto",
+    "buffer_kb": BUFFER_SIZE // 1024,
+    "resume_mb": 64,        # файлы от этого размера передаются с докачкой (0 — выкл.)
+    "checkpoint_mb": 32,    # как часто сохранять контрольную точку
+}
+
+
+def copy_settings(config: dict) -> dict:
+    """
+    🔹 Способ копирования из секции `copy` конфига.
+    - backend: auto | reflink | copy_file_range | sendfile | readinto
+    - buffer_kb: размер буфера для readinto
+    - resume_mb: порог размера для докачиваемой передачи (0 — выключить)
+    - checkpoint_mb: шаг контрольных точек докачки
+    """
+    section = (config or {}).get("copy") or {}
+    settings = dict(DEFAULT_COPY)
+    backend = str(section.get("backend", "auto")).lower()
+    if backend != "auto" and backend not in COPY_BACKENDS:
+        logger.warning(f"⚠️ Неизвестный способ копирования '{backend}' — используется auto")
+        backend = "auto"
+    settings["backend"] = backend
+    for key, minimum in (("buffer_kb", 1), ("resume_mb", 0), ("checkpoint_mb", 1)):
+        value = section.get(key)
+        if isinstance(value, int) and not isinstance(value, bool) and value >= minimum:
+            settings[key] = value
+    return settings
+
+
+def available_backends() -> List[str]:
+    """Бэкенды, которые в принципе есть на этой платформе."""
+    backends = []
+    if sys.platform.startswith("linux"):
+        backends.append("reflink")
+    if hasattr(os, "copy_file_range"):
+        backends.append("copy_file_range")
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        backends.append("sendfile")
+    backends.append("readinto")
+    return backends
+
+
+def _copy_reflink(fsrc, fdst, size: int, buffer_size: int) -> None:
+    import fcntl
+    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_file_range(fsrc, fdst, size: int, buffer_size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+
+def _copy_sendfile(fsrc, fdst, size: int, buffer_size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, min(size - offset, 1 << 30))
+        if sent == 0:
+            break
+        offset += sent
+
+
+def _copy_readinto(fsrc, fdst, size: int, buffer_size: int) -> None:
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    while True:
+        n = fsrc.readinto(buf)
+        if not n:
+            break
+        fdst.write(view[:n])
+
+
+_BACKEND_FUNCS = {
+    "reflink": _copy_reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _copy_sendfile,
+    "readinto": _copy_readinto,
+}
+
+
+def temp_path(dest_file: Path, suffix: str = "tmp") -> Path:
+    """Временный файл рядом с dest_file: запись идёт в него, затем атомарная подмена."""
+    return dest_file.with_name(f".{dest_file.name}.{suffix}")
+
+
+def _discard(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+def copy_file(
+    src_file: Path,
+    dest_file: Path,
+    backend: Optional[str] = None,
+    buffer_size: int = BUFFER_SIZE
+) -> str:
+    """
+    🔹 Копирует файл (как shutil.copy2) самым быстрым доступным способом.
+    - auto: reflink → copy_file_range → sendfile → readinto (копирование в ядре, где можно)
+    - Неподдерживаемый для этой пары файлов способ молча заменяется следующим
+    - Запись во временный файл и атомарная подмена: обрыв не оставляет обрезанный файл,
+      а жёсткие ссылки (дедупликация) на старое содержимое не затрагиваются
+    - Возвращает имя использованного бэкенда
+    """
+    backend = backend or "auto"
+    order = COPY_BACKENDS if backend == "auto" else [backend, "readinto"]
+    order = [b for b in order if b in available_backends()]
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    size = src_file.stat().st_size
+    tmp_file = temp_path(dest_file)
+    try:
+        with src_file.open("rb") as fsrc, tmp_file.open("wb") as fdst:
+            for name in order:
+                try:
+                    _BACKEND_FUNCS[name](fsrc, fdst, size, buffer_size)
+                    break
+                except OSError as e:
+                    if name == "readinto" or e.errno not in _UNSUPPORTED:
+                        raise
+                    # Откатываемся к началу и пробуем следующий способ
+                    fsrc.seek(0)
+                    fdst.seek(0)
+                    fdst.truncate()
+        shutil.copystat(src_file, tmp_file)
+        os.replace(tmp_file, dest_file)
+    except BaseException:
+        _discard(tmp_file)
+        raise
+    return name
+
+
+def same_device(a: Path, b: Path) -> bool:
+    """True, если папки a и b на одном томе (можно копировать средствами ядра/reflink)."""
+    try:
+        return a.stat().st_dev == b.stat().st_dev
+    except OSError:
+        return False
+
+
+def copy_with_hash(
+    src_file: Path,
+    dest_files: List[Path],
+    algorithm: Optional[str] = None,
+    on_read: Optional[Callable[[int], None]] = None,
+    known_hash: Optional[str] = None,
+    settings: Optional[dict] = None
+) -> Optional[str]:
+    """
+    🔹 Копирует файл сразу во все папки назначения за одно чтение источника.
+    - Хеш неизвестен: источник читается потоком в переиспользуемый буфер, каждый блок
+      идёт в хеш и во все назначения на разных томах
+    - Хеш известен (из кэша) и назначение на другом томе одно: источник копируется
+      средствами ядра (copy_file); таких назначений несколько — тем же потоковым
+      чтением, что и без хеша (источник по сети читается один раз на все)
+    - Назначения на том же томе, что и первое, реплицируются из него через copy_file
+      (reflink/copy_file_range — без повторного чтения по сети)
+    - Файлы от copy.resume_mb передаются с контрольными точками (resumable_copy)
+    - Метаданные (mtime, права) переносятся как в shutil.copy2
+    - Запись через временные файлы с атомарной подменой
+    - Ошибка записи в одно назначение не мешает остальным
+    - settings — настройки копирования запуска (copy_settings), по умолчанию DEFAULT_COPY
+    - Возвращает хеш содержимого (None — источник не прочитан)
+    """
+    settings = settings or DEFAULT_COPY
+    backend, buffer_size = settings["backend"], settings["buffer_kb"] * 1024
+    if not dest_files:
+        return known_hash
+    for dest_file in dest_files:
+        try:
+            # 🔹 Гарантируем, что родительская папка создана
+            dest_file.parent.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            logger.error(f"❌ Не удалось создать папку {dest_file.parent}: {e}")
+
+    primary, rest = dest_files[0], dest_files[1:]
+    replicas = [d for d in rest if same_device(primary.parent, d.parent)]
+    streamed = [primary] + [d for d in rest if d not in replicas]
+
+    threshold = resume_threshold(settings)
+    if threshold is not None and _file_size(src_file) >= threshold:
+        # 🔹 Большой файл: докачиваемая передача в первое назначение, остальные — из него
+        file_hash = resumable_copy(src_file, primary, algorithm, on_read, settings)
+        if file_hash is None:
+            return None
+        written = [primary]
+        replicas = rest
+    elif known_hash and len(streamed) == 1:
+        written = []
+        try:
+            if on_read:
+                on_read(src_file.stat().st_size)
+            copy_file(src_file, primary, backend, buffer_size)
+            written.append(primary)
+        except PermissionError as e:
+            logger.error(f"❌ Нет прав на запись: {primary} | {e}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка копирования {src_file} → {primary}: {e}")
+        file_hash = known_hash
+    else:
+        file_hash, written = _stream_with_hash(src_file, streamed, algorithm, on_read, buffer_size)
+        if file_hash is None:
+            return None
+
+    # 🔹 Реплики на том же томе — из первого назначения (или из источника, если оно не записалось)
+    origin = primary if primary in written else src_file
+    for dest_file in replicas:
+        try:
+            copy_file(origin, dest_file, backend, buffer_size)
+        except PermissionError as e:
+            logger.error(f"❌ Нет прав на запись: {dest_file} | {e}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка копирования {origin} → {dest_file}: {e}")
+    return file_hash
+
+
+def _stream_with_hash(
+    src_file: Path,
+    dest_files: List[Path],
+    algorithm: Optional[str],
+    on_read: Optional[Callable[[int], None]],
+    buffer_size: int = BUFFER_SIZE
+):
+    """Одно чтение источника: хеш + запись во все dest_files. Возвращает (хеш, записанные)."""
+    hasher = hashing.new_hasher(algorithm)
+    outputs = []
+    for dest_file in dest_files:
+        try:
+            outputs.append((dest_file, temp_path(dest_file).open("wb")))
+        except PermissionError as e:
+            logger.error(f"❌ Нет прав на запись: {dest_file} | {e}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка копирования {src_file} → {dest_file}: {e}")
+
+    buf = bytearray(max(buffer_size, hashing.CHUNK_SIZE))
+    view = memoryview(buf)
+    try:
+        with src_file.open("rb") as src:
+            while True:
+                n = src.readinto(buf)
+                if not n:
+                    break
+                chunk = view[:n]
+                hasher.update(chunk)
+                if on_read:
+                    on_read(n)
+                for dest_file, out in list(outputs):
+                    try:
+                        out.write(chunk)
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка записи {dest_file}: {e}")
+                        out.close()
+                        _discard(temp_path(dest_file))
+                        outputs.remove((dest_file, out))
+    except (PermissionError, OSError) as e:
+        logger.warning(f"⚠️ Нет доступа к файлу (возможно заблокирован): {src_file} | {e}")
+        for dest_file, out in outputs:
+            out.close()
+            _discard(temp_path(dest_file))
+        return None, []
+
+    written = []
+    for dest_file, out in outputs:
+        tmp_file = temp_path(dest_file)
+        try:
+            out.close()
+            shutil.copystat(src_file, tmp_file)
+            os.replace(tmp_file, dest_file)
+            written.append(dest_file)
+        except Exception as e:
+            logger.error(f"❌ Ошибка завершения копирования {dest_file}: {e}")
+            _discard(tmp_file)
+    return hasher.hexdigest(), written
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def resume_threshold(settings: Optional[dict] = None) -> Optional[int]:
+    """Порог размера (байт) для докачиваемой передачи; None — выключено."""
+    resume_mb = (settings or DEFAULT_COPY)["resume_mb"]
+    return resume_mb * 1024 * 1024 if resume_mb > 0 else None
+
+
+def _restore_offset(
+    tmp_file: Path, checkpoint: Optional[dict], src_file: Path, st, algorithm: str, buffer_size: int
+):
+    """
+    Проверяет контрольную точку и восстанавливает состояние хеша по уже записанной части.
+    Состояние hashlib не сериализуется, поэтому начало файла перечитывается
+    с локального диска и сверяется с сохранённым хешем префикса.
+    Возвращает (смещение, hasher); (0, новый hasher) — начинать заново.
+    """
+    hasher = hashing.new_hasher(algorithm)
+    if not checkpoint or checkpoint["offset"] <= 0:
+        return 0, hasher
+    same_source = (
+        checkpoint["src_path"] == str(src_file) and checkpoint["algo"] == algorithm and
+        checkpoint["src_size"] == st.st_size and checkpoint["src_mtime"] == float(st.st_mtime)
+    )
+    offset = checkpoint["offset"]
+    if not same_source or _file_size(tmp_file) < offset:
+        return 0, hasher
+    try:
+        with tmp_file.open("rb") as f:
+            remaining = offset
+            while remaining:
+                chunk = f.read(min(buffer_size, remaining))
+                if not chunk:
+                    return 0, hashing.new_hasher(algorithm)
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    except OSError:
+        return 0, hashing.new_hasher(algorithm)
+    if hasher.copy().hexdigest() != checkpoint["prefix_hash"]:
+        return 0, hashing.new_hasher(algorithm)
+    return offset, hasher
+
+
+def resumable_copy(
+    src_file: Path,
+    dest_file: Path,
+    algorithm: Optional[str] = None,
+    on_read: Optional[Callable[[int], None]] = None,
+    settings: Optional[dict] = None
+) -> Optional[str]:
+    """
+    🔹 Передача большого файла с докачкой.
+    - Данные пишутся в .имя.part; каждые checkpoint_mb записанное сбрасывается на диск
+      (fsync), а смещение и хеш префикса сохраняются в БД (таблица transfers)
+    - Обрыв (ПК ушёл из сети) оставляет .part и контрольную точку: следующий запуск
+      или фоновый мониторинг продолжает с последнего проверенного смещения
+    - Источник изменился (mtime/size) или префикс не сошёлся — передача начинается заново
+    - По завершении — атомарная подмена dest_file; возвращает хеш или None
+    """
+    settings = settings or DEFAULT_COPY
+    algorithm = algorithm or hashing.LEGACY_ALGORITHM
+    buffer_size = settings["buffer_kb"] * 1024
+    checkpoint_bytes = settings["checkpoint_mb"] * 1024 * 1024
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = temp_path(dest_file, "part")
+    dest_key = str(dest_file)
+    try:
+        st = src_file.stat()
+    except OSError as e:
+        logger.warning(f"⚠️ Нет доступа к файлу (возможно заблокирован): {src_file} | {e}")
+        return None
+
+    offset, hasher = _restore_offset(tmp_file, load_transfer(dest_key), src_file, st, algorithm, buffer_size)
+    if offset:
+        logger.info(
+            f"⏯️ Докачка {dest_file.name} с {offset / (1024 * 1024):.1f} "
+            f"из {st.st_size / (1024 * 1024):.1f} МБ"
+        )
+
+    def checkpoint(out, position: int) -> None:
+        out.flush()
+        os.fsync(out.fileno())
+        save_transfer(dest_key, str(src_file), float(st.st_mtime), int(st.st_size),
+                      algorithm, position, hasher.copy().hexdigest())
+
+    buf = bytearray(max(buffer_size, hashing.CHUNK_SIZE))
+    view = memoryview(buf)
+    position = offset
+    with tmp_file.open("r+b" if offset else "wb") as out:
+        out.seek(offset)
+        out.truncate()
+        last_checkpoint = offset
+        try:
+            with src_file.open("rb") as src:
+                src.seek(offset)
+                while True:
+                    n = src.readinto(buf)
+                    if not n:
+                        break
+                    chunk = view[:n]
+                    out.write(chunk)
+                    hasher.update(chunk)
+                    position += n
+                    if on_read:
+                        on_read(n)
+                    if position - last_checkpoint >= checkpoint_bytes:
+                        checkpoint(out, position)
+                        last_checkpoint = position
+        except OSError as e:
+            # Источник пропал: фиксируем, что успели записать, — продолжим с этого места
+            if position > last_checkpoint:
+                try:
+                    checkpoint(out, position)
+                except OSError:
+                    pass
+            get_writer().flush()
+            logger.warning(
+                f"⚠️ Передача {src_file} прервана на {position / (1024 * 1024):.1f} МБ "
+                f"(будет продолжена): {e}"
+            )
+            return None
+
+    try:
+        shutil.copystat(src_file, tmp_file)
+        os.replace(tmp_file, dest_file)
+    except OSError as e:
+        logger.error(f"❌ Ошибка завершения копирования {dest_file}: {e}")
+        return None
+    delete_transfer(dest_key)
+    return hasher.hexdigest()
@@ -0,0 +1,259 @@
+# app/daemon.py
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.config_loader import load_config
+from app.database import (
+    SourceCache, close_writer, flush_writes, load_dest_state, writer_session, writer_stats
+)
+from app.journal import RunChanges, finish_run, mark_reported, prune_journal, start_run
+from app.logger import get_logger
+from app.metrics import SourceMetrics, run_snapshot
+from app.scheduler import LOCAL_HOST, host_of
+from app.sync_core import SyncRun, prepare_stats_by_bureau
+from app.watcher import watch_tree
+
+logger = get_logger()
+
+DEFAULT_DAEMON = {
+    "interval_sec": 300,            # базовый интервал пересканирования источника
+    "max_interval_sec": 3600,       # без изменений интервал растёт до этого значения
+    "report_every_min": 60,         # отчёт по расписанию (0 — только по запросу)
+    "report_trigger": "report.now", # появление этого файла — отчёт немедленно
+    "watch": True,                  # уведомления inotify (Linux), где доступны
+}
+
+# Пауза после события inotify: пачку изменений (копирование папки) обрабатываем одним проходом
+WATCH_DEBOUNCE = 5.0
+TICK = 1.0
+
+
+def daemon_settings(config: dict) -> dict:
+    """Настройки демона из секции `daemon` конфига."""
+    settings = dict(DEFAULT_DAEMON)
+    section = (config or {}).get("daemon") or {}
+    for key, default in DEFAULT_DAEMON.items():
+        value = section.get(key)
+        if isinstance(default, bool):
+            if isinstance(value, bool):
+                settings[key] = value
+        elif isinstance(default, str):
+            if isinstance(value, str) and value:
+                settings[key] = value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+            settings[key] = value
+    return settings
+
+
+def trigger_path(config_path: str, settings: dict) -> Path:
+    """Файл-запрос отчёта (относительный путь — рядом с конфигом)."""
+    path = Path(settings["report_trigger"])
+    return path if path.is_absolute() else Path(config_path).resolve().parent / path
+
+
+def request_report(config_path: str = "config.yaml") -> Path:
+    """Просит работающий демон сформировать отчёт (создаёт файл-запрос)."""
+    path = trigger_path(config_path, daemon_settings(load_config(config_path)))
+    path.touch()
+    return path
+
+
+class SourceState:
+    """Источник под наблюдением демона: расписание, тёплые кэши, уведомления."""
+
+    def __init__(self, source: dict, interval: float, metrics: SourceMetrics):
+        self.source = source
+        self.name = source["name"]
+        self.base_interval = float(source.get("interval_sec", interval))
+        self.interval = self.base_interval
+        self.next_due = 0.0          # первый проход — сразу
+        self.running = False
+        self.source_cache: Optional[SourceCache] = None
+        self.dest_cache: Optional[Dict[str, Dict]] = None
+        self.watcher = None
+        self.metrics = metrics       # проходы с прошлого отчёта
+
+    def schedule(self, changed: bool, max_interval: float) -> None:
+        """Адаптивный опрос: есть изменения — базовый интервал, нет — интервал растёт вдвое."""
+        if changed:
+            self.interval = self.base_interval
+        else:
+            self.interval = min(self.interval * 2, max(max_interval, self.base_interval))
+        self.next_due = time.monotonic() + self.interval
+
+    def close(self) -> None:
+        if self.watcher:
+            self.watcher.close()
+        if self.source_cache:
+            self.source_cache.close()
+
+
+class Daemon:
+    """
+    🔹 Долгоживущий режим синхронизации (`python cli.py daemon`).
+    - Соединение с БД (DbWriter) и кэши источников держатся в памяти между проходами
+    - Каждый источник пересканируется по своему интервалу; без изменений интервал
+      растёт до max_interval_sec, при изменениях — возвращается к базовому
+    - На Linux изменения в локальных/смонтированных папках приходят через inotify
+      и запускают проход сразу (с паузой WATCH_DEBOUNCE)
+    - Отчёт — по расписанию (report_every_min) и по запросу (`python cli.py report`)
+    - Каждый проход — отдельный запуск в журнале изменений; отчёт читает из change_log
+      проходы, завершённые с прошлого отчёта, и отмечает их отчётом в sync_runs
+    - Лимиты одновременных источников и скорости — планировщик SyncRun демона
+    """
+
+    def __init__(self, config_path: str = "config.yaml", dry_run: bool = False):
+        self.config_path = config_path
+        config = load_config(config_path)
+        self.sync_run = SyncRun(config, dry_run)
+        sources = self.sync_run.sources
+        self.settings = daemon_settings(config)
+        self.trigger = trigger_path(config_path, self.settings)
+        self.states = [
+            SourceState(src, self.settings["interval_sec"], self.sync_run.new_metrics(src["name"]))
+            for src in sources
+        ]
+        self._stop = threading.Event()
+        self._done: "queue.Queue" = queue.Queue()
+        self._runs: List[int] = []  # завершённые проходы (запуски в журнале) с прошлого отчёта
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._last_report = time.monotonic()
+        self._db_before = writer_stats()
+
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+    def _start_watch(self, state: SourceState) -> None:
+        if self.settings["watch"] and state.watcher is None and host_of(state.source["path"]) == LOCAL_HOST:
+            state.watcher = watch_tree(Path(state.source["path"]))
+            if state.watcher:
+                logger.info(f"👁️ Уведомления об изменениях включены: {state.name}")
+
+    def _sync(self, state: SourceState) -> None:
+        """Проход по одному источнику в пуле; результат — в очередь главного цикла."""
+        try:
+            if not self.sync_run.prober.is_accessible(state.source["path"]):
+                self._done.put((state, None, None, None, None))
+                return
+            if state.source_cache is None:
+                state.source_cache = SourceCache(state.name)
+                state.dest_cache = load_dest_state(state.name)
+                self._start_watch(state)
+            metrics = self.sync_run.new_metrics(state.name)
+            run_id = start_run("daemon", self.sync_run.dry_run)
+            _, result, stats = self.sync_run.sync_source(
+                state.source, state.source_cache, state.dest_cache, metrics, run_id
+            )
+            finish_run(run_id)
+            self._done.put((state, result, stats, metrics, run_id))
+        except Exception as e:
+            logger.error(f"❌ Ошибка прохода {state.name}: {e}")
+            self._done.put((state, None, None, None, None))
+
+    def _collect(self, state: SourceState, result, stats, metrics, run_id) -> None:
+        state.running = False
+        if metrics is not None:
+            state.metrics.merge(metrics)
+        if run_id is not None:
+            self._runs.append(run_id)
+        if result is None:
+            state.schedule(False, self.settings["max_interval_sec"])
+            logger.info(f"⏸️ {state.name}: недоступен, повтор через {state.interval:.0f} с")
+            return
+        total = self._stats.setdefault(state.name, {})
+        for key, value in stats.items():
+            total[key] = total.get(key, 0) + value
+        state.schedule(bool(result), self.settings["max_interval_sec"])
+        logger.info(f"✅ {state.name}: изменений {result}, следующий проход через {state.interval:.0f} с")
+
+    def report(self) -> None:
+        """Отчёт по изменениям проходов, завершённых с прошлого отчёта (читаются из журнала)."""
+        sources = [state.source for state in self.states]
+        stats_by_bureau = prepare_stats_by_bureau(self._stats, sources)
+        flush_writes()
+        db_after = writer_stats()
+        metrics = run_snapshot(
+            {state.name: state.metrics for state in self.states},
+            time.monotonic() - self._last_report,
+            {key: max(0, db_after[key] - self._db_before.get(key, 0)) for key in db_after}
+        )
+        try:
+            report_path = self.sync_run.save_report(stats_by_bureau, RunChanges(self._runs), metrics)
+            mark_reported(self._runs, str(report_path))
+            logger.info(f"📄 ОТЧЁТ СФОРМИРОВАН: {report_path}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка при генерации отчёта: {e}")
+        self._runs = []
+        self._stats = {}
+        for state in self.states:
+            state.metrics = self.sync_run.new_metrics(state.name)
+        self._last_report = time.monotonic()
+        self._db_before = db_after
+
+    def _report_due(self) -> bool:
+        if self.trigger.exists():
+            try:
+                self.trigger.unlink()
+            except OSError:
+                pass
+            logger.info("📨 Отчёт по запросу")
+            return True
+        every = self.settings["report_every_min"] * 60
+        return every > 0 and time.monotonic() - self._last_report >= every
+
+    def run(self) -> None:
+        with writer_session():
+            self._run()
+        close_writer()
+        logger.info("✅ Демон остановлен.")
+
+    def _run(self) -> None:
+        prune_journal(self.sync_run.stages["journal"]["keep_days"])
+        logger.info(f"🛰️ Демон запущен: источников {len(self.states)}, запрос отчёта — {self.trigger}")
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self.stop)
+            except (ValueError, OSError):
+                pass  # не главный поток / ОС без сигнала
+
+        max_workers = max(1, min(self.sync_run.scheduler.limits()["max_sources"], len(self.states)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="daemon") as executor:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                for state in self.states:
+                    if state.running:
+                        continue
+                    if state.watcher and state.watcher.consume():
+                        state.next_due = min(state.next_due, now + WATCH_DEBOUNCE)
+                    if state.next_due <= now:
+                        state.running = True
+                        executor.submit(self._sync, state)
+
+                if self._report_due():
+                    self.report()
+
+                waits = [s.next_due - now for s in self.states if not s.running]
+                timeout = max(0.05, min([TICK] + waits))
+                try:
+                    self._collect(*self._done.get(timeout=timeout))
+                except queue.Empty:
+                    pass
+
+            logger.info("🛑 Остановка демона: дожидаемся текущих проходов...")
+            executor.shutdown(wait=True)
+        while not self._done.empty():
+            self._collect(*self._done.get_nowait())
+
+        if self._runs:
+            self.report()
+        for state in self.states:
+            state.close()
+        self.sync_run.scheduler.log_summary()
+
+
+def run_daemon(config_path: str = "config.yaml", dry_run: bool = False) -> None:
+    Daemon(config_path, dry_run).run()
@@ -1,8 +1,14 @@
 # app/database.py
+import queue
 import sqlite3
 import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from app.hashing import LEGACY_ALGORITHM
+from app.index import CompactIndex
 from app.logger import get_logger
 
 logger = get_logger()
@@ -11,6 +17,19 @@ DB_FILE = Path("synced_db.sqlite3")
 _save_lock = threading.Lock()
 _initialized = False  # Защита от повторной инициализации
 
+# Источники с большим числом записей читаются из БД пачками, а не целиком
+LAZY_CACHE_THRESHOLD = 200_000
+LOOKUP_BATCH_SIZE = 500  # < SQLITE_MAX_VARIABLE_NUMBER (999) с учётом source_name
+
+# Колонки записи кэша (quick — быстрый отпечаток начало/середина/конец); записи без algo посчитаны до его появления — sha256
+_RECORD_COLUMNS = f"hash, mtime, size, COALESCE(algo, '{LEGACY_ALGORITHM}'), quick"
+
+# Таблица кэша → (колонка ключа, ограничение уникальности для upsert)
+_CACHE_TABLES = {
+    "file_cache": ("file_key", "source_name, file_key"),
+    "dest_cache": ("dest_path", "dest_path"),
+}
+
 def init_db():
     """Создаёт таблицу, если не существует. Вызывается один раз."""
     global _initialized
@@ -39,6 +58,94 @@ def init_db():
                 )
             """)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_source ON file_cache(source_name)")
+            # Отпечатки файлов в папке назначения (что мы записали в прошлый раз)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dest_cache (
+                    dest_path TEXT PRIMARY KEY,
+                    source_name TEXT NOT NULL,
+                    hash TEXT,
+                    mtime REAL,
+                    size INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dest_source ON dest_cache(source_name)")
+            # Поиск одинакового содержимого среди уже записанных файлов (дедупликация)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dest_content ON dest_cache(size, hash)")
+            # Контрольные суммы блоков файлов назначения (поблочное обновление больших файлов)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS block_sums (
+                    dest_path TEXT PRIMARY KEY,
+                    block_size INTEGER NOT NULL,
+                    mtime REAL,
+                    size INTEGER,
+                    sums BLOB
+                )
+            """)
+            # Незавершённые передачи больших файлов: докачка с последней контрольной точки
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transfers (
+                    dest_path TEXT PRIMARY KEY,
+                    src_path TEXT NOT NULL,
+                    src_mtime REAL,
+                    src_size INTEGER,
+                    algo TEXT,
+                    offset INTEGER NOT NULL,
+                    prefix_hash TEXT,
+                    updated REAL
+                )
+            """)
+            # Содержимое папок источника: папка с неизменным mtime не перечитывается
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dir_cache (
+                    source_name TEXT NOT NULL,
+                    rel_dir TEXT NOT NULL,
+                    mtime REAL,
+                    entries INTEGER,
+                    listing TEXT,
+                    PRIMARY KEY (source_name, rel_dir)
+                )
+            """)
+            # Счётчик сканирований источника (полное пересканирование каждые N запусков)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_runs (
+                    source_name TEXT PRIMARY KEY,
+                    scans INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Запуски синхронизации (разовые и проходы демона) и их журнал изменений
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    dry_run INTEGER NOT NULL DEFAULT 0,
+                    started REAL NOT NULL,
+                    finished REAL,
+                    report_path TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS change_log (
+                    id INTEGER PRIMARY KEY,
+                    run_id INTEGER NOT NULL,
+                    source_name TEXT NOT NULL,
+                    rel_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    size INTEGER,
+                    mtime REAL,
+                    old_size INTEGER,
+                    old_mtime REAL,
+                    logged REAL
+                )
+            """)
+            # Отчёт читает изменения запуска по источнику в порядке вывода; история файла — по пути
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_change_run ON change_log(run_id, source_name, status, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_change_path ON change_log(source_name, rel_path)")
+            # Миграции: алгоритм хеша (старые записи — sha256) и быстрый отпечаток
+            for table in _CACHE_TABLES:
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column in ("algo", "quick"):
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
             conn.commit()
             conn.close()
             logger.info(f"✅ База данных инициализирована: {DB_FILE}")
@@ -46,72 +153,670 @@ def init_db():
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации базы: {e}")
 
-def load_state() -> Dict[str, Dict[str, Dict[str, Any]]]:
-    """Загружает состояние из SQLite."""
-    if not DB_FILE.exists():
-        logger.info("ℹ️ База данных не найдена. Создаём новую...")
-        init_db()
-        return {}
+_reader: Optional[sqlite3.Connection] = None
+_reader_lock = threading.Lock()
+
+
+def _read(sql: str, params: tuple = ()) -> List[tuple]:
+    """
+    Запрос на общем соединении чтения процесса (а не новое соединение на каждый файл).
+    В WAL-режиме чтение не ждёт транзакцию писателя; запросы короткие (по индексу),
+    потоки конвейера выполняют их по очереди.
+    """
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            init_db()
+            _reader = sqlite3.connect(DB_FILE, check_same_thread=False)
+        return _reader.execute(sql, params).fetchall()
+
+
+def _close_reader() -> None:
+    global _reader
+    with _reader_lock:
+        if _reader is not None:
+            _reader.close()
+            _reader = None
 
+
+# Записи назначения, ещё не закоммиченные писателем: (size, algo) → {dest_path: запись}.
+# Дедупликация видит файлы, записанные раньше в этом же запуске (их строки ещё в очереди)
+_unsaved_content: Dict[Tuple[int, str], Dict[str, Dict[str, Any]]] = {}
+_unsaved_lock = threading.Lock()
+
+
+def note_dest_content(dest_path: str, record: Dict[str, Any]) -> None:
+    """Запоминает только что записанный файл назначения до коммита его строки dest_cache."""
+    with _unsaved_lock:
+        _unsaved_content.setdefault((record["size"], record["algo"]), {})[dest_path] = record
+
+
+def _forget_content(items: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Строки закоммичены (или удалены): записи из памяти больше не нужны."""
+    with _unsaved_lock:
+        for dest_path, record in items:
+            key = (record.get("size"), record.get("algo"))
+            bucket = _unsaved_content.get(key)
+            # Запись могла смениться более новой, пока эта ждала коммита — её не трогаем
+            if bucket is not None and bucket.get(dest_path) is record:
+                del bucket[dest_path]
+                if not bucket:
+                    del _unsaved_content[key]
+
+
+def _forget_paths(dest_paths: Iterable[str]) -> None:
+    dest_paths = set(dest_paths)
+    with _unsaved_lock:
+        for key in list(_unsaved_content):
+            bucket = _unsaved_content[key]
+            for dest_path in dest_paths & bucket.keys():
+                del bucket[dest_path]
+            if not bucket:
+                del _unsaved_content[key]
+
+
+def _record(row) -> Dict[str, Any]:
+    """Строка (hash, mtime, size, algo, quick) → запись кэша."""
+    return {"hash": row[0], "mtime": row[1], "size": row[2], "algo": row[3], "quick": row[4]}
+
+
+def count_source_rows(source_name: str) -> int:
+    """Возвращает число записей кэша источника (по индексу idx_source)."""
+    init_db()
     try:
         conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT source_name, file_key, hash, mtime, size FROM file_cache")
-        rows = cursor.fetchall()
+        count = conn.execute(
+            "SELECT COUNT(*) FROM file_cache WHERE source_name = ?", (source_name,)
+        ).fetchone()[0]
         conn.close()
+        return count
+    except Exception as e:
+        logger.error(f"❌ Ошибка подсчёта записей '{source_name}': {e}")
+        return 0
+
+
+def load_source_state(source_name: str) -> CompactIndex:
+    """Загружает кэш только одного источника (по индексу idx_source) в компактный индекс."""
+    init_db()
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.execute(
+            f"SELECT file_key, {_RECORD_COLUMNS} FROM file_cache WHERE source_name = ?",
+            (source_name,)
+        )
+        data = CompactIndex.from_rows(cursor)
+        conn.close()
+        logger.info(f"✅ Кэш источника загружен: {source_name} | Записей: {len(data)}")
+        return data
+    except Exception as e:
+        logger.error(f"❌ Ошибка при загрузке кэша '{source_name}': {e}")
+        return CompactIndex()
 
-        data = {}
-        for row in rows:
-            source = row["source_name"]
-            if source not in data:
-                data[source] = {}
-            data[source][row["file_key"]] = {
-                "hash": row["hash"],
-                "mtime": row["mtime"],
-                "size": row["size"]
-            }
-
-        logger.info(f"✅ Состояние загружено из SQLite | Записей: {len(rows)}")
+
+class SourceCache:
+    """
+    🔹 Кэш одного источника с единым интерфейсом для двух режимов:
+    - eager: все записи источника загружаются в память сразу (CompactIndex)
+    - lazy: записи запрашиваются из БД пачками по ключам (prefetch),
+      в памяти держится только текущая пачка
+    """
+
+    def __init__(self, source_name: str, lazy: Optional[bool] = None):
+        self.source_name = source_name
+        if lazy is None:
+            lazy = count_source_rows(source_name) > LAZY_CACHE_THRESHOLD
+        self.lazy = lazy
+        self._conn: Optional[sqlite3.Connection] = None
+        if lazy:
+            init_db()
+            # Демон держит кэш между запусками, а синхронизирует его из разных потоков пула
+            self._conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+            self._entries: Dict[str, Dict[str, Any]] = {}
+            self._prefetched: set = set()  # ключи текущей пачки: нет в _entries — нет и в БД
+            logger.info(f"ℹ️ Кэш '{source_name}' читается пачками (lazy)")
+        else:
+            self._entries = load_source_state(source_name)
+
+    def prefetch(self, keys: Iterable[str]) -> None:
+        """Подгружает пачку ключей, вытесняя предыдущую (только в lazy-режиме)."""
+        if not self.lazy:
+            return
+        keys = list(keys)
+        self._entries = {}
+        self._prefetched = set(keys)
+        for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            chunk = keys[i:i + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            try:
+                cursor = self._conn.execute(
+                    f"SELECT file_key, {_RECORD_COLUMNS} FROM file_cache "
+                    f"WHERE source_name = ? AND file_key IN ({placeholders})",
+                    [self.source_name, *chunk]
+                )
+                for row in cursor:
+                    self._entries[row[0]] = _record(row[1:])
+            except Exception as e:
+                logger.error(f"❌ Ошибка чтения пачки кэша '{self.source_name}': {e}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Запись по ключу; в lazy-режиме запрос к БД — только для ключа вне текущей пачки."""
+        entry = self._entries.get(key)
+        if entry is not None or not self.lazy or key in self._prefetched:
+            return entry
+        try:
+            row = self._conn.execute(
+                f"SELECT {_RECORD_COLUMNS} FROM file_cache WHERE source_name = ? AND file_key = ?",
+                (self.source_name, key)
+            ).fetchone()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения кэша '{self.source_name}': {e}")
+            return None
+        return _record(row) if row else None
+
+    def __setitem__(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+
+    def __delitem__(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.lazy:
+            self._prefetched.discard(key)
+
+    def keys(self) -> Iterator[str]:
+        """Все ключи источника; в lazy-режиме — потоково через курсор."""
+        if not self.lazy:
+            yield from list(self._entries.keys())
+            return
+        cursor = self._conn.execute(
+            "SELECT file_key FROM file_cache WHERE source_name = ?", (self.source_name,)
+        )
+        for (file_key,) in cursor:
+            yield file_key
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def save_changes(
+    source_name: str,
+    upserts: Dict[str, Dict[str, Any]],
+    deletes: Iterable[str] = ()
+) -> None:
+    """
+    Сохраняет только изменения кэша одного источника.
+    - upserts: новые/изменённые записи (file_key → hash/mtime/size)
+    - deletes: ключи удалённых файлов
+    Одна транзакция на источник — другие источники не затрагиваются.
+    """
+    _apply_changes(
+        "file_cache", source_name, upserts, deletes,
+        "✅ Кэш '{source}' обновлён | Изменено: {upserts} | Удалено: {deletes}"
+    )
+
+
+def load_dest_state(source_name: str) -> CompactIndex:
+    """Загружает отпечатки файлов назначения для одного источника в компактный индекс."""
+    init_db()
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.execute(
+            f"SELECT dest_path, {_RECORD_COLUMNS} FROM dest_cache WHERE source_name = ?",
+            (source_name,)
+        )
+        data = CompactIndex.from_rows(cursor)
+        conn.close()
+        logger.info(f"✅ Отпечатки назначения загружены: {source_name} | Записей: {len(data)}")
         return data
+    except Exception as e:
+        logger.error(f"❌ Ошибка при загрузке отпечатков назначения: {e}")
+        return CompactIndex()
+
+
+def save_dest_changes(
+    source_name: str,
+    upserts: Dict[str, Dict[str, Any]],
+    deletes: Iterable[str] = ()
+) -> None:
+    """
+    Сохраняет только изменившиеся отпечатки файлов назначения одного источника.
+    Записи, отмеченные note_dest_content, забываются после коммита их строк.
+    """
+    deletes = list(deletes)
+    _forget_paths(deletes)
+    committed = list(upserts.items())
+    _apply_changes(
+        "dest_cache", source_name, upserts, deletes,
+        "✅ Отпечатки назначения '{source}' обновлены | Изменено: {upserts} | Удалено: {deletes}",
+        on_commit=lambda: _forget_content(committed)
+    )
+
 
+def _apply_changes(
+    table: str,
+    source_name: str,
+    upserts: Dict[str, Dict[str, Any]],
+    deletes: Iterable[str],
+    message: str,
+    on_commit: Optional[Callable[[], None]] = None
+) -> None:
+    """Ставит upsert/delete для таблицы кэша в очередь фонового писателя."""
+    deletes = list(deletes)
+    if not upserts and not deletes:
+        return
+    key_column, conflict = _CACHE_TABLES[table]
+    get_writer().submit_group([
+        (
+            f"DELETE FROM {table} WHERE source_name = ? AND {key_column} = ?",
+            [(source_name, key) for key in deletes]
+        ),
+        (f"""
+            INSERT INTO {table} (source_name, {key_column}, hash, mtime, size, algo, quick)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT({conflict})
+            DO UPDATE SET hash = excluded.hash, mtime = excluded.mtime, size = excluded.size,
+                          algo = excluded.algo, quick = excluded.quick
+        """, [
+            (source_name, key, info.get("hash"), info.get("mtime"), info.get("size"),
+             info.get("algo", LEGACY_ALGORITHM), info.get("quick"))
+            for key, info in upserts.items()
+        ]),
+    ], on_commit)
+    logger.debug(message.format(source=source_name, upserts=len(upserts), deletes=len(deletes)))
+
+
+def load_dir_state(source_name: str) -> Dict[str, Tuple[float, int, str]]:
+    """Сохранённое содержимое папок источника: rel_dir → (mtime, entries, listing)."""
+    init_db()
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.execute(
+            "SELECT rel_dir, mtime, entries, listing FROM dir_cache WHERE source_name = ?", (source_name,)
+        )
+        data = {row[0]: (row[1], row[2], row[3]) for row in cursor}
+        conn.close()
+        return data
     except Exception as e:
-        logger.error(f"❌ Ошибка при загрузке состояния: {e}")
+        logger.error(f"❌ Ошибка загрузки кэша папок '{source_name}': {e}")
         return {}
 
-def save_state(data: Dict[str, Dict[str, Any]]) -> None:
-    """Сохраняет состояние в SQLite с использованием executemany."""
-    with _save_lock:
+
+def save_dir_changes(
+    source_name: str,
+    upserts: Dict[str, Tuple[float, int, str]],
+    deletes: Iterable[str] = ()
+) -> None:
+    """Ставит в очередь изменения кэша папок одного источника."""
+    get_writer().submit_group([
+        (
+            "DELETE FROM dir_cache WHERE source_name = ? AND rel_dir = ?",
+            [(source_name, rel_dir) for rel_dir in deletes]
+        ),
+        (
+            "INSERT OR REPLACE INTO dir_cache (source_name, rel_dir, mtime, entries, listing) VALUES (?, ?, ?, ?, ?)",
+            [(source_name, rel_dir, *record) for rel_dir, record in upserts.items()]
+        ),
+    ])
+
+
+def next_scan_number(source_name: str) -> int:
+    """Номер текущего сканирования источника (1, 2, ...); счётчик хранится в БД."""
+    try:
+        rows = _read("SELECT scans FROM scan_runs WHERE source_name = ?", (source_name,))
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения счётчика сканирований '{source_name}': {e}")
+        rows = []
+    row = rows[0] if rows else None
+    number = (row[0] if row else 0) + 1
+    get_writer().submit(
+        "INSERT OR REPLACE INTO scan_runs (source_name, scans) VALUES (?, ?)", [(source_name, number)]
+    )
+    return number
+
+
+def find_content(size: int, algo: str, file_hash: Optional[str] = None, limit: int = 8) -> List[Dict[str, Any]]:
+    """
+    Ищет уже записанные в назначение файлы того же размера (и хеша, если задан).
+    Без хеша — дешёвая проверка «есть ли вообще кандидаты» перед хешированием источника.
+    Сначала — записи этого запуска, ещё не закоммиченные писателем (note_dest_content).
+    """
+    with _unsaved_lock:
+        unsaved = [
+            dict(record, dest_path=dest_path)
+            for dest_path, record in _unsaved_content.get((size, algo), {}).items()
+            if not file_hash or record["hash"] == file_hash
+        ][:limit]
+    if len(unsaved) >= limit:
+        return unsaved
+    query = f"SELECT dest_path, {_RECORD_COLUMNS} FROM dest_cache WHERE size = ? AND algo = ?"
+    params: list = [size, algo]
+    if file_hash:
+        query += " AND hash = ?"
+        params.append(file_hash)
+    try:
+        rows = _read(query + " LIMIT ?", (*params, limit))
+    except Exception as e:
+        logger.error(f"❌ Ошибка поиска содержимого в индексе: {e}")
+        return unsaved
+    seen = {record["dest_path"] for record in unsaved}
+    return unsaved + [dict(_record(row[1:]), dest_path=row[0]) for row in rows if row[0] not in seen][:limit - len(unsaved)]
+
+
+def load_block_sums(dest_path: str) -> Optional[Dict[str, Any]]:
+    """Суммы блоков файла назначения (block_size, mtime, size, sums) или None."""
+    try:
+        rows = _read("SELECT block_size, mtime, size, sums FROM block_sums WHERE dest_path = ?", (dest_path,))
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения сумм блоков {dest_path}: {e}")
+        return None
+    row = rows[0] if rows else None
+    if not row:
+        return None
+    return {"block_size": row[0], "mtime": row[1], "size": row[2], "sums": row[3]}
+
+
+def save_block_sums(dest_path: str, block_size: int, mtime: float, size: int, sums: bytes) -> None:
+    """Ставит в очередь запись сумм блоков файла назначения."""
+    get_writer().submit("""
+        INSERT OR REPLACE INTO block_sums (dest_path, block_size, mtime, size, sums)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(dest_path, block_size, mtime, size, sqlite3.Binary(sums))])
+
+
+def load_transfer(dest_path: str) -> Optional[Dict[str, Any]]:
+    """Контрольная точка незавершённой передачи в dest_path или None."""
+    try:
+        rows = _read(
+            "SELECT src_path, src_mtime, src_size, algo, offset, prefix_hash FROM transfers WHERE dest_path = ?",
+            (dest_path,)
+        )
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения контрольной точки {dest_path}: {e}")
+        return None
+    row = rows[0] if rows else None
+    if not row:
+        return None
+    keys = ("src_path", "src_mtime", "src_size", "algo", "offset", "prefix_hash")
+    return dict(zip(keys, row))
+
+
+def save_transfer(
+    dest_path: str, src_path: str, src_mtime: float, src_size: int,
+    algo: str, offset: int, prefix_hash: str
+) -> None:
+    """Ставит в очередь запись контрольной точки передачи."""
+    get_writer().submit("""
+        INSERT OR REPLACE INTO transfers
+            (dest_path, src_path, src_mtime, src_size, algo, offset, prefix_hash, updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(dest_path, src_path, src_mtime, src_size, algo, offset, prefix_hash, time.time())])
+
+
+def delete_transfer(dest_path: str) -> None:
+    """Передача завершена — контрольная точка больше не нужна."""
+    get_writer().submit("DELETE FROM transfers WHERE dest_path = ?", [(dest_path,)])
+
+
+def load_transfers(src_root: str) -> List[Dict[str, Any]]:
+    """Незавершённые передачи из папки источника src_root (dest_path, src_path, src_mtime, src_size)."""
+    try:
+        rows = _read(
+            "SELECT dest_path, src_path, src_mtime, src_size FROM transfers WHERE substr(src_path, 1, ?) = ?",
+            (len(src_root), src_root)
+        )
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения контрольных точек {src_root}: {e}")
+        return []
+    return [dict(zip(("dest_path", "src_path", "src_mtime", "src_size"), row)) for row in rows]
+
+
+def load_block_sum_paths(dest_root: str) -> List[str]:
+    """Файлы назначения в папке dest_root, для которых сохранены суммы блоков."""
+    try:
+        rows = _read("SELECT dest_path FROM block_sums WHERE substr(dest_path, 1, ?) = ?", (len(dest_root), dest_root))
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения сумм блоков {dest_root}: {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+def delete_dest_state(block_sums: Iterable[str] = (), transfers: Iterable[str] = ()) -> None:
+    """Удаляет суммы блоков и контрольные точки файлов назначения, которых больше нет в источнике."""
+    get_writer().submit_group([
+        ("DELETE FROM block_sums WHERE dest_path = ?", [(path,) for path in block_sums]),
+        ("DELETE FROM transfers WHERE dest_path = ?", [(path,) for path in transfers]),
+    ])
+
+
+class DbWriter:
+    """
+    🔹 Единственный писатель в SQLite.
+    - Держит одно долгоживущее WAL-соединение в собственном потоке
+    - Принимает изменения от всех потоков синхронизации через очередь (submit не блокирует)
+    - Коммитит пачками: по числу строк (batch_rows) или по времени (max_delay)
+    - Каждое поставленное изменение (submit/submit_group) выполняется в своей точке
+      сохранения: при ошибке откатывается оно целиком, остальная пачка коммитится.
+      Изменения источника ставятся одной группой — в БД они попадают все или никакие
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_file: Optional[Path] = None, batch_rows: int = 5000, max_delay: float = 1.0):
+        self.db_file = db_file or DB_FILE
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        # Счётчики для метрик запуска: строк, коммитов и время работы с SQLite
+        self.rows = 0
+        self.commits = 0
+        self.busy_sec = 0.0
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, sql: str, rows: List[tuple], on_commit: Optional[Callable[[], None]] = None) -> None:
+        """
+        Ставит executemany(sql, rows) в очередь на запись.
+        on_commit() вызывается в потоке писателя, когда пачка с этими строками закоммичена
+        (или отброшена из-за ошибки).
+        """
+        self.submit_group([(sql, rows)], on_commit)
+
+    def submit_group(
+        self, statements: List[Tuple[str, List[tuple]]], on_commit: Optional[Callable[[], None]] = None
+    ) -> None:
+        """Ставит несколько executemany одной группой: ошибка в любом откатывает всю группу."""
+        statements = [(sql, rows) for sql, rows in statements if rows]
+        if statements:
+            self._queue.put((statements, None, on_commit))
+
+    def insert(self, sql: str, params: tuple, timeout: Optional[float] = None) -> int:
+        """
+        Выполняет INSERT в потоке писателя и возвращает rowid новой строки.
+        Строка попадает в текущую пачку (коммит — как у submit), зато вызывающий
+        не ждёт блокировку SQLite, пока писатель держит транзакцию.
+        """
+        result: Future = Future()
+        self._queue.put(([(sql, [params])], result, None))
+        return result.result(timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока всё поставленное в очередь будет закоммичено."""
+        if not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Коммитит остаток очереди и останавливает поток писателя."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        pending_rows = 0
+        batch_started = 0.0
+        callbacks: List[Callable[[], None]] = []
+        stop = False
+        while not stop:
+            timeout = None if not pending_rows else max(0.0, batch_started + self.max_delay - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            waiters = []
+            if item is self._STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None:
+                statements, result, on_commit = item
+                if on_commit is not None:
+                    callbacks.append(on_commit)
+                started = time.perf_counter()
+                try:
+                    rowid, rows = self._apply(conn, statements)
+                    if not pending_rows:
+                        batch_started = time.monotonic()
+                    pending_rows += rows
+                    self.rows += rows
+                    if result is not None:
+                        result.set_result(rowid)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка записи в БД (изменение отменено): {e}")
+                    if result is not None:
+                        result.set_exception(e)
+                    if not pending_rows and conn.in_transaction:
+                        conn.rollback()  # в пачке ничего нет — не держим блокировку записи
+                self.busy_sec += time.perf_counter() - started
+
+            due = pending_rows and (
+                pending_rows >= self.batch_rows
+                or time.monotonic() - batch_started >= self.max_delay
+            )
+            if pending_rows and (due or waiters or stop):
+                started = time.perf_counter()
+                try:
+                    conn.commit()
+                    self.commits += 1
+                    logger.debug(f"💾 Закоммичено строк: {pending_rows}")
+                except Exception as e:
+                    logger.error(f"❌ Ошибка коммита в БД: {e}")
+                    conn.rollback()
+                self.busy_sec += time.perf_counter() - started
+                pending_rows = 0
+            if callbacks and not pending_rows:
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка обработчика коммита: {e}")
+                callbacks = []
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, statements: List[Tuple[str, List[tuple]]]) -> Tuple[Optional[int], int]:
+        """Выполняет группу в точке сохранения; при ошибке откатывает её. Возвращает (rowid, строк)."""
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT change")
+        rowid, count = None, 0
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-
-            # Подготавливаем данные
-            all_data = []
-            for source_name, files in data.items():
-                cursor.execute("DELETE FROM file_cache WHERE source_name = ?", (source_name,))
-                for file_key, info in files.items():
-                    all_data.append((
-                        source_name,
-                        file_key,
-                        info.get("hash"),
-                        info.get("mtime"),
-                        info.get("size")
-                    ))
-
-            # Массовая вставка
-            cursor.executemany("""
-                INSERT INTO file_cache (source_name, file_key, hash, mtime, size)
-                VALUES (?, ?, ?, ?, ?)
-            """, all_data)
+            for sql, rows in statements:
+                if len(rows) == 1:
+                    rowid = conn.execute(sql, rows[0]).lastrowid
+                else:
+                    conn.executemany(sql, rows)
+                count += len(rows)
+        except Exception:
+            conn.execute("ROLLBACK TO change")
+            conn.execute("RELEASE change")
+            raise
+        conn.execute("RELEASE change")
+        return rowid, count
 
-            conn.commit()
-            conn.close()
 
-            # Логируем размер
-            if DB_FILE.exists():
-                size_mb = DB_FILE.stat().st_size / (1024 * 1024)
-                logger.info(f"✅ Состояние сохранено | Размер БД: {size_mb:.2f} MB")
+_writer: Optional[DbWriter] = None
+_writer_lock = threading.Lock()
+_writer_users = 0         # запуски, работающие с писателем сейчас (writer_session)
+_close_requested = False  # close_writer() во время чужого запуска — закрыть после последнего
 
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения состояния: {e}")
\ No newline at end of file
+
+def get_writer() -> DbWriter:
+    """Возвращает общий писатель (создаёт при первом обращении или после close)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.closed:
+            init_db()
+            _writer = DbWriter()
+        return _writer
+
+
+def flush_writes(timeout: Optional[float] = None) -> None:
+    """Дожидается записи всех накопленных изменений."""
+    if _writer is not None and not _writer.closed:
+        _writer.flush(timeout)
+
+
+def writer_stats() -> Dict[str, float]:
+    """Счётчики общего писателя с момента его создания: строк, коммитов, секунд работы с SQLite."""
+    writer = _writer
+    if writer is None:
+        return {"rows": 0, "commits": 0, "busy_sec": 0.0}
+    return {"rows": writer.rows, "commits": writer.commits, "busy_sec": writer.busy_sec}
+
+
+@contextmanager
+def writer_session() -> Iterator[DbWriter]:
+    """
+    🔹 Запуск, работающий с общим писателем.
+    Пока открыта хотя бы одна сессия, close_writer() другого запуска в том же
+    процессе не закрывает писатель, а откладывает закрытие до выхода последней.
+    """
+    global _writer_users
+    with _writer_lock:
+        _writer_users += 1
+    try:
+        yield get_writer()
+    finally:
+        with _writer_lock:
+            _writer_users -= 1
+            deferred = _writer_users == 0 and _close_requested
+        if deferred:
+            close_writer()
+
+
+def close_writer(timeout: Optional[float] = None) -> None:
+    """
+    Сбрасывает очередь и закрывает соединение писателя. Вызывается в конце запуска.
+    Если писателем ещё пользуются другие запуски (writer_session) — только сбрасывает
+    очередь, а закрытие выполнит выход последней сессии.
+    """
+    global _writer, _close_requested
+    with _writer_lock:
+        shared = _writer_users > 0
+        _close_requested = shared
+        if not shared:
+            writer, _writer = _writer, None
+    if shared:
+        flush_writes(timeout)
+        return
+    _close_reader()
+    if writer is not None:
+        writer.close(timeout)
+        if DB_FILE.exists():
+            size_mb = DB_FILE.stat().st_size / (1024 * 1024)
+            logger.info(f"✅ Состояние сохранено | Размер БД: {size_mb:.2f} MB")
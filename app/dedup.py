@@ -0,0 +1,109 @@
+# app/dedup.py
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+from app.copier import copy_file, same_device
+from app.database import find_content
+from app.hashing import get_file_info
+from app.logger import get_logger
+
+logger = get_logger()
+
+DEDUP_MODES = ["hardlink", "reflink"]
+
+DEFAULT_DEDUP = {
+    "enabled": False,
+    "mode": "hardlink",    # hardlink | reflink
+    "min_size_kb": 64,     # мелкие файлы копировать дешевле, чем искать дубликат
+}
+
+
+def dedup_settings(config: dict) -> dict:
+    """Настройки дедупликации из секции `dedup` конфига."""
+    section = (config or {}).get("dedup") or {}
+    settings = dict(DEFAULT_DEDUP)
+    if isinstance(section.get("enabled"), bool):
+        settings["enabled"] = section["enabled"]
+    mode = str(section.get("mode", settings["mode"])).lower()
+    if mode in DEDUP_MODES:
+        settings["mode"] = mode
+    else:
+        logger.warning(f"⚠️ Неизвестный режим дедупликации '{mode}' — используется hardlink")
+    min_size = section.get("min_size_kb")
+    if isinstance(min_size, int) and not isinstance(min_size, bool) and min_size >= 0:
+        settings["min_size_kb"] = min_size
+    return settings
+
+
+def dedup_min_size(settings: Optional[dict] = None) -> Optional[int]:
+    """Минимальный размер файла (байт) для дедупликации; None — режим выключен."""
+    settings = settings or DEFAULT_DEDUP
+    if not settings["enabled"]:
+        return None
+    return settings["min_size_kb"] * 1024
+
+
+def has_candidates(size: int, algo: str) -> bool:
+    """Есть ли в назначении файлы такого размера (иначе хешировать источник заранее незачем)."""
+    return bool(find_content(size, algo, limit=1))
+
+
+def find_existing(size: int, algo: str, file_hash: str) -> Optional[Path]:
+    """
+    Уже записанный файл назначения с тем же содержимым.
+    Файл должен быть не изменён с момента записи (mtime/size как в индексе).
+    """
+    for record in find_content(size, algo, file_hash):
+        path = Path(record["dest_path"])
+        if get_file_info(path) == (record["mtime"], record["size"]):
+            return path
+    return None
+
+
+def _link(origin: Path, dest_file: Path) -> bool:
+    """Жёсткая ссылка на origin вместо dest_file (подмена атомарная). False — не получилось."""
+    tmp_file = dest_file.with_name(f".{dest_file.name}.dedup-tmp")
+    try:
+        os.link(origin, tmp_file)
+        os.replace(tmp_file, dest_file)
+        return True
+    except OSError as e:
+        # Другой том, лимит ссылок (EMLINK), ФС без жёстких ссылок — обычное копирование
+        logger.debug(f"⚠️ Не удалось создать ссылку {dest_file} → {origin}: {e}")
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def materialize(origin: Path, dest_files: List[Path], mode: str = "hardlink") -> Tuple[List[Path], int]:
+    """
+    🔹 Создаёт dest_files из уже существующего файла назначения с тем же содержимым.
+    - hardlink: жёсткая ссылка (место на диске не расходуется)
+    - reflink: клон блоков (btrfs/XFS); где не поддерживается — локальная копия
+    - Файлы на другом томе или без поддержки ссылок копируются с origin локально —
+      источник по сети повторно не читается
+    - Возвращает (созданные файлы, сэкономлено байт)
+    """
+    size = origin.stat().st_size
+    done: List[Path] = []
+    saved = 0
+    for dest_file in dest_files:
+        try:
+            dest_file.parent.mkdir(parents=True, exist_ok=True)
+            if dest_file == origin:
+                done.append(dest_file)
+                continue
+            shared = same_device(origin.parent, dest_file.parent)
+            if shared and mode == "hardlink" and _link(origin, dest_file):
+                saved += size
+            elif shared and mode == "reflink":
+                if copy_file(origin, dest_file, "reflink") == "reflink":
+                    saved += size
+            else:
+                copy_file(origin, dest_file)
+            done.append(dest_file)
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания {dest_file} из {origin}: {e}")
+    return done, saved
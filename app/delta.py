@@ -0,0 +1,242 @@
+# app/delta.py
+import hashlib
+import os
+import shutil
+import struct
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from app import hashing
+from app.copier import copy_file
+from app.database import load_block_sums, save_block_sums
+from app.logger import get_logger
+
+logger = get_logger()
+
+ADLER_MOD = 65521
+STRONG_SIZE = 16
+_SIG = struct.Struct(f"<I{STRONG_SIZE}s")  # слабая (adler32) + сильная (blake2b-128) сумма блока
+
+DEFAULT_DELTA = {
+    "enabled": True,
+    "threshold_mb": 64,   # файлы от этого размера обновляются поблочно
+    "block_kb": 128,      # размер блока
+}
+
+
+def delta_settings(config: dict) -> dict:
+    """Настройки поблочного обновления из секции `delta` конфига."""
+    section = (config or {}).get("delta") or {}
+    settings = dict(DEFAULT_DELTA)
+    for key, default in DEFAULT_DELTA.items():
+        value = section.get(key)
+        if isinstance(value, type(default)) and (isinstance(value, bool) or value > 0):
+            settings[key] = value
+    return settings
+
+
+def delta_threshold(settings: Optional[dict] = None) -> Optional[int]:
+    """Порог размера (байт) для поблочного режима; None — режим выключен."""
+    settings = settings or DEFAULT_DELTA
+    if not settings["enabled"]:
+        return None
+    return settings["threshold_mb"] * 1024 * 1024
+
+
+def block_size(settings: Optional[dict] = None) -> int:
+    return (settings or DEFAULT_DELTA)["block_kb"] * 1024
+
+
+def _strong(block) -> bytes:
+    return hashlib.blake2b(block, digest_size=STRONG_SIZE).digest()
+
+
+def block_signatures(path: Path, size: int) -> bytes:
+    """Контрольные суммы всех блоков файла (упакованный массив weak+strong)."""
+    parts = []
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(size), b""):
+            parts.append(_SIG.pack(zlib.adler32(block), _strong(block)))
+    return b"".join(parts)
+
+
+def _signature_map(signatures: bytes) -> Dict[int, List[Tuple[int, bytes]]]:
+    """weak → [(номер блока, strong)] для быстрого поиска совпадений."""
+    index: Dict[int, List[Tuple[int, bytes]]] = {}
+    for i, (weak, strong) in enumerate(_SIG.iter_unpack(signatures)):
+        index.setdefault(weak, []).append((i, strong))
+    return index
+
+
+def delta_sync(
+    src_file: Path,
+    dest_file: Path,
+    signatures: bytes,
+    size: int,
+    algorithm: Optional[str] = None,
+    on_read: Optional[Callable[[int], None]] = None
+) -> Optional[Tuple[str, bytes, int, int]]:
+    """
+    🔹 Обновляет dest_file до содержимого src_file, переписывая только изменённые участки.
+    - Источник читается один раз: попутно считается хеш всего файла
+    - Совпадающие блоки ищутся парой сумм: скользящая adler32 + blake2b;
+      сдвиг содержимого (вставка/удаление) находится скользящим окном
+    - Новый файл собирается во временной копии назначения (reflink, где возможно)
+      и атомарно подменяет старый (os.replace). Без reflink копия — это полная
+      перезапись файла на локальном диске, и она входит в записанные байты
+    - Возвращает (хеш, новые суммы блоков, изменено байт, всего записано байт)
+      или None при ошибке
+    """
+    index = _signature_map(signatures)
+    hasher = hashing.new_hasher(algorithm)
+    tmp_file = dest_file.with_name(f".{dest_file.name}.delta-tmp")
+    written = 0    # изменённые участки
+    # Побайтовый поиск сдвига дорог в Python: ограничиваем его, дальше — только по границам блоков
+    roll_budget = 4 * size + (src_file.stat().st_size // 100)
+
+    try:
+        base_size = dest_file.stat().st_size
+        copied = 0 if copy_file(dest_file, tmp_file) == "reflink" else base_size
+        with src_file.open("rb") as src, dest_file.open("rb") as old, tmp_file.open("r+b") as out:
+            buf = bytearray()
+            eof = False
+            pos = 0        # начало окна в buf
+            out_pos = 0    # позиция записи в новом файле
+            literal = bytearray()
+            weak = None
+
+            def fill(need: int) -> None:
+                nonlocal eof
+                while not eof and len(buf) - pos < need:
+                    chunk = src.read(max(hashing.CHUNK_SIZE, size))
+                    if not chunk:
+                        eof = True
+                        break
+                    hasher.update(chunk)
+                    if on_read:
+                        on_read(len(chunk))
+                    buf.extend(chunk)
+
+            def flush_literal() -> None:
+                nonlocal out_pos, written
+                if literal:
+                    out.seek(out_pos)
+                    out.write(literal)
+                    out_pos += len(literal)
+                    written += len(literal)
+                    literal.clear()
+
+            while True:
+                fill(size)
+                window = memoryview(buf)[pos:pos + size]
+                if len(window) < size:
+                    literal.extend(window)
+                    window.release()
+                    break
+                if weak is None:
+                    weak = zlib.adler32(window)
+                match = None
+                for idx, strong in index.get(weak, ()):
+                    if strong == _strong(window):
+                        match = idx
+                        break
+                if match is not None:
+                    window.release()
+                    flush_literal()
+                    if match * size != out_pos:
+                        # Блок есть в старом файле, но на другом месте — переносим
+                        old.seek(match * size)
+                        out.seek(out_pos)
+                        out.write(old.read(size))
+                        written += size
+                    out_pos += size
+                    pos += size
+                    weak = None
+                elif roll_budget > 0:
+                    # Сдвигаем окно на байт: скользящая adler32
+                    window.release()
+                    roll_budget -= 1
+                    fill(size + 1)
+                    out_byte = buf[pos]
+                    literal.append(out_byte)
+                    pos += 1
+                    if len(buf) - pos >= size:
+                        in_byte = buf[pos + size - 1]
+                        a = ((weak & 0xFFFF) - out_byte + in_byte) % ADLER_MOD
+                        b = ((weak >> 16) - size * out_byte - 1 + a) % ADLER_MOD
+                        weak = (b << 16) | a
+                    else:
+                        weak = None
+                else:
+                    # Бюджет исчерпан: весь блок — как есть, дальше только по границам блоков
+                    literal.extend(window)
+                    window.release()
+                    pos += size
+                    weak = None
+
+                # Не держим в памяти уже обработанное
+                if pos >= 4 * max(hashing.CHUNK_SIZE, size):
+                    del buf[:pos]
+                    pos = 0
+                if len(literal) >= 4 * size:
+                    flush_literal()
+
+            flush_literal()
+            out.truncate(out_pos)
+        shutil.copystat(src_file, tmp_file)
+        new_signatures = block_signatures(tmp_file, size)
+        os.replace(tmp_file, dest_file)
+        return hasher.hexdigest(), new_signatures, written, copied + written
+    except Exception as e:
+        logger.error(f"❌ Ошибка поблочного обновления {dest_file}: {e}")
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+        return None
+
+
+def delta_update(
+    src_file: Path,
+    dest_file: Path,
+    dest_info: Tuple[float, int],
+    algorithm: Optional[str] = None,
+    on_read: Optional[Callable[[int], None]] = None,
+    on_write: Optional[Callable[[int], None]] = None,
+    settings: Optional[dict] = None
+) -> Optional[str]:
+    """
+    🔹 Поблочное обновление файла назначения с учётом сохранённых сумм блоков.
+    - Суммы берутся из БД, если они сняты с этой же версии файла (mtime/size),
+      иначе считаются по локальной копии
+    - После обновления новые суммы сохраняются для следующего запуска
+    - on_write(n) получает число реально записанных на диск байт (с копией назначения)
+    - settings — настройки delta запуска (delta_settings)
+    - Возвращает хеш источника или None (тогда вызывающий делает полное копирование)
+    """
+    size = block_size(settings)
+    mtime, file_size = dest_info
+    stored = load_block_sums(str(dest_file))
+    if (stored and stored["block_size"] == size and
+        stored["mtime"] == mtime and stored["size"] == file_size):
+        signatures = stored["sums"]
+    else:
+        try:
+            signatures = block_signatures(dest_file, size)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось прочитать {dest_file} для поблочного обновления: {e}")
+            return None
+
+    result = delta_sync(src_file, dest_file, signatures, size, algorithm, on_read)
+    if not result:
+        return None
+    file_hash, new_signatures, patched, written = result
+    if on_write:
+        on_write(written)
+    new_info = dest_file.stat()
+    save_block_sums(str(dest_file), size, float(new_info.st_mtime), int(new_info.st_size), new_signatures)
+    logger.info(
+        f"🧩 Поблочно обновлён {dest_file.name}: изменено {patched / (1024 * 1024):.1f} "
+        f"из {new_info.st_size / (1024 * 1024):.1f} МБ, записано на диск {written / (1024 * 1024):.1f} МБ"
+    )
+    return file_hash
@@ -1,11 +1,138 @@
 #app/hashing.py
 import hashlib
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from app.logger import get_logger
 
 logger = get_logger()
 
+# Алгоритм, которым посчитаны записи file_cache без явной пометки (до появления колонки algo)
+LEGACY_ALGORITHM = "sha256"
+
+# Доступные алгоритмы хеширования содержимого: имя → фабрика хешера
+HASH_ALGORITHMS: Dict[str, Callable[[], Any]] = {
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),
+}
+try:  # необязательная быстрая некриптографическая функция
+    import xxhash
+    HASH_ALGORITHMS["xxh3_128"] = xxhash.xxh3_128
+except ImportError:
+    xxhash = None
+
+CHUNK_SIZE = 1024 * 1024  # 1 МБ: меньше системных вызовов на больших CAD-файлах
+QUICK_BLOCK = 64 * 1024   # размер каждого из трёх участков быстрого отпечатка
+QUICK_EXACT_SIZE = 3 * QUICK_BLOCK  # до этого размера отпечаток покрывает файл целиком
+
+DEFAULT_HASHING = {
+    "algorithm": LEGACY_ALGORITHM,
+    "chunk_kb": CHUNK_SIZE // 1024,
+    "rehash_per_run": 5000,       # сколько файлов источника перехешировать за запуск при смене алгоритма
+    "quick_fingerprint": False,   # отпечаток вместо полного хеша при промахе по mtime (файлы до QUICK_EXACT_SIZE)
+    "quick_trust_large": False,   # доверять отпечатку и у больших файлов (проверка — плановым --deep-verify)
+}
+
+
+def hashing_settings(config: dict) -> dict:
+    """
+    🔹 Алгоритм, размер блока и быстрый отпечаток из секции `hashing` конфига.
+    Неизвестный или неустановленный алгоритм → предупреждение и sha256.
+    quick_trust_large действует только вместе с quick_fingerprint.
+    """
+    section = (config or {}).get("hashing") or {}
+    settings = dict(DEFAULT_HASHING)
+    name = str(section.get("algorithm", LEGACY_ALGORITHM)).lower()
+    if name not in HASH_ALGORITHMS:
+        logger.warning(f"⚠️ Алгоритм хеширования '{name}' недоступен — используется {LEGACY_ALGORITHM}")
+        name = LEGACY_ALGORITHM
+    settings["algorithm"] = name
+    chunk_kb = section.get("chunk_kb")
+    if isinstance(chunk_kb, int) and not isinstance(chunk_kb, bool) and chunk_kb > 0:
+        settings["chunk_kb"] = chunk_kb
+    rehash_per_run = section.get("rehash_per_run")
+    if isinstance(rehash_per_run, int) and not isinstance(rehash_per_run, bool) and rehash_per_run >= 0:
+        settings["rehash_per_run"] = rehash_per_run
+    for key in ("quick_fingerprint", "quick_trust_large"):
+        if key in section:
+            settings[key] = bool(section[key])
+    return settings
+
+
+def _quick_regions(size: int) -> List[Tuple[int, int]]:
+    """Участки быстрого отпечатка (смещение, длина): файл целиком или начало/середина/конец."""
+    if size <= QUICK_EXACT_SIZE:
+        return [(0, size)]
+    return [(0, QUICK_BLOCK), (size // 2 - QUICK_BLOCK // 2, QUICK_BLOCK), (size - QUICK_BLOCK, QUICK_BLOCK)]
+
+
+def _quick_digest(size: int, parts: List[bytes]) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(size.to_bytes(8, "little"))
+    for part in parts:
+        hasher.update(part)
+    return hasher.hexdigest()
+
+
+class QuickFingerprint:
+    """
+    🔹 Быстрый отпечаток, собираемый попутно при полном чтении файла.
+    Блоки передаются в update() подряд с начала файла, участки отпечатка
+    вырезаются из них по смещению — второго чтения источника нет.
+    hexdigest() совпадает с quick_fingerprint(); None — прочитано не size байт
+    (файл изменился во время чтения).
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.position = 0
+        self._regions = _quick_regions(size)
+        self._parts = [bytearray() for _ in self._regions]
+
+    def update(self, chunk) -> None:
+        start, end = self.position, self.position + len(chunk)
+        for (offset, length), part in zip(self._regions, self._parts):
+            low, high = max(start, offset), min(end, offset + length)
+            if low < high:
+                part += chunk[low - start:high - start]
+        self.position = end
+
+    def hexdigest(self) -> Optional[str]:
+        if self.position != self.size:
+            return None
+        return _quick_digest(self.size, self._parts)
+
+
+def quick_fingerprint(
+    file_path: Path,
+    size: int,
+    on_read: Optional[Callable[[int], None]] = None
+) -> Optional[str]:
+    """
+    🔹 Быстрый отпечаток файла: размер + хеш начала, середины и конца (по QUICK_BLOCK).
+    Три коротких чтения вместо полного — дешёво отличает «файл только тронули»
+    от «файл изменился». Маленькие файлы (до QUICK_EXACT_SIZE) хешируются целиком.
+    Совпадение отпечатков у файла больше QUICK_EXACT_SIZE не доказывает равенство
+    содержимого: правка вне трёх участков с тем же размером его не меняет.
+    """
+    parts = []
+    try:
+        with file_path.open("rb") as f:
+            for offset, length in _quick_regions(size):
+                f.seek(offset)
+                chunk = f.read(length)
+                parts.append(chunk)
+                if on_read:
+                    on_read(len(chunk))
+        return _quick_digest(size, parts)
+    except (PermissionError, OSError) as e:
+        logger.warning(f"⚠️ Нет доступа к файлу (возможно заблокирован): {file_path} | {e}")
+        return None
+
+
+def new_hasher(algorithm: Optional[str] = None):
+    """Новый объект хешера (update/hexdigest) для алгоритма algorithm (по умолчанию sha256)."""
+    return HASH_ALGORITHMS[algorithm or LEGACY_ALGORITHM]()
+
 def get_file_info(file_path: Path) -> Optional[Tuple[float, int]]:
     """
     🔹 Возвращает (mtime, size) файла.
@@ -18,24 +145,37 @@ def get_file_info(file_path: Path) -> Optional[Tuple[float, int]]:
         logger.debug(f"⚠️ Не удалось прочитать метаданные: {file_path} | {e}")
         return None
 
-def calculate_hash(file_path: Path) -> Optional[str]:
+def calculate_hash(
+    file_path: Path,
+    on_read: Optional[Callable[[int], None]] = None,
+    algorithm: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    quick: Optional[QuickFingerprint] = None
+) -> Optional[str]:
     """
-    🔹 Вычисляет SHA-256 хеш файла.
-    - Блоки по 64 КБ
+    🔹 Вычисляет хеш содержимого файла.
+    - Алгоритм: algorithm (по умолчанию sha256; у запуска — из hashing_settings)
+    - Блоки по chunk_size
     - Обработка ошибок доступа
     - Пропускает заблокированные/недоступные файлы
+    - on_read(n) вызывается после каждого блока (ограничение скорости чтения)
+    - quick — быстрый отпечаток, который собирается из тех же блоков
     """
     if not file_path.exists() or not file_path.is_file():
         return None
-    hasher = hashlib.sha256()
+    hasher = new_hasher(algorithm)
     try:
         with file_path.open("rb") as f:
-            for chunk in iter(lambda: f.read(65536), b""):
+            for chunk in iter(lambda: f.read(chunk_size), b""):
                 hasher.update(chunk)
+                if quick is not None:
+                    quick.update(chunk)
+                if on_read:
+                    on_read(len(chunk))
         return hasher.hexdigest()
     except (PermissionError, OSError) as e:
         logger.warning(f"⚠️ Нет доступа к файлу (возможно заблокирован): {file_path} | {e}")
         return None
     except Exception as e:
         logger.error(f"❌ Ошибка чтения файла {file_path}: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,199 @@
+# app/index.py
+import sys
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+HASH_BYTES = 32    # sha256 / blake2b-256; более короткие дайджесты (xxh3_128) — с дополнением
+QUICK_BYTES = 16   # быстрый отпечаток (blake2b-128)
+_EXTRA = 255       # длина-маркер: значение не в hex/длиннее слота — хранится как есть в _extra
+
+# Имена алгоритмов → номер (0 — записи без хеша); общий для всех индексов процесса
+_ALGOS: List[Optional[str]] = [None]
+_ALGO_IDS: Dict[Optional[str], int] = {None: 0}
+_algo_lock = threading.Lock()
+
+
+def _algo_id(name: Optional[str]) -> int:
+    algo_id = _ALGO_IDS.get(name)
+    if algo_id is None:
+        with _algo_lock:
+            algo_id = _ALGO_IDS.get(name)
+            if algo_id is None:
+                algo_id = _ALGO_IDS[name] = len(_ALGOS)
+                _ALGOS.append(name)
+    return algo_id
+
+
+def _split(key: str) -> Tuple[str, str]:
+    """'папка/подпапка/файл' → ('папка/подпапка/', 'файл'); разделитель остаётся в префиксе."""
+    cut = max(key.rfind("/"), key.rfind("\\")) + 1
+    return key[:cut], key[cut:]
+
+
+class CompactIndex:
+    """
+    🔹 Компактный индекс кэша файлов с интерфейсом словаря записей.
+    - Записи хранятся по столбцам: array для mtime/size/алгоритма, bytearray для
+      двоичных дайджестов (32 байта вместо 64-символьной hex-строки)
+    - Ключ делится на папку и имя: строка папки хранится один раз на все её файлы,
+      повторяющиеся имена (Деталь01.stc, Сборка.stc) — интернируются
+    - get() собирает привычный dict {hash, mtime, size, algo, quick} по запросу,
+      поэтому sync_folder работает с индексом так же, как со словарём
+    - Потокобезопасен: читает главный поток, пишет поток стадии состояния
+    """
+
+    __slots__ = ("_dirs", "_mtime", "_size", "_algo", "_hlen", "_qlen",
+                 "_digest", "_quick", "_free", "_extra", "_count", "_lock")
+
+    def __init__(self):
+        self._dirs: Dict[str, Dict[str, int]] = {}   # префикс папки → {имя → номер слота}
+        self._mtime = array("d")
+        self._size = array("q")
+        self._algo = array("B")
+        self._hlen = array("B")                      # длина дайджеста в байтах (или _EXTRA)
+        self._qlen = array("B")                      # длина быстрого отпечатка (0 — нет)
+        self._digest = bytearray()
+        self._quick = bytearray()
+        self._free: List[int] = []
+        self._extra: Dict[int, Tuple[Any, Any]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows) -> "CompactIndex":
+        """Строит индекс из строк (key, hash, mtime, size, algo, quick) — без промежуточного dict."""
+        index = cls()
+        for row in rows:
+            index._put(row[0], row[1], row[2], row[3], row[4], row[5])
+        return index
+
+    # 🔹 Внутреннее хранение
+
+    @staticmethod
+    def _pack(value: Optional[str], width: int) -> Optional[bytes]:
+        if value is None:
+            return b""
+        try:
+            raw = bytes.fromhex(value)
+        except (TypeError, ValueError):
+            return None
+        if len(raw) > width or raw.hex() != value:
+            return None  # не каноничный hex (регистр, длина) — храним строкой
+        return raw
+
+    def _write(self, slot: int, file_hash, mtime, size, algo, quick) -> None:
+        digest = self._pack(file_hash, HASH_BYTES)
+        quick_raw = self._pack(quick, QUICK_BYTES)
+        self._mtime[slot] = float(mtime or 0.0)
+        self._size[slot] = int(size or 0)
+        self._algo[slot] = _algo_id(algo)
+        self._extra.pop(slot, None)
+        if digest is None or quick_raw is None:
+            self._hlen[slot] = self._qlen[slot] = _EXTRA
+            self._extra[slot] = (file_hash, quick)
+            return
+        self._hlen[slot] = len(digest) if file_hash is not None else 0
+        self._qlen[slot] = len(quick_raw)
+        base = slot * HASH_BYTES
+        self._digest[base:base + len(digest)] = digest
+        base = slot * QUICK_BYTES
+        self._quick[base:base + len(quick_raw)] = quick_raw
+
+    def _alloc(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self._mtime)
+        self._mtime.append(0.0)
+        self._size.append(0)
+        self._algo.append(0)
+        self._hlen.append(0)
+        self._qlen.append(0)
+        self._digest.extend(bytes(HASH_BYTES))
+        self._quick.extend(bytes(QUICK_BYTES))
+        return slot
+
+    def _put(self, key: str, file_hash, mtime, size, algo, quick) -> None:
+        prefix, name = _split(key)
+        names = self._dirs.get(prefix)
+        if names is None:
+            names = self._dirs[prefix] = {}
+        slot = names.get(name)
+        if slot is None:
+            slot = self._alloc()
+            self._count += 1
+            name = sys.intern(name)
+        self._write(slot, file_hash, mtime, size, algo, quick)
+        names[name] = slot
+
+    def _read(self, slot: int) -> Dict[str, Any]:
+        hlen, qlen = self._hlen[slot], self._qlen[slot]
+        if hlen == _EXTRA:
+            file_hash, quick = self._extra[slot]
+        else:
+            base = slot * HASH_BYTES
+            file_hash = self._digest[base:base + hlen].hex() if hlen else None
+            base = slot * QUICK_BYTES
+            quick = self._quick[base:base + qlen].hex() if qlen else None
+        return {
+            "hash": file_hash, "mtime": self._mtime[slot], "size": self._size[slot],
+            "algo": _ALGOS[self._algo[slot]], "quick": quick
+        }
+
+    def _slot(self, key: str) -> Optional[int]:
+        prefix, name = _split(key)
+        names = self._dirs.get(prefix)
+        return names.get(name) if names else None
+
+    # 🔹 Интерфейс словаря
+
+    def get(self, key: str, default=None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            slot = self._slot(key)
+            return self._read(slot) if slot is not None else default
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._slot(key) is not None
+
+    def __setitem__(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._put(key, entry.get("hash"), entry.get("mtime"), entry.get("size"),
+                      entry.get("algo"), entry.get("quick"))
+
+    def pop(self, key: str, default=None):
+        with self._lock:
+            prefix, name = _split(key)
+            names = self._dirs.get(prefix)
+            slot = names.pop(name, None) if names else None
+            if slot is None:
+                return default
+            if not names:
+                del self._dirs[prefix]
+            entry = self._read(slot)
+            self._extra.pop(slot, None)
+            self._free.append(slot)
+            self._count -= 1
+            return entry
+
+    def __delitem__(self, key: str) -> None:
+        if self.pop(key) is None:
+            raise KeyError(key)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = [(prefix, list(names)) for prefix, names in self._dirs.items()]
+        for prefix, names in snapshot:
+            for name in names:
+                yield prefix + name
+
+    __iter__ = keys
@@ -0,0 +1,195 @@
+# app/journal.py
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.database import DB_FILE, get_writer, init_db
+from app.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_JOURNAL = {
+    "batch_rows": 500,   # изменений в одной пачке записи (больше в памяти источника не копится)
+    "keep_days": 180,    # сколько хранить историю запусков в БД (0 — бессрочно)
+}
+
+# Ожидание блокировки SQLite: писатель держит транзакцию не дольше max_delay
+BUSY_TIMEOUT = 30.0
+
+_CHANGE_COLUMNS = "rel_path, status, size, mtime, old_size, old_mtime"
+
+
+def journal_settings(config: dict) -> dict:
+    """Настройки журнала изменений из секции `journal` конфига."""
+    section = (config or {}).get("journal") or {}
+    settings = dict(DEFAULT_JOURNAL)
+    batch = section.get("batch_rows")
+    if isinstance(batch, int) and not isinstance(batch, bool) and batch > 0:
+        settings["batch_rows"] = batch
+    keep_days = section.get("keep_days")
+    if isinstance(keep_days, int) and not isinstance(keep_days, bool) and keep_days >= 0:
+        settings["keep_days"] = keep_days
+    return settings
+
+
+def _connect() -> sqlite3.Connection:
+    init_db()
+    return sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT)
+
+
+def start_run(kind: str, dry_run: bool = False) -> int:
+    """
+    Регистрирует запуск в sync_runs и возвращает его номер (run_id).
+    Строка пишется через общий писатель — без ожидания его открытой транзакции.
+    kind: sync — разовый запуск, daemon — проход демона по источнику, folder — вызов sync_folder напрямую.
+    """
+    return get_writer().insert(
+        "INSERT INTO sync_runs (kind, dry_run, started) VALUES (?, ?, ?)",
+        (kind, int(dry_run), time.time())
+    )
+
+
+def finish_run(run_id: int) -> None:
+    """Отмечает запуск завершённым: без отметки он считается прерванным."""
+    get_writer().submit("UPDATE sync_runs SET finished = ? WHERE run_id = ?", [(time.time(), run_id)])
+
+
+def mark_reported(run_ids: Iterable[int], report_path: str) -> None:
+    """Запоминает, в какой отчёт вошли изменения запусков."""
+    get_writer().submit(
+        "UPDATE sync_runs SET report_path = ? WHERE run_id = ?",
+        [(report_path, run_id) for run_id in run_ids]
+    )
+
+
+def get_run(run_id: int) -> Optional[Dict[str, Any]]:
+    """Запись о запуске (kind, dry_run, started, finished, report_path) или None."""
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT kind, dry_run, started, finished, report_path FROM sync_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        conn.close()
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения запуска №{run_id}: {e}")
+        return None
+    if not row:
+        return None
+    return dict(zip(("kind", "dry_run", "started", "finished", "report_path"), row), run_id=run_id)
+
+
+def prune_journal(keep_days: int = DEFAULT_JOURNAL["keep_days"]) -> None:
+    """Удаляет запуски старше keep_days вместе с их изменениями."""
+    if not keep_days:
+        return
+    cutoff = time.time() - keep_days * 86400
+    writer = get_writer()
+    writer.submit(
+        "DELETE FROM change_log WHERE run_id IN (SELECT run_id FROM sync_runs WHERE started < ?)", [(cutoff,)]
+    )
+    writer.submit("DELETE FROM sync_runs WHERE started < ?", [(cutoff,)])
+
+
+class ChangeLog:
+    """
+    🔹 Журнал изменений одного источника в одном запуске.
+    - add() копит строки и передаёт их писателю БД пачками по batch_rows:
+      в памяти — не больше одной пачки, сколько бы файлов ни изменилось
+    - Строки коммитятся по ходу синхронизации, так что у прерванного запуска
+      в change_log остаётся всё, что успело записаться
+    - Вызывается из одного потока (стадия состояния конвейера)
+    """
+
+    def __init__(self, run_id: int, source_name: str, batch_rows: Optional[int] = None):
+        self.run_id = run_id
+        self.source_name = source_name
+        self.batch_rows = batch_rows or DEFAULT_JOURNAL["batch_rows"]
+        self.count = 0
+        self._rows: List[tuple] = []
+
+    def add(
+        self, rel_path: str, status: str, size: int, mtime: float,
+        old_size: Optional[int] = None, old_mtime: Optional[float] = None
+    ) -> None:
+        self._rows.append((self.run_id, self.source_name, rel_path, status,
+                           size, mtime, old_size, old_mtime, time.time()))
+        self.count += 1
+        if len(self._rows) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        get_writer().submit(
+            f"INSERT INTO change_log (run_id, source_name, {_CHANGE_COLUMNS}, logged) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+
+class RunChanges:
+    """
+    🔹 Изменения одного или нескольких запусков для отчёта.
+    Списки файлов читаются из change_log курсором по мере вывода (по индексу
+    idx_change_run), а не передаются в отчёт целиком в памяти.
+    Номера запусков передаются во временную таблицу соединения, а не параметрами
+    в IN (...): демон собирает к отчёту сколько угодно проходов, а SQLite
+    ограничивает число параметров запроса (999 в старых сборках).
+    """
+
+    def __init__(self, run_ids: Iterable[int]):
+        self.run_ids = sorted(set(run_ids))
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение для чтения с номерами запусков во временной таблице report_runs."""
+        conn = _connect()
+        try:
+            conn.execute("CREATE TEMP TABLE report_runs (run_id INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT INTO report_runs (run_id) VALUES (?)", [(run_id,) for run_id in self.run_ids])
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _where(self) -> Tuple[str, List[int]]:
+        # Границы диапазона — для поиска по индексу idx_change_run, таблица — точный список запусков
+        return (
+            "run_id BETWEEN ? AND ? AND run_id IN (SELECT run_id FROM report_runs)",
+            [self.run_ids[0], self.run_ids[-1]]
+        )
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Число изменений по источникам: {источник: {"added": n, "modified": m}}."""
+        result: Dict[str, Dict[str, int]] = {}
+        if not self.run_ids:
+            return result
+        where, params = self._where()
+        conn = self._connect()
+        try:
+            for source_name, status, count in conn.execute(
+                f"SELECT source_name, status, COUNT(*) FROM change_log WHERE {where} "
+                f"GROUP BY source_name, status", params
+            ):
+                result.setdefault(source_name, {"added": 0, "modified": 0})[status] = count
+        finally:
+            conn.close()
+        return result
+
+    def iter_source(self, source_name: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Изменения источника (rel_path, status, info): сначала добавленные, затем изменённые."""
+        if not self.run_ids:
+            return
+        where, params = self._where()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"SELECT {_CHANGE_COLUMNS} FROM change_log WHERE {where} AND source_name = ? "
+                f"ORDER BY status, id", [*params, source_name]
+            )
+            for rel_path, status, size, mtime, old_size, old_mtime in cursor:
+                info = {"size": size, "mtime": mtime}
+                if status == "modified":
+                    info.update(old_size=old_size, old_mtime=old_mtime)
+                yield rel_path, status, info
+        finally:
+            conn.close()
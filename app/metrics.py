@@ -0,0 +1,283 @@
+# app/metrics.py
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_METRICS = {
+    "slowest_files": 10,    # сколько самых долгих операций с файлами показывать
+    "prometheus_file": "",  # путь textfile для node_exporter (пусто — metrics.prom рядом с отчётами)
+}
+
+# Фазы синхронизации источника: ключ → подпись в отчёте
+PHASES = {
+    "db_load": "Загрузка кэша из БД",
+    "scan": "Сканирование",
+    "quick": "Быстрые отпечатки",
+    "source_hash": "Хеширование источника",
+    "dest_hash": "Хеширование назначения",
+    "copy": "Копирование",
+    "delta": "Поблочное обновление",
+    "dedup": "Дедупликация",
+    "db_save": "Передача изменений в БД",
+    # Ожидание лимитов планировщика (app.scheduler): слот источника и скорость чтения
+    # (ожидание скорости идёт внутри чтения и входит также во время хеширования/копирования)
+    "slot_wait": "Ожидание слота",
+    "throttle": "Ограничение скорости",
+}
+
+# Счётчики источника
+COUNTERS = (
+    "files", "bytes_read", "bytes_written", "stat_source", "stat_dest",
+    "cache_hits", "quick_hits", "cache_misses", "dest_cache_hits", "dest_hashed",
+)
+
+
+def metrics_settings(config: dict) -> dict:
+    """
+    🔹 Настройки метрик из секции `metrics` конфига.
+    - slowest_files: размер списка самых долгих операций по источнику
+    - prometheus_file: куда дополнительно писать метрики в формате Prometheus
+    """
+    section = (config or {}).get("metrics") or {}
+    settings = dict(DEFAULT_METRICS)
+    slowest = section.get("slowest_files")
+    if isinstance(slowest, int) and not isinstance(slowest, bool) and slowest >= 0:
+        settings["slowest_files"] = slowest
+    prom = section.get("prometheus_file")
+    if isinstance(prom, str):
+        settings["prometheus_file"] = prom.strip()
+    return settings
+
+
+class SourceMetrics:
+    """
+    🔹 Время по фазам и счётчики одного источника.
+    - Таймеры дешёвые (perf_counter + короткая блокировка): фаза считается
+      суммарно по всем потокам конвейера, поэтому может превышать общее время
+    - Самые долгие операции с файлами — в куче фиксированного размера
+    - Демон накапливает метрики нескольких проходов в одном объекте до отчёта
+    """
+
+    def __init__(self, name: str, slowest: Optional[int] = None):
+        self.name = name
+        self.slowest_limit = DEFAULT_METRICS["slowest_files"] if slowest is None else slowest
+        self.phases: Dict[str, List[float]] = {phase: [0.0, 0] for phase in PHASES}
+        self.counters: Dict[str, int] = {key: 0 for key in COUNTERS}
+        self.wall_sec = 0.0
+        self.runs = 0
+        self._slowest: List[Tuple[float, str, str, int]] = []
+        self._lock = threading.Lock()
+
+    def add(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += n
+
+    def record(self, phase: str, seconds: float, path: Optional[str] = None, size: int = 0) -> None:
+        with self._lock:
+            totals = self.phases[phase]
+            totals[0] += seconds
+            totals[1] += 1
+            if path is not None and self.slowest_limit:
+                item = (seconds, path, phase, size)
+                if len(self._slowest) < self.slowest_limit:
+                    heapq.heappush(self._slowest, item)
+                elif seconds > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, item)
+
+    @contextmanager
+    def timer(self, phase: str, path: Optional[str] = None, size: int = 0) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started, path, size)
+
+    def timed_iter(self, phase: str, items: Iterable) -> Iterator:
+        """Итератор, время ожидания каждого элемента которого идёт в фазу phase."""
+        it = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.record(phase, time.perf_counter() - started)
+                return
+            self.record(phase, time.perf_counter() - started)
+            yield item
+
+    def reader(self, throttle: Optional[Callable[[int], None]] = None) -> Callable[[int], None]:
+        """Колбэк on_read: считает прочитанные из источника байты и передаёт их в throttle."""
+        def on_read(nbytes: int) -> None:
+            with self._lock:
+                self.counters["bytes_read"] += nbytes
+            if throttle:
+                throttle(nbytes)
+        return on_read
+
+    def writer(self) -> Callable[[int], None]:
+        """Колбэк on_write: считает записанные в назначение байты."""
+        return lambda nbytes: self.add("bytes_written", nbytes)
+
+    def merge(self, other: "SourceMetrics") -> None:
+        """Добавляет метрики другого прохода (демон: несколько проходов до отчёта)."""
+        with other._lock:
+            phases = {k: list(v) for k, v in other.phases.items()}
+            counters = dict(other.counters)
+            slowest = list(other._slowest)
+            wall, runs = other.wall_sec, other.runs
+        with self._lock:
+            for phase, (seconds, count) in phases.items():
+                self.phases[phase][0] += seconds
+                self.phases[phase][1] += count
+            for key, value in counters.items():
+                self.counters[key] += value
+            self.wall_sec += wall
+            self.runs += runs
+            for item in slowest:
+                if len(self._slowest) < self.slowest_limit:
+                    heapq.heappush(self._slowest, item)
+                elif self._slowest and item[0] > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, item)
+
+    def cache_hit_ratio(self) -> Optional[float]:
+        """Доля файлов, решённых без полного хеширования источника (mtime/size или быстрый отпечаток)."""
+        hits = self.counters["cache_hits"] + self.counters["quick_hits"]
+        total = hits + self.counters["cache_misses"]
+        return hits / total if total else None
+
+    def describe(self) -> str:
+        """Краткая строка для лога: самые затратные фазы, объём чтения/записи, попадания в кэш."""
+        with self._lock:
+            phases = sorted(
+                ((seconds, phase) for phase, (seconds, count) in self.phases.items() if count),
+                reverse=True
+            )[:4]
+            read_mb = self.counters["bytes_read"] / (1024 * 1024)
+            written_mb = self.counters["bytes_written"] / (1024 * 1024)
+            ratio = self.cache_hit_ratio()
+        parts = [f"{PHASES[phase][0].lower()}{PHASES[phase][1:]} {seconds:.1f} с" for seconds, phase in phases]
+        parts.append(f"прочитано {read_mb:.1f} МБ, записано {written_mb:.1f} МБ")
+        if ratio is not None:
+            parts.append(f"кэш {ratio * 100:.0f} %")
+        return f"{self.wall_sec:.1f} с: " + ", ".join(parts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            ratio = self.cache_hit_ratio()
+            return {
+                "source": self.name,
+                "runs": self.runs,
+                "wall_sec": round(self.wall_sec, 3),
+                "phases": {
+                    phase: {"seconds": round(seconds, 3), "count": count}
+                    for phase, (seconds, count) in self.phases.items()
+                },
+                "counters": dict(self.counters),
+                "cache_hit_ratio": round(ratio, 4) if ratio is not None else None,
+                "slowest": [
+                    {"path": path, "phase": phase, "seconds": round(seconds, 3), "size": size}
+                    for seconds, path, phase, size in sorted(self._slowest, reverse=True)
+                ],
+            }
+
+
+def run_snapshot(
+    sources: Dict[str, SourceMetrics],
+    wall_sec: float,
+    db: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """Метрики запуска: по источникам, итог и запись в БД (DbWriter)."""
+    per_source = [metrics.snapshot() for _, metrics in sorted(sources.items())]
+    totals: Dict[str, Any] = {
+        "phases": {phase: {"seconds": 0.0, "count": 0} for phase in PHASES},
+        "counters": {key: 0 for key in COUNTERS},
+    }
+    for item in per_source:
+        for phase, values in item["phases"].items():
+            totals["phases"][phase]["seconds"] = round(totals["phases"][phase]["seconds"] + values["seconds"], 3)
+            totals["phases"][phase]["count"] += values["count"]
+        for key, value in item["counters"].items():
+            totals["counters"][key] += value
+    counters = totals["counters"]
+    hits = counters["cache_hits"] + counters["quick_hits"]
+    checked = hits + counters["cache_misses"]
+    totals["cache_hit_ratio"] = round(hits / checked, 4) if checked else None
+    return {
+        "timestamp": time.time(),
+        "wall_sec": round(wall_sec, 3),
+        "db": db or {},
+        "totals": totals,
+        "sources": per_source,
+    }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text(snapshot: Dict[str, Any]) -> str:
+    """Метрики запуска в текстовом формате Prometheus (textfile collector node_exporter)."""
+    lines: List[str] = []
+
+    def metric(name: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_label(str(v))}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    sources = snapshot["sources"]
+    metric("sync_last_run_timestamp_seconds", "Unix time of the last finished run",
+           [({}, round(snapshot["timestamp"], 3))])
+    metric("sync_run_seconds", "Wall time of the last run", [({}, snapshot["wall_sec"])])
+    metric("sync_source_seconds", "Wall time per source",
+           [({"source": s["source"]}, s["wall_sec"]) for s in sources])
+    metric("sync_phase_seconds", "Time per phase, summed over pipeline threads",
+           [({"source": s["source"], "phase": phase}, values["seconds"])
+            for s in sources for phase, values in s["phases"].items()])
+    metric("sync_phase_operations", "Operations per phase",
+           [({"source": s["source"], "phase": phase}, values["count"])
+            for s in sources for phase, values in s["phases"].items()])
+    for key in COUNTERS:
+        metric(f"sync_{key}", f"Counter {key} per source",
+               [({"source": s["source"]}, s["counters"][key]) for s in sources])
+    metric("sync_cache_hit_ratio", "Files resolved without a full source hash",
+           [({"source": s["source"]}, s["cache_hit_ratio"]) for s in sources
+            if s["cache_hit_ratio"] is not None])
+    for key, value in sorted(snapshot["db"].items()):
+        metric(f"sync_db_{key}", f"SQLite writer {key} during the run", [({}, value)])
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def save_metrics(
+    report_path: Path, snapshot: Dict[str, Any], prom_dir: Path, prometheus_file: str = ""
+) -> Tuple[Path, Path]:
+    """
+    🔹 Сохраняет метрики запуска рядом с HTML-отчётом.
+    - JSON — одноимённый с отчётом (.metrics.json)
+    - Prometheus — metrics.prom в папке отчётов (или prometheus_file из конфига),
+      перезаписывается атомарно каждым запуском
+    """
+    json_path = report_path.with_suffix(".metrics.json")
+    _write_atomic(json_path, json.dumps(snapshot, ensure_ascii=False, indent=2))
+    prom_path = Path(prometheus_file) if prometheus_file else prom_dir / "metrics.prom"
+    try:
+        prom_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(prom_path, prometheus_text(snapshot))
+    except OSError as e:
+        logger.warning(f"⚠️ Не удалось записать метрики Prometheus {prom_path}: {e}")
+    return json_path, prom_path
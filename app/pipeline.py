@@ -0,0 +1,65 @@
+# app/pipeline.py
+import queue
+import threading
+from typing import Any, Callable, List
+from app.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_PIPELINE = {
+    "hash_workers": 2,   # хеширование источника/назначения (сетевое чтение)
+    "copy_workers": 2,   # запись в папки назначения (локальный диск)
+    "queue_size": 256,   # размер очередей между стадиями
+}
+
+
+def pipeline_settings(config: dict) -> dict:
+    """Настройки конвейера из секции `pipeline` конфига (с подстановкой значений по умолчанию)."""
+    settings = dict(DEFAULT_PIPELINE)
+    section = (config or {}).get("pipeline") or {}
+    for key in DEFAULT_PIPELINE:
+        value = section.get(key)
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 1:
+            settings[key] = value
+    return settings
+
+
+class StagePool:
+    """
+    🔹 Стадия конвейера: пул потоков над ограниченной очередью.
+    - put() блокируется, если очередь заполнена (обратное давление на предыдущую стадию)
+    - func сама передаёт результат следующей стадии
+    - close() дожидается обработки всего, что уже поставлено в очередь
+    """
+
+    _DONE = object()
+
+    def __init__(self, name: str, func: Callable[[Any], None], workers: int = 1, maxsize: int = 256):
+        self.name = name
+        self.func = func
+        self.queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self.threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self.threads:
+            t.start()
+
+    def put(self, item: Any) -> None:
+        self.queue.put(item)
+
+    def close(self) -> None:
+        for _ in self.threads:
+            self.queue.put(self._DONE)
+        for t in self.threads:
+            t.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is self._DONE:
+                return
+            try:
+                self.func(item)
+            except Exception as e:
+                logger.error(f"❌ Ошибка в стадии '{self.name}': {e}")
@@ -0,0 +1,161 @@
+# app/prober.py
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+from app.logger import get_logger
+from app.scheduler import LOCAL_HOST, host_of
+
+logger = get_logger()
+
+DEFAULT_PROBE = {
+    "port": 445,             # SMB; ПК без открытого порта считается недоступным
+    "connect_timeout": 1.0,  # сек на TCP-подключение
+    "stat_timeout": 3.0,     # сек на проверку папки (stat зависшей шары может висеть долго)
+    "cache_sec": 10.0,       # сколько доверять результату «ПК доступен»
+    "backoff_base": 2.0,     # первая пауза после неудачи, сек
+    "backoff_max": 120.0,    # потолок паузы
+}
+
+
+class HostState:
+    """Последний известный статус ПК и расписание повторной проверки."""
+    __slots__ = ("up", "checked", "failures", "retry_at")
+
+    def __init__(self):
+        self.up: Optional[bool] = None
+        self.checked = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+class Prober:
+    """
+    🔹 Проверка доступности источников без запуска процессов (вместо ping).
+    - Все ПК проверяются параллельно (asyncio): TCP-подключение к порту SMB с таймаутом
+    - Папка источника — stat в отдельном фоновом потоке с таймаутом: поток зависшей шары
+      бросается (общего пула, который она могла бы занять, нет), а пока он висит,
+      новая проверка этой папки сразу считается неудачной — потоки не копятся
+    - Локальные пути (и подставные пути при отладке на Linux) — только stat
+    - Статус ПК кэшируется; недоступный ПК повторно проверяется с экспоненциальной
+      паузой и случайным разбросом (backoff + jitter), до этого считается недоступным
+    - Потокобезопасен: вызывается из основной синхронизации, фонового мониторинга и демона
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        section = (config or {}).get("probe") or {}
+        self.settings = dict(DEFAULT_PROBE)
+        for key, default in DEFAULT_PROBE.items():
+            value = section.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+                self.settings[key] = type(default)(value)
+        self.hosts: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+        self._stalled: Dict[str, threading.Thread] = {}  # папка → поток stat, не ответивший вовремя
+
+    def _state(self, host: str) -> HostState:
+        with self._lock:
+            return self.hosts.setdefault(host, HostState())
+
+    def _backoff(self, failures: int) -> float:
+        delay = min(self.settings["backoff_max"], self.settings["backoff_base"] * 2 ** (failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _record(self, host: str, up: bool) -> None:
+        state = self._state(host)
+        now = time.monotonic()
+        with self._lock:
+            if up:
+                if state.up is False:
+                    logger.info(f"🟢 ПК снова доступен: {host}")
+                state.failures = 0
+                state.retry_at = 0.0
+            else:
+                state.failures += 1
+                state.retry_at = now + self._backoff(state.failures)
+            state.up = up
+            state.checked = now
+
+    async def _probe_host(self, host: str) -> bool:
+        """TCP-подключение к порту SMB; без процессов и без блокировки остальных проверок."""
+        if host == LOCAL_HOST:
+            return True
+        state = self._state(host)
+        now = time.monotonic()
+        if state.up and now - state.checked < self.settings["cache_sec"]:
+            return True
+        if state.up is False and now < state.retry_at:
+            return False  # ещё пауза после неудачи
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, self.settings["port"]),
+                timeout=self.settings["connect_timeout"]
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+            up = True
+        except (OSError, asyncio.TimeoutError):
+            up = False
+        self._record(host, up)
+        return up
+
+    async def _probe_path(self, path: str) -> bool:
+        with self._lock:
+            stalled = self._stalled.get(path)
+            if stalled is not None and not stalled.is_alive():
+                del self._stalled[path]
+                stalled = None
+        if stalled is not None:
+            return False  # прошлый stat этой папки всё ещё висит
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result: bool) -> None:
+            if not future.done():
+                future.set_result(result)
+
+        def stat() -> None:
+            result = os.path.isdir(path)
+            try:
+                loop.call_soon_threadsafe(resolve, result)
+            except RuntimeError:
+                pass  # проверка уже закончилась (цикл закрыт) — результат не нужен
+
+        thread = threading.Thread(target=stat, name="probe-stat", daemon=True)
+        thread.start()
+        try:
+            return await asyncio.wait_for(future, timeout=self.settings["stat_timeout"])
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stalled[path] = thread
+            logger.warning(f"⚠️ Папка не ответила за {self.settings['stat_timeout']:.0f} с: {path}")
+            return False
+
+    async def _check_all(self, paths: List[str]) -> List[bool]:
+        hosts = sorted({host_of(path) for path in paths})
+        host_up = dict(zip(hosts, await asyncio.gather(*(self._probe_host(h) for h in hosts))))
+
+        async def check_path(path: str) -> bool:
+            return host_up[host_of(path)] and await self._probe_path(path)
+
+        return list(await asyncio.gather(*(check_path(p) for p in paths)))
+
+    def check(self, paths: List[str]) -> Dict[str, bool]:
+        """Доступность всех путей разом: {путь: доступен}."""
+        if not paths:
+            return {}
+        try:
+            results = asyncio.run(self._check_all(list(paths)))
+        except Exception as e:
+            logger.error(f"❌ Ошибка проверки доступности: {e}")
+            return {path: False for path in paths}
+        return dict(zip(paths, results))
+
+    def is_accessible(self, path: str) -> bool:
+        return self.check([path])[path]
@@ -1,16 +1,44 @@
 # app/reporter.py
-from datetime import datetime
+import json
+import os
+import shutil
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from jinja2 import Template
+from jinja2 import DictLoader, Environment, Template
 
-REPORT_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8" />
-    <title>Отчет синхронизации</title>
+from app.journal import RunChanges
+from app.logger import get_logger
+from app.metrics import PHASES, save_metrics
+
+logger = get_logger()
+
+DEFAULT_REPORT = {
+    "page_size": 2000,    # файлов источника в основном отчёте; больше — на отдельных страницах
+    "index_recent": 50,   # последних отчётов на главной странице списка; остальные — по месяцам
+    "keep_days": 0,       # хранить отчёты N дней (0 — бессрочно)
+    "archive": True,      # старые отчёты — в zip по месяцам (False — удалять)
+}
+
+# Журнал отчётов (по строке JSON на отчёт): список не собирается обходом всей истории
+MANIFEST_NAME = "reports.jsonl"
+# Сводка журнала для списка отчётов: число отчётов по месяцам и хвост журнала —
+# новый отчёт обновляет её без чтения reports.jsonl целиком
+INDEX_STATE_NAME = "reports_index.json"
+ARCHIVE_DIR = "Архив"
+MONTHS_DIR = "По месяцам"
+MONTH_NAMES = [
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь",
+]
+_index_lock = threading.Lock()
+
+REPORT_STYLE = """
     <style>
         body { font-family: Arial; margin: 40px; background: #f9f9f9; color: #333; }
         h2 { color: #2c3e50; border-bottom: 2px solid #ccc; }
@@ -20,45 +48,72 @@ REPORT_TEMPLATE = """
         ul { margin-left: 20px; }
         .stats { background: #ecf0f1; padding: 10px; border-radius: 5px; font-weight: bold; margin-top: 20px; }
         .meta { font-size: 0.9em; color: #7f8c8d; }
+        table.perf { border-collapse: collapse; font-size: 0.9em; margin: 10px 0; }
+        table.perf th, table.perf td { border: 1px solid #ccc; padding: 4px 8px; text-align: right; }
+        table.perf th:first-child, table.perf td:first-child { text-align: left; }
+        .pages a { margin-right: 8px; color: #0984e3; }
     </style>
+"""
+
+# Списки файлов — общие для основного отчёта и страниц с продолжением.
+# Строки приходят уже отформатированными (_added_rows/_modified_rows): вызовы функций
+# из шаблона на сотнях тысяч файлов стоят дороже самого вывода
+FILES_MACROS = """
+{% macro file_lists(added, modified) %}
+    {% if added %}
+        <p>Добавленные файлы:</p>
+        <ul>
+        {% for path, size, mtime in added %}
+            <li>{{ path }}
+                <div class="meta">Размер: {{ size }}, Дата: {{ mtime }}</div>
+            </li>
+        {% endfor %}
+        </ul>
+    {% else %}
+        <p>Нет добавленных файлов.</p>
+    {% endif %}
+    {% if modified %}
+        <p>Изменённые файлы:</p>
+        <ul>
+        {% for path, old_size, size, old_mtime, mtime in modified %}
+            <li>{{ path }}
+                <div class="meta">
+                    Старый размер: {{ old_size }}, Новый: {{ size }}<br>
+                    Старая дата: {{ old_mtime }}, Новая: {{ mtime }}
+                </div>
+            </li>
+        {% endfor %}
+        </ul>
+    {% else %}
+        <p>Нет изменённых файлов.</p>
+    {% endif %}
+{% endmacro %}
+"""
+
+REPORT_TEMPLATE = """{% from "files.html" import file_lists %}
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8" />
+    <title>Отчет синхронизации</title>
+    {% include "style.html" %}
 </head>
 <body>
 <h2>Отчет синхронизации — {{ report_datetime.strftime('%Y-%m-%d %H:%M:%S') }}</h2>
-{% for bureau, users in results_by_bureau.items() %}
+{% if note %}<p class="meta">{{ note }}</p>{% endif %}
+{% for section in sections %}
+    {% set totals = section.totals %}
     <details>
-        <summary>{{ bureau }} - ({{ bureau_totals[bureau].added + bureau_totals[bureau].modified }})</summary>
-        {% for name, files in users.items() %}
-            {% set added = files | selectattr("1", "equalto", "added") | list %}
-            {% set modified = files | selectattr("1", "equalto", "modified") | list %}
-            {% set stat = stats_by_bureau[bureau][name] %}
+        <summary>{{ section.bureau }} - ({{ totals.added + totals.modified }}){% if totals.saved_bytes %} — дедупликация: {{ format_size(totals.saved_bytes) }}{% endif %}</summary>
+        {% for user in section.users %}
+            {% set stat = user.stat %}
             <details>
-                <summary>{{ name }} — Добавлено: {{ stat.added }} | Изменено: {{ stat.modified }} | Скопировано: {{ stat.copied }}</summary>
-                {% if added %}
-                    <p>Добавленные файлы:</p>
-                    <ul>
-                    {% for f in added %}
-                        <li>{{ f[0] }}
-                            <div class="meta">Размер: {{ format_size(f[2].size) }}, Дата: {{ format_mtime(f[2].mtime) }}</div>
-                        </li>
-                    {% endfor %}
-                    </ul>
+                <summary>{{ user.name }} — Добавлено: {{ stat.added }} | Изменено: {{ stat.modified }} | Скопировано: {{ stat.copied }}{% if stat.get('deduped') %} | Ссылками: {{ stat.deduped }} ({{ format_size(stat.saved_bytes) }}){% endif %}{% if stat.get('errors') %} | Не скопировано: {{ stat.errors }}{% endif %}</summary>
+                {% if user.pages %}
+                    <p>Изменений: {{ user.count }} — списки разбиты на страницы по {{ page_size }}:</p>
+                    <p class="pages">{% for page in user.pages %}<a href="{{ page }}">{{ loop.index }}</a>{% endfor %}</p>
                 {% else %}
-                    <p>Нет добавленных файлов.</p>
-                {% endif %}
-                {% if modified %}
-                    <p>Изменённые файлы:</p>
-                    <ul>
-                    {% for f in modified %}
-                        <li>{{ f[0] }}
-                            <div class="meta">
-                                Старый размер: {{ format_size(f[2].old_size) }}, Новый: {{ format_size(f[2].size) }}<br>
-                                Старая дата: {{ format_mtime(f[2].old_mtime) }}, Новая: {{ format_mtime(f[2].mtime) }}
-                            </div>
-                        </li>
-                    {% endfor %}
-                    </ul>
-                {% else %}
-                    <p>Нет изменённых файлов.</p>
+                    {{ file_lists(user.added, user.modified) }}
                 {% endif %}
             </details>
         {% endfor %}
@@ -66,24 +121,80 @@ REPORT_TEMPLATE = """
 {% endfor %}
 <div class="stats">
     Общий итог по всем бюро — Добавлено: {{ grand_total.added }}, Изменено: {{ grand_total.modified }}, Всего: {{ grand_total.added + grand_total.modified }}
+    {% if grand_total.saved_bytes %}<br>Сэкономлено дедупликацией: {{ format_size(grand_total.saved_bytes) }}{% endif %}
+    {% if grand_total.errors %}<br>Не скопировано из-за ошибок: {{ grand_total.errors }} (повтор при следующем запуске){% endif %}
 </div>
+{% if metrics %}
+    {% set totals = metrics.totals %}
+    <details>
+        <summary>Производительность — {{ "%.1f" | format(metrics.wall_sec) }} с | Прочитано: {{ format_size(totals.counters.bytes_read) }} | Записано: {{ format_size(totals.counters.bytes_written) }}{% if totals.cache_hit_ratio is not none %} | Попаданий в кэш: {{ "%.1f" | format(totals.cache_hit_ratio * 100) }} %{% endif %}</summary>
+        <p class="meta">Время фаз — суммарно по потокам конвейера (может превышать общее время источника).
+            Запись в SQLite: {{ "%.2f" | format(metrics.db.get("busy_sec", 0)) }} с, строк: {{ metrics.db.get("rows", 0) }}, коммитов: {{ metrics.db.get("commits", 0) }}, ожидание записи в конце: {{ "%.2f" | format(metrics.db.get("flush_wait_sec", 0)) }} с.</p>
+        <table class="perf">
+            <tr>
+                <th>Источник</th><th>Всего, с</th>
+                {% for phase in active_phases %}<th>{{ phase_labels[phase] }}, с</th>{% endfor %}
+                <th>Прочитано</th><th>Записано</th><th>stat</th><th>Кэш</th>
+            </tr>
+            {% for src in metrics.sources %}
+            <tr>
+                <td>{{ src.source }}</td><td>{{ "%.1f" | format(src.wall_sec) }}</td>
+                {% for phase in active_phases %}<td>{{ "%.1f" | format(src.phases[phase].seconds) }}</td>{% endfor %}
+                <td>{{ format_size(src.counters.bytes_read) }}</td>
+                <td>{{ format_size(src.counters.bytes_written) }}</td>
+                <td>{{ src.counters.stat_source + src.counters.stat_dest }}</td>
+                <td>{% if src.cache_hit_ratio is not none %}{{ "%.1f" | format(src.cache_hit_ratio * 100) }} %{% else %}—{% endif %}</td>
+            </tr>
+            {% endfor %}
+        </table>
+        {% for src in metrics.sources if src.slowest %}
+            <details>
+                <summary>Самые долгие операции: {{ src.source }}</summary>
+                <ol>
+                {% for op in src.slowest %}
+                    <li>{{ op.path }}
+                        <div class="meta">{{ phase_labels[op.phase] }}: {{ "%.2f" | format(op.seconds) }} с, размер {{ format_size(op.size) }}</div>
+                    </li>
+                {% endfor %}
+                </ol>
+            </details>
+        {% endfor %}
+    </details>
+{% endif %}
 </body>
 </html>
 """
 
-INDEX_TEMPLATE = """
+PAGE_TEMPLATE = """{% from "files.html" import file_lists %}
 <!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8" />
-    <title>Список отчетов</title>
+    <title>{{ name }} — страница {{ page }} из {{ pages }}</title>
+    {% include "style.html" %}
+</head>
+<body>
+<h2>{{ bureau }} / {{ name }} — страница {{ page }} из {{ pages }}</h2>
+<p class="pages">
+    <a href="{{ back }}">← к отчёту {{ report_datetime.strftime('%Y-%m-%d %H:%M:%S') }}</a>
+    {% if prev %}<a href="{{ prev }}">« предыдущая</a>{% endif %}
+    {% if next %}<a href="{{ next }}">следующая »</a>{% endif %}
+</p>
+{{ file_lists(added, modified) }}
+</body>
+</html>
+"""
+
+INDEX_STYLE = """
     <style>
         body { font-family: Arial; margin: 40px; background: #f9f9f9; color: #333; }
         h1 { color: #2c3e50; }
+        h3 { color: #2c3e50; margin-bottom: 4px; }
         ul { list-style-type: none; padding-left: 0; }
         li { margin: 8px 0; }
         a { text-decoration: none; color: #0984e3; font-weight: bold; }
         a:hover { text-decoration: underline; }
+        .meta { font-size: 0.9em; color: #7f8c8d; font-weight: normal; }
         .new-label {
             background-color: #e74c3c;
             color: white;
@@ -93,27 +204,70 @@ INDEX_TEMPLATE = """
             margin-left: 10px;
         }
     </style>
-</head>
-<body>
-<h1>Список отчетов</h1>
+"""
+
+# Отчёты одного месяца: ссылка на отчёт или на zip-архив, если отчёт уже заархивирован
+INDEX_MACROS = """
+{% macro report_list(reports, prefix, newest=None) %}
 <ul>
 {% for report in reports %}
     <li>
-        <a href="{{ report.rel_path }}">{{ report.name }}</a>
-        {% if loop.first %}
+        {% if report.archive %}
+            {{ report.name }} <span class="meta">— в архиве <a href="{{ prefix }}{{ report.archive }}">{{ report.archive }}</a></span>
+        {% else %}
+            <a href="{{ prefix }}{{ report.path }}">{{ report.name }}</a>
+        {% endif %}
+        {% if report.changes is not none %}<span class="meta">— изменений: {{ report.changes }}</span>{% endif %}
+        {% if newest and report.path == newest %}
             <span class="new-label">NEW</span>
         {% endif %}
     </li>
 {% endfor %}
 </ul>
+{% endmacro %}
+"""
+
+INDEX_TEMPLATE = """{% from "index_macros.html" import report_list %}
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8" />
+    <title>Список отчетов</title>
+    {% include "index_style.html" %}
+</head>
+<body>
+<h1>Список отчетов</h1>
+{% for label, reports in recent %}
+    <h3>{{ label }}</h3>
+    {{ report_list(reports, "", newest) }}
+{% endfor %}
+{% if months %}
+    <h3>Все отчёты по месяцам</h3>
+    <ul>
+    {% for month in months %}
+        <li><a href="{{ month.href }}">{{ month.label }}</a> <span class="meta">— отчётов: {{ month.count }}</span></li>
+    {% endfor %}
+    </ul>
+{% endif %}
 </body>
 </html>
 """
 
-
-class AttrDict(dict):
-    def __getattr__(self, item):
-        return self[item]
+MONTH_TEMPLATE = """{% from "index_macros.html" import report_list %}
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8" />
+    <title>Отчеты — {{ label }}</title>
+    {% include "index_style.html" %}
+</head>
+<body>
+<h1>Отчеты — {{ label }}</h1>
+<p><a href="../отчет.html">← к списку отчетов</a></p>
+{{ report_list(reports, "../") }}
+</body>
+</html>
+"""
 
 
 def format_size(size) -> str:
@@ -137,72 +291,482 @@ def format_mtime(mtime) -> str:
         return "unknown"
 
 
+def reports_base_dir() -> Path:
+    """Папка отчётов на рабочем столе."""
+    return Path.home() / "Desktop" / "Отчет"
+
+
+def report_settings(config: dict) -> dict:
+    """
+    🔹 Настройки отчёта из секции `report` конфига.
+    - page_size: сколько файлов источника выводить в основном отчёте; если изменений
+      больше, списки выносятся на страницы по page_size файлов
+    - index_recent: сколько последних отчётов на главной странице списка
+    - keep_days / archive: срок хранения отчётов и что делать со старыми (zip или удаление)
+    """
+    section = (config or {}).get("report") or {}
+    settings = dict(DEFAULT_REPORT)
+    for key in ("page_size", "index_recent"):
+        value = section.get(key)
+        if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+            settings[key] = value
+    keep_days = section.get("keep_days")
+    if isinstance(keep_days, int) and not isinstance(keep_days, bool) and keep_days >= 0:
+        settings["keep_days"] = keep_days
+    if isinstance(section.get("archive"), bool):
+        settings["archive"] = section["archive"]
+    return settings
+
+
+@lru_cache(maxsize=1)
+def _environment() -> Environment:
+    """Окружение Jinja2 с шаблонами отчётов: компилируются один раз на процесс."""
+    env = Environment(loader=DictLoader({
+        "style.html": REPORT_STYLE,
+        "files.html": FILES_MACROS,
+        "report.html": REPORT_TEMPLATE,
+        "page.html": PAGE_TEMPLATE,
+        "index_style.html": INDEX_STYLE,
+        "index_macros.html": INDEX_MACROS,
+        "index.html": INDEX_TEMPLATE,
+        "month.html": MONTH_TEMPLATE,
+    }))
+    env.globals.update(format_size=format_size, format_mtime=format_mtime)
+    return env
+
+
+def _template(name: str) -> Template:
+    return _environment().get_template(name)
+
+
+def _render_to_file(template: Template, path: Path, **context) -> None:
+    """Потоковая запись шаблона в файл (без сборки всей страницы в памяти), с атомарной подменой."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    try:
+        template.stream(**context).dump(str(tmp), encoding="utf-8")
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def _partition(files: Iterable[Tuple[str, str, Dict]]) -> Tuple[List, List]:
+    """Один проход по изменениям: (добавленные, изменённые)."""
+    added, modified = [], []
+    for entry in files:
+        if entry[1] == "added":
+            added.append(entry)
+        elif entry[1] == "modified":
+            modified.append(entry)
+    return added, modified
+
+
+def _added_rows(entries: List[Tuple[str, str, Dict]]) -> List[Tuple[str, str, str]]:
+    return [(path, format_size(info["size"]), format_mtime(info["mtime"])) for path, _, info in entries]
+
+
+def _modified_rows(entries: List[Tuple[str, str, Dict]]) -> List[Tuple[str, str, str, str, str]]:
+    return [
+        (path, format_size(info.get("old_size")), format_size(info["size"]),
+         format_mtime(info.get("old_mtime")), format_mtime(info["mtime"]))
+        for path, _, info in entries
+    ]
+
+
+def _pages(entries: Iterable[Tuple[str, str, Dict]], size: int) -> Iterator[Tuple[List, List]]:
+    """Страницы по size файлов из потока изменений (добавленные идут раньше изменённых), строки — отформатированные."""
+    it = iter(entries)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        added, modified = _partition(chunk)
+        yield _added_rows(added), _modified_rows(modified)
+
+
 def save_html_report(
-        results_by_bureau: Dict[str, Dict[str, List[Tuple[str, str, Dict]]]],
         stats_by_bureau: Dict[str, Dict[str, Dict[str, int]]],
-        report_datetime: datetime
+        report_datetime: datetime,
+        changes: RunChanges,
+        metrics: Optional[Dict[str, Any]] = None,
+        note: Optional[str] = None,
+        settings: Optional[dict] = None,
+        prometheus_file: str = ""
 ) -> Path:
-    template = Template(REPORT_TEMPLATE)
-    # Преобразуем в AttrDict и добавляем функции
-    stats_converted = {
-        bureau: {
-            name: AttrDict(stat) for name, stat in names.items()
-        } for bureau, names in stats_by_bureau.items()
-    }
-
-    bureau_totals = {}
-    grand_total = {"added": 0, "modified": 0}
-    for bureau, users in stats_by_bureau.items():
-        total_added = sum(user["added"] for user in users.values())
-        total_modified = sum(user["modified"] for user in users.values())
-        bureau_totals[bureau] = AttrDict({"added": total_added, "modified": total_modified})
-        grand_total["added"] += total_added
-        grand_total["modified"] += total_modified
-
-    html = template.render(
-        report_datetime=report_datetime,
-        results_by_bureau=results_by_bureau,
-        stats_by_bureau=stats_converted,
-        bureau_totals=AttrDict(bureau_totals),
-        grand_total=AttrDict(grand_total),
-        format_size=format_size,
-        format_mtime=format_mtime
-    )
+    """
+    Формирует HTML-отчёт. Списки файлов читаются из журнала изменений (changes —
+    запуски в change_log) курсором по мере вывода. metrics — метрики запуска
+    (app.metrics.run_snapshot): раздел «Производительность» в отчёте, JSON рядом
+    с ним и metrics.prom (или prometheus_file). note — пометка под заголовком (например,
+    о прерванном запуске). settings — настройки отчёта запуска (report_settings).
 
+    Шаблоны скомпилированы один раз (_environment), страница пишется в файл потоком.
+    Источник с числом изменений больше page_size получает в отчёте ссылки на
+    страницы «Отчет_..._страницы/N-K.html» вместо полного списка.
+    """
+    settings = settings or DEFAULT_REPORT
     date_str = report_datetime.strftime("%Y-%m-%d")
     time_str = report_datetime.strftime("%H-%M-%S")
-    base_dir = Path.home() / "Desktop" / "Отчет"
+    base_dir = reports_base_dir()
     report_dir = base_dir / "Все даты" / date_str
     report_dir.mkdir(parents=True, exist_ok=True)
     report_path = report_dir / f"Отчет_{date_str}_{time_str}.html"
-    report_path.write_text(html, encoding="utf-8")
+    pages_dir = report_dir / f"{report_path.stem}_страницы"
+    page_size = settings["page_size"]
+    page_template = _template("page.html")
+    counts = changes.counts()
+
+    sections = []
+    grand_total = {"added": 0, "modified": 0, "saved_bytes": 0, "errors": 0}
+    user_number = 0
+    for bureau, stats in stats_by_bureau.items():
+        totals = {
+            "added": sum(stat["added"] for stat in stats.values()),
+            "modified": sum(stat["modified"] for stat in stats.values()),
+            "saved_bytes": sum(stat.get("saved_bytes", 0) for stat in stats.values()),
+            "errors": sum(stat.get("errors", 0) for stat in stats.values()),
+        }
+        for key in grand_total:
+            grand_total[key] += totals[key]
+
+        rows = []
+        for name, stat in stats.items():
+            user_number += 1
+            count = sum(counts.get(name, {}).values())
+            row = {"name": name, "stat": stat, "count": count,
+                   "added": [], "modified": [], "pages": []}
+            if count <= page_size:
+                added, modified = _partition(changes.iter_source(name)) if count else ([], [])
+                row["added"], row["modified"] = _added_rows(added), _modified_rows(modified)
+            else:
+                # Большой список — на отдельные страницы; в основном отчёте только ссылки
+                pages_dir.mkdir(exist_ok=True)
+                names = [f"{user_number}-{k}.html" for k in range(1, (count + page_size - 1) // page_size + 1)]
+                for k, (page_added, page_modified) in enumerate(_pages(changes.iter_source(name), page_size)):
+                    if k >= len(names):
+                        break
+                    _render_to_file(
+                        page_template, pages_dir / names[k],
+                        bureau=bureau, name=name, page=k + 1, pages=len(names),
+                        added=page_added, modified=page_modified,
+                        report_datetime=report_datetime,
+                        back=f"../{report_path.name}",
+                        prev=names[k - 1] if k > 0 else None,
+                        next=names[k + 1] if k + 1 < len(names) else None,
+                    )
+                row["pages"] = [f"{pages_dir.name}/{page}" for page in names]
+            rows.append(row)
+        sections.append({"bureau": bureau, "totals": totals, "users": rows})
+
+    _render_to_file(
+        _template("report.html"), report_path,
+        report_datetime=report_datetime,
+        note=note,
+        sections=sections,
+        grand_total=grand_total,
+        page_size=page_size,
+        metrics=metrics,
+        phase_labels=PHASES,
+        active_phases=[
+            phase for phase in PHASES
+            if metrics and metrics["totals"]["phases"][phase]["count"]
+        ]
+    )
+    if metrics:
+        save_metrics(report_path, metrics, base_dir, prometheus_file)
 
-    update_reports_index()
+    update_reports_index({
+        "date": report_datetime.isoformat(timespec="seconds"),
+        "path": report_path.relative_to(base_dir).as_posix(),
+        "changes": grand_total["added"] + grand_total["modified"],
+    }, settings)
     return report_path
 
 
-def update_reports_index():
-    base_dir = Path.home() / "Desktop" / "Отчет"
-    all_dates_dir = base_dir / "Все даты"
-    report_files = list(all_dates_dir.rglob("Отчет_*.html"))
-    reports = []
-    for file_path in report_files:
+def _manifest_entry(base_dir: Path, file_path: Path) -> Dict[str, Any]:
+    """Запись журнала для отчёта, найденного на диске (дата — из имени файла или mtime)."""
+    try:
+        parts = file_path.stem.split("_")
+        dt = datetime.strptime(f"{parts[1]} {parts[2]}", "%Y-%m-%d %H-%M-%S")
+    except Exception:
+        dt = datetime.fromtimestamp(file_path.stat().st_mtime)
+    return {
+        "date": dt.isoformat(timespec="seconds"),
+        "path": file_path.relative_to(base_dir).as_posix(),
+        "changes": None,
+    }
+
+
+def _write_manifest(base_dir: Path, entries: List[Dict[str, Any]]) -> None:
+    path = base_dir / MANIFEST_NAME
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def load_manifest(base_dir: Path) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    🔹 Журнал отчётов из reports.jsonl.
+    Если журнала нет (первый запуск после обновления), он один раз строится обходом
+    «Все даты»; возвращает (записи, построен_заново).
+    """
+    path = base_dir / MANIFEST_NAME
+    if not path.exists():
+        entries = sorted(
+            (_manifest_entry(base_dir, p) for p in (base_dir / "Все даты").rglob("Отчет_*.html")),
+            key=lambda e: e["date"]
+        )
+        _write_manifest(base_dir, entries)
+        logger.info(f"📒 Журнал отчётов создан: {len(entries)} отчётов")
+        return entries, True
+    entries = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"⚠️ Повреждённая строка журнала отчётов пропущена: {line[:80]}")
+    return entries, False
+
+
+def append_manifest(base_dir: Path, entry: Dict[str, Any]) -> None:
+    """Дописывает отчёт в конец журнала — без чтения остальных записей."""
+    with (base_dir / MANIFEST_NAME).open("a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _report_files(report: Path) -> List[Path]:
+    """Файлы одного отчёта: страница, метрики, папка страниц с продолжением."""
+    return [report, report.with_suffix(".metrics.json"), report.with_name(f"{report.stem}_страницы")]
+
+
+def apply_retention(
+    base_dir: Path, entries: List[Dict[str, Any]], now: datetime, settings: Optional[dict] = None
+) -> set:
+    """
+    🔹 Срок хранения отчётов (keep_days): отчёты старше срока упаковываются
+    в «Архив/ГГГГ-ММ.zip» (archive: true) или удаляются вместе с их файлами.
+    Меняет entries на месте; возвращает месяцы (ГГГГ-ММ), чьи страницы нужно перерисовать.
+    """
+    settings = settings or DEFAULT_REPORT
+    keep_days = settings["keep_days"]
+    if not keep_days:
+        return set()
+    cutoff = (now - timedelta(days=keep_days)).isoformat(timespec="seconds")
+    expired = [e for e in entries if e["date"] < cutoff and not e.get("archive")]
+    if not expired:
+        return set()
+
+    by_month: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in expired:
+        by_month.setdefault(entry["date"][:7], []).append(entry)
+
+    touched = set()
+    done = 0
+    for month, items in by_month.items():
+        archive = base_dir / ARCHIVE_DIR / f"{month}.zip"
+        zf = None
         try:
-            parts = file_path.stem.split("_")
-            date_str, time_str = parts[1], parts[2]
-            dt = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H-%M-%S")
-        except Exception:
-            dt = datetime.fromtimestamp(file_path.stat().st_mtime)
-        reports.append({
-            "name": file_path.name,
-            "path": file_path,
-            "rel_path": file_path.relative_to(base_dir).as_posix(),
-            "date_time": dt
-        })
-    reports.sort(key=lambda x: x["date_time"], reverse=True)
-
-    template = Template(INDEX_TEMPLATE)
-    html = template.render(reports=reports)
-    index_path = base_dir / "отчет.html"
-    index_path.write_text(html, encoding="utf-8")
+            if settings["archive"]:
+                archive.parent.mkdir(parents=True, exist_ok=True)
+                zf = zipfile.ZipFile(archive, "a", compression=zipfile.ZIP_DEFLATED)
+            for entry in items:
+                report = base_dir / entry["path"]
+                files = [p for p in _report_files(report) if p.exists()]
+                try:
+                    if zf is not None:
+                        for path in files:
+                            members = sorted(path.rglob("*")) if path.is_dir() else [path]
+                            for member in members:
+                                if member.is_file():
+                                    zf.write(member, member.relative_to(base_dir).as_posix())
+                        entry["archive"] = archive.relative_to(base_dir).as_posix()
+                    else:
+                        entry["removed"] = True
+                    for path in files:
+                        if path.is_dir():
+                            shutil.rmtree(path)
+                        else:
+                            path.unlink()
+                    try:
+                        report.parent.rmdir()  # папка дня пуста — удаляем
+                    except OSError:
+                        pass
+                    touched.add(month)
+                    done += 1
+                except OSError as e:
+                    logger.warning(f"⚠️ Не удалось убрать старый отчёт {report}: {e}")
+                    entry.pop("archive", None)
+                    entry.pop("removed", None)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.warning(f"⚠️ Не удалось открыть архив {archive}: {e}")
+        finally:
+            if zf is not None:
+                zf.close()
+
+    entries[:] = [e for e in entries if not e.get("removed")]
+    _write_manifest(base_dir, entries)
+    action = "заархивировано" if settings["archive"] else "удалено"
+    logger.info(f"🗄️ Отчётов старше {keep_days} дн.: {action} {done}")
+    return touched
+
+
+def _month_label(month: str) -> str:
+    year, number = month.split("-")
+    return f"{MONTH_NAMES[int(number) - 1]} {year}"
+
+
+def _with_names(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(e, name=e["path"].rsplit("/", 1)[-1]) for e in entries]
+
+
+def _index_state(base_dir: Path, entries: List[Dict[str, Any]], settings: dict) -> Dict[str, Any]:
+    """
+    Сводка журнала по записям, отсортированным от новых к старым:
+    - months: число отчётов по месяцам
+    - tail: все отчёты последнего месяца и не меньше index_recent последних
+    - oldest: дата самого старого отчёта, ещё не убранного по сроку хранения
+    - manifest_size: размер reports.jsonl, которому сводка соответствует
+    """
+    months: Dict[str, int] = {}
+    for entry in entries:
+        months[entry["date"][:7]] = months.get(entry["date"][:7], 0) + 1
+    newest_month = entries[0]["date"][:7] if entries else None
+    tail = [e for k, e in enumerate(entries) if k < settings["index_recent"] or e["date"][:7] == newest_month]
+    live = [e["date"] for e in entries if not e.get("archive")]
+    return {
+        "months": months,
+        "tail": tail,
+        "oldest": min(live) if live else None,
+        "manifest_size": (base_dir / MANIFEST_NAME).stat().st_size,
+    }
+
+
+def _load_index_state(base_dir: Path) -> Optional[Dict[str, Any]]:
+    """Сводка журнала, если она есть и соответствует reports.jsonl (иначе None — журнал читается целиком)."""
+    manifest = base_dir / MANIFEST_NAME
+    try:
+        state = json.loads((base_dir / INDEX_STATE_NAME).read_text(encoding="utf-8"))
+        if state["manifest_size"] == manifest.stat().st_size:
+            return state
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _save_index_state(base_dir: Path, state: Dict[str, Any]) -> None:
+    path = base_dir / INDEX_STATE_NAME
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _append_to_state(
+    base_dir: Path, state: Optional[Dict[str, Any]], new_report: Optional[Dict[str, Any]], now: datetime, settings: dict
+) -> bool:
+    """
+    Дописывает новый отчёт в журнал и сводку без чтения журнала. False — нужен полный проход:
+    сводки нет или она устарела, подошёл срок хранения, в хвосте меньше index_recent
+    отчётов или отчёт датирован раньше последнего месяца.
+    """
+    if state is None:
+        return False
+    if settings["keep_days"] and state["oldest"]:
+        cutoff = (now - timedelta(days=settings["keep_days"])).isoformat(timespec="seconds")
+        if state["oldest"] < cutoff:
+            return False
+    tail = state["tail"]
+    if len(tail) < min(settings["index_recent"], sum(state["months"].values())):
+        return False
+    if not new_report or any(e["path"] == new_report["path"] for e in tail[:5]):
+        return True
+    month = new_report["date"][:7]
+    if tail and month < tail[0]["date"][:7]:
+        return False
+
+    append_manifest(base_dir, new_report)
+    tail.insert(0, new_report)
+    tail.sort(key=lambda e: e["date"], reverse=True)
+    tail[:] = [e for k, e in enumerate(tail) if k < settings["index_recent"] or e["date"][:7] == month]
+    state["months"][month] = state["months"].get(month, 0) + 1
+    state["oldest"] = min(state["oldest"] or new_report["date"], new_report["date"])
+    state["manifest_size"] = (base_dir / MANIFEST_NAME).stat().st_size
+    return True
+
+
+def update_reports_index(new_report: Optional[Dict[str, Any]] = None, settings: Optional[dict] = None) -> Path:
+    """
+    🔹 Обновляет список отчётов (отчет.html).
+    - Новый отчёт дописывается в журнал reports.jsonl и в его сводку (reports_index.json):
+      главная и страница месяца строятся по сводке, журнал целиком не читается
+    - Полный проход по журналу — только без сводки (первый запуск, журнал изменён вручную)
+      и когда подошёл срок хранения (keep_days): тогда же применяется retention
+    - Главная страница: последние index_recent отчётов по месяцам + ссылки на месяцы;
+      перерисовываются только главная и страницы затронутых месяцев
+    """
+    settings = settings or DEFAULT_REPORT
+    base_dir = reports_base_dir()
+    base_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now()
+    with _index_lock:
+        months_dir = base_dir / MONTHS_DIR
+        months_dir.mkdir(exist_ok=True)
+        month_template = _template("month.html")
+        state = _load_index_state(base_dir)
+        if _append_to_state(base_dir, state, new_report, now, settings):
+            # Затронут только месяц нового отчёта: все его отчёты — в хвосте сводки
+            if new_report:
+                month = new_report["date"][:7]
+                _render_to_file(
+                    month_template, months_dir / f"{month}.html", label=_month_label(month),
+                    reports=_with_names([e for e in state["tail"] if e["date"][:7] == month])
+                )
+        else:
+            entries, rebuilt = load_manifest(base_dir)
+            if new_report and not any(e["path"] == new_report["path"] for e in entries[-5:]):
+                append_manifest(base_dir, new_report)
+                entries.append(new_report)
+            touched = apply_retention(base_dir, entries, now, settings)
+            entries.sort(key=lambda e: e["date"], reverse=True)
+
+            by_month: Dict[str, List[Dict[str, Any]]] = {}
+            for entry in entries:
+                by_month.setdefault(entry["date"][:7], []).append(entry)
+            if rebuilt or state is None:
+                touched = set(by_month) | {path.stem for path in months_dir.glob("*.html")}
+            elif new_report:
+                touched.add(new_report["date"][:7])
+            for month in touched:
+                path = months_dir / f"{month}.html"
+                if month in by_month:
+                    _render_to_file(month_template, path, label=_month_label(month),
+                                    reports=_with_names(by_month[month]))
+                elif path.exists():
+                    path.unlink()
+            state = _index_state(base_dir, entries, settings)
+        _save_index_state(base_dir, state)
+
+        entries = state["tail"]
+        recent: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in _with_names(entries[:settings["index_recent"]]):
+            recent.setdefault(_month_label(entry["date"][:7]), []).append(entry)
+        months = [
+            {"label": _month_label(month), "href": f"{MONTHS_DIR}/{month}.html", "count": count}
+            for month, count in sorted(state["months"].items(), reverse=True)
+        ]
+        index_path = base_dir / "отчет.html"
+        _render_to_file(
+            _template("index.html"), index_path,
+            recent=list(recent.items()), months=months,
+            newest=entries[0]["path"] if entries else None
+        )
     print(f"Обновлен файл отчетов: {index_path}")
+    return index_path
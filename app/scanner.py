@@ -0,0 +1,244 @@
+# app/scanner.py
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from app.database import load_dir_state, save_dir_changes
+from app.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_SCAN = {
+    "dir_cache": False,        # не перечитывать папки с неизменным mtime (правки «на месте» не видны)
+    "full_rescan_every": 10,   # каждый N-й запуск источника — полное сканирование
+}
+
+
+def scan_settings(config: dict) -> dict:
+    """Настройки сканирования из секции `scan` конфига."""
+    section = (config or {}).get("scan") or {}
+    settings = dict(DEFAULT_SCAN)
+    if isinstance(section.get("dir_cache"), bool):
+        settings["dir_cache"] = section["dir_cache"]
+    every = section.get("full_rescan_every")
+    if isinstance(every, int) and not isinstance(every, bool) and every >= 1:
+        settings["full_rescan_every"] = every
+    return settings
+
+
+class FileEntry(NamedTuple):
+    """Файл, найденный при сканировании: путь, относительный путь, ключ кэша и stat."""
+    path: str       # полный путь к файлу
+    rel_path: str   # путь относительно корня источника (разделители ОС)
+    key: str        # нормализованный ключ кэша: '/' и нижний регистр
+    mtime: float
+    size: int
+
+
+class DirCache:
+    """
+    🔹 Кэш содержимого папок одного источника (таблица dir_cache).
+    - Папка, чей mtime не изменился, не перечитывается: её файлы (имя, mtime, size)
+      и подпапки берутся из кэша, обход продолжается в подпапки
+    - mtime папки меняется при добавлении/удалении/переименовании записей, но не при
+      правке файла «на месте»: кэш такие правки не видит, и файл не синхронизируется
+      до полного сканирования (каждый full_rescan_every-й запуск, trusted=False).
+      Поэтому кэш выключен по умолчанию и годится только для источников, где
+      программы сохраняют файлы заменой (временный файл + переименование)
+    - Потокобезопасен (параллельный обход)
+    """
+
+    def __init__(self, source_name: str, trusted: bool = True):
+        self.source_name = source_name
+        self.trusted = trusted
+        self.skipped = 0
+        self.replayed = 0   # файлов, взятых из кэша без stat
+        self._records = load_dir_state(source_name)
+        self._changes: Dict[str, Tuple[float, int, str]] = {}
+        self._visited = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, dir_path: str, rel_dir: str, mtime: float) -> Optional[dict]:
+        """Сохранённое содержимое папки, если её mtime не изменился; иначе None."""
+        with self._lock:
+            self._visited.add(rel_dir)
+            record = self._records.get(rel_dir)
+        if not self.trusted or not record or record[0] != mtime:
+            return None
+        try:
+            listing = json.loads(record[2])
+        except (TypeError, ValueError):
+            return None
+        if len(listing["f"]) + len(listing["d"]) != record[1]:
+            return None  # запись повреждена — перечитываем папку
+        with self._lock:
+            self.skipped += 1
+            self.replayed += len(listing["f"])
+        return listing
+
+    def store(self, rel_dir: str, mtime: float, files: List[list], subdirs: List[str]) -> None:
+        """Запоминает прочитанное содержимое папки (пишется в БД только при изменении)."""
+        record = (mtime, len(files) + len(subdirs),
+                  json.dumps({"f": files, "d": subdirs}, ensure_ascii=False, separators=(",", ":")))
+        with self._lock:
+            if self._records.get(rel_dir) != record:
+                self._records[rel_dir] = self._changes[rel_dir] = record
+
+    def save(self) -> None:
+        """Ставит изменения в очередь записи; удаляет записи исчезнувших папок."""
+        with self._lock:
+            removed = [rel_dir for rel_dir in self._records if rel_dir not in self._visited]
+            changes, self._changes = self._changes, {}
+        save_dir_changes(self.source_name, changes, removed)
+
+
+def scan_files(root: Path, dir_cache: Optional[DirCache] = None) -> Iterator[FileEntry]:
+    """
+    🔹 Потоково обходит дерево через os.scandir.
+    - Отдаёт файлы сразу, не дожидаясь конца сканирования
+    - stat берётся из DirEntry (на Windows/SMB — без отдельного запроса к серверу)
+    - Относительный путь и ключ кэша собираются из имён, без relpath
+    - Недоступные папки и файлы пропускаются с предупреждением
+    - dir_cache: папки с неизменным mtime не перечитываются (см. DirCache)
+    """
+    stack = [(str(root), "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        for item in _scan_dir(dir_path, rel_dir, dir_cache):
+            if isinstance(item, FileEntry):
+                yield item
+            else:
+                stack.append(item)
+
+
+def scan_files_parallel(
+    root: Path,
+    workers: int = 4,
+    queue_size: int = 10000,
+    dir_cache: Optional[DirCache] = None
+) -> Iterator[FileEntry]:
+    """
+    🔹 Параллельный обход одного источника.
+    - Пул из workers потоков разбирает очередь папок (каждая подпапка — отдельная задача)
+    - Найденные файлы складываются в одну ограниченную очередь и отдаются по мере появления
+    - При workers <= 1 используется обычный последовательный scan_files
+    """
+    if workers <= 1:
+        yield from scan_files(root, dir_cache)
+        return
+
+    dirs: "queue.Queue" = queue.Queue()
+    results: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    outstanding = [1]  # папки в очереди + в работе
+    outstanding_lock = threading.Lock()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker() -> None:
+        while not stop.is_set():
+            job = dirs.get()
+            if job is None:
+                return
+            dir_path, rel_dir = job
+            try:
+                for item in _scan_dir(dir_path, rel_dir, dir_cache):
+                    if isinstance(item, FileEntry):
+                        if not put(item):
+                            return
+                    else:
+                        with outstanding_lock:
+                            outstanding[0] += 1
+                        dirs.put(item)
+            finally:
+                with outstanding_lock:
+                    outstanding[0] -= 1
+                    finished = outstanding[0] == 0
+                if finished:
+                    put(done)
+
+    dirs.put((str(root), ""))
+    threads = [
+        threading.Thread(target=worker, name=f"scan-{root.name}-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        for _ in threads:
+            dirs.put(None)
+        for t in threads:
+            t.join(timeout=1.0)
+
+
+def _scan_dir(dir_path: str, rel_dir: str, dir_cache: Optional[DirCache] = None) -> Iterator:
+    """Читает одну папку: отдаёт FileEntry для файлов и (путь, rel) для подпапок."""
+    files: List[list] = []
+    subdirs: List[str] = []
+    dir_mtime = None
+    if dir_cache is not None:
+        try:
+            # mtime — до чтения: изменения во время чтения заставят перечитать папку в следующий раз
+            dir_mtime = float(os.stat(dir_path).st_mtime)
+        except OSError as e:
+            logger.warning(f"⚠️ Ошибка при сканировании {dir_path}: {e}")
+            return
+        listing = dir_cache.lookup(dir_path, rel_dir, dir_mtime)
+        if listing is not None:
+            for name, mtime, size in listing["f"]:
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                yield FileEntry(
+                    path=os.path.join(dir_path, name),
+                    rel_path=rel_path,
+                    key=rel_path.replace("\\", "/").lower(),
+                    mtime=mtime,
+                    size=size,
+                )
+            for name in listing["d"]:
+                yield os.path.join(dir_path, name), os.path.join(rel_dir, name) if rel_dir else name
+            return
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        yield entry.path, rel_path
+                        continue
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError as e:
+                    logger.debug(f"⚠️ Не удалось прочитать метаданные: {entry.path} | {e}")
+                    continue
+                files.append([entry.name, float(st.st_mtime), int(st.st_size)])
+                yield FileEntry(
+                    path=entry.path,
+                    rel_path=rel_path,
+                    key=rel_path.replace("\\", "/").lower(),
+                    mtime=float(st.st_mtime),
+                    size=int(st.st_size),
+                )
+    except OSError as e:
+        logger.warning(f"⚠️ Ошибка при сканировании {dir_path}: {e}")
+        return
+    if dir_cache is not None:
+        dir_cache.store(rel_dir, dir_mtime, files, subdirs)
@@ -0,0 +1,246 @@
+# app/scheduler.py
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+from app.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_SCHEDULER = {
+    "max_sources": 20,     # одновременно синхронизируемых источников (всего)
+    "max_per_host": 2,     # одновременно синхронизируемых источников с одного ПК
+    "global_rate_mb": 0,   # общий лимит чтения, МБ/с (0 — без ограничения)
+    "host_rate_mb": 0,     # лимит чтения с одного ПК, МБ/с (0 — без ограничения)
+}
+
+LOCAL_HOST = "local"
+
+
+def host_of(path: str) -> str:
+    """Имя ПК из UNC-пути (\\\\host\\share → host); для локальных путей — 'local'."""
+    if path.startswith("\\\\") or path.startswith("//"):
+        parts = path.replace("/", "\\").split("\\")
+        if len(parts) > 2 and parts[2]:
+            return parts[2].lower()
+    return LOCAL_HOST
+
+
+def _parse_hhmm(value: str) -> int:
+    hours, minutes = str(value).split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+# Лимиты на число источников — целые ≥ 1, лимиты скорости — числа ≥ 0 (0 — без ограничения)
+_SLOT_LIMITS = ("max_sources", "max_per_host")
+
+
+def _limit_error(key: str, value) -> Optional[str]:
+    """None, если значение лимита key допустимо, иначе описание требования."""
+    if key in _SLOT_LIMITS:
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 1:
+            return None
+        return "целым числом ≥ 1"
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+        return None
+    return "числом ≥ 0"
+
+
+def _parse_limits(section: dict, where: str) -> dict:
+    """Допустимые лимиты из section; неверные — предупреждение и пропуск."""
+    limits = {}
+    for key in DEFAULT_SCHEDULER:
+        if key not in section:
+            continue
+        error = _limit_error(key, section[key])
+        if error:
+            logger.warning(
+                f"⚠️ '{key}' {where} должен быть {error} (указано {section[key]!r}) — значение пропущено"
+            )
+            continue
+        limits[key] = section[key]
+    return limits
+
+
+def scheduler_settings(config: dict) -> dict:
+    """
+    🔹 Настройки планировщика из секции `scheduler` конфига.
+    Неверный лимит (строка, ноль слотов, отрицательная скорость) — предупреждение
+    и значение по умолчанию; профиль без корректных from/to (ЧЧ:ММ) пропускается.
+    profiles — список {"start": мин, "end": мин, "limits": {...}} (минуты от полуночи).
+    """
+    section = (config or {}).get("scheduler") or {}
+    if not isinstance(section, dict):
+        logger.warning("⚠️ Секция 'scheduler' должна быть словарём — используются значения по умолчанию")
+        section = {}
+    settings = dict(DEFAULT_SCHEDULER)
+    settings.update(_parse_limits(section, "в секции scheduler"))
+
+    profiles: List[dict] = []
+    raw_profiles = section.get("profiles") or []
+    if not isinstance(raw_profiles, list):
+        logger.warning("⚠️ 'scheduler.profiles' должен быть списком — профили не применяются")
+        raw_profiles = []
+    for profile in raw_profiles:
+        try:
+            start, end = _parse_hhmm(profile["from"]), _parse_hhmm(profile["to"])
+        except (KeyError, ValueError, TypeError, AttributeError):
+            logger.warning(f"⚠️ Некорректный профиль планировщика: {profile}")
+            continue
+        where = f"в профиле {profile['from']}–{profile['to']}"
+        profiles.append({"start": start, "end": end, "limits": _parse_limits(profile, where)})
+    settings["profiles"] = profiles
+    return settings
+
+
+class TokenBucket:
+    """
+    🔹 Ограничитель скорости (байт/с).
+    Запрос больше ёмкости не отклоняется: бакет уходит в минус, и следующий
+    запрос ждёт, пока долг не будет «выплачен».
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int) -> float:
+        """Списывает amount байт; возвращает время ожидания (сек)."""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class _Limiter:
+    """Семафор с изменяемым лимитом (лимит берётся из текущего профиля при каждом захвате)."""
+
+    def __init__(self):
+        self.active = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, limit_fn) -> float:
+        started = time.monotonic()
+        with self.cond:
+            while self.active >= max(1, limit_fn()):
+                self.cond.wait(timeout=1.0)
+            self.active += 1
+        return time.monotonic() - started
+
+    def release(self) -> None:
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+
+class Scheduler:
+    """
+    🔹 Общий планировщик для основной синхронизации и фонового мониторинга.
+    - Ограничивает число одновременно синхронизируемых источников: всего и на один ПК
+    - Ограничивает скорость чтения (token bucket): всего и с одного ПК
+    - Профили по времени суток (`profiles`) переопределяют лимиты, например днём
+    - Считает, сколько времени работа ждала из-за ограничений: всего по ПК (throttled)
+      и через on_wait — в метрики источника
+    """
+
+    def __init__(self, settings: Optional[dict] = None):
+        settings = settings or scheduler_settings({})
+        self.base = {key: settings[key] for key in DEFAULT_SCHEDULER}
+        self.profiles = [(p["start"], p["end"], p["limits"]) for p in settings["profiles"]]
+
+        self._lock = threading.Lock()
+        self._global = _Limiter()
+        self._hosts: Dict[str, _Limiter] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._global_bucket: Optional[TokenBucket] = None
+        self._active_profile: Optional[dict] = None
+        self.throttled: Dict[str, float] = {}
+
+    def limits(self, now: Optional[datetime] = None) -> dict:
+        """Действующие лимиты с учётом профиля по времени суток."""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        limits = dict(self.base)
+        for start, end, overrides in self.profiles:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                limits.update(overrides)
+                break
+        return limits
+
+    def _record(self, host: str, waited: float, on_wait: Optional[Callable[[float], None]] = None) -> None:
+        if waited > 0.01:  # мгновенный захват свободного слота не считаем
+            with self._lock:
+                self.throttled[host] = self.throttled.get(host, 0.0) + waited
+            if on_wait:
+                on_wait(waited)
+
+    @contextmanager
+    def source_slot(self, host: str, on_wait: Optional[Callable[[float], None]] = None) -> Iterator[None]:
+        """Слот на синхронизацию одного источника с ПК host (on_wait(сек) — если пришлось ждать)."""
+        with self._lock:
+            host_limiter = self._hosts.setdefault(host, _Limiter())
+        # Сначала слот ПК, потом общий: ожидающий своей очереди ПК не занимает общий слот
+        waited = host_limiter.acquire(lambda: self.limits()["max_per_host"])
+        try:
+            waited += self._global.acquire(lambda: self.limits()["max_sources"])
+        except BaseException:
+            host_limiter.release()
+            raise
+        self._record(host, waited, on_wait)
+        try:
+            yield
+        finally:
+            self._global.release()
+            host_limiter.release()
+
+    def _refresh_buckets(self, limits: dict) -> None:
+        if limits == self._active_profile:
+            return
+        self._active_profile = limits
+        global_rate = float(limits["global_rate_mb"]) * 1024 * 1024
+        self._global_bucket = TokenBucket(global_rate) if global_rate > 0 else None
+        self._buckets.clear()
+
+    def throttle(self, host: str, nbytes: int, on_wait: Optional[Callable[[float], None]] = None) -> None:
+        """Учитывает nbytes, прочитанных с ПК host; при превышении лимита ждёт (и сообщает в on_wait)."""
+        limits = self.limits()
+        with self._lock:
+            self._refresh_buckets(limits)
+            host_rate = float(limits["host_rate_mb"]) * 1024 * 1024
+            bucket = self._buckets.get(host)
+            if bucket is None and host_rate > 0:
+                bucket = self._buckets[host] = TokenBucket(host_rate)
+            global_bucket = self._global_bucket
+        waited = 0.0
+        if global_bucket:
+            waited += global_bucket.consume(nbytes)
+        if bucket:
+            waited += bucket.consume(nbytes)
+        self._record(host, waited, on_wait)
+
+    def throttler(self, host: str, on_wait: Optional[Callable[[float], None]] = None):
+        """Колбэк для передачи в хеширование/копирование: throttler(host)(nbytes)."""
+        return lambda nbytes: self.throttle(host, nbytes, on_wait)
+
+    def log_summary(self) -> None:
+        """Пишет в лог, сколько времени работа ждала из-за ограничений."""
+        if not self.throttled:
+            logger.info("⏱️ Ограничения планировщика не срабатывали.")
+            return
+        total = sum(self.throttled.values())
+        details = ", ".join(f"{host}: {sec:.1f} с" for host, sec in sorted(self.throttled.items()))
+        logger.info(f"⏱️ Ожидание из-за ограничений: {total:.1f} с ({details})")
@@ -0,0 +1,66 @@
+# app/settings.py
+from typing import Dict, List
+from app.config_loader import SOURCE_NUMBERS, source_number_error
+from app.copier import copy_settings
+from app.dedup import dedup_settings
+from app.delta import delta_settings
+from app.hashing import hashing_settings
+from app.journal import journal_settings
+from app.logger import get_logger
+from app.metrics import metrics_settings
+from app.pipeline import pipeline_settings
+from app.reporter import report_settings
+from app.scanner import scan_settings
+from app.scheduler import scheduler_settings
+
+logger = get_logger()
+
+# Секции конфига, которые читают стадии синхронизации: имя → разбор секции
+SECTIONS = {
+    "hashing": hashing_settings,
+    "copy": copy_settings,
+    "delta": delta_settings,
+    "dedup": dedup_settings,
+    "scan": scan_settings,
+    "pipeline": pipeline_settings,
+    "metrics": metrics_settings,
+    "report": report_settings,
+    "journal": journal_settings,
+    "scheduler": scheduler_settings,
+}
+
+
+def load_settings(config: dict) -> Dict[str, dict]:
+    """
+    🔹 Настройки стадий синхронизации из конфига: {секция: настройки}.
+    Разбираются один раз при создании запуска и передаются стадиям явно —
+    модули не хранят их в глобальных переменных, так что несколько запусков
+    с разными конфигами в одном процессе друг другу не мешают.
+    """
+    return {name: parse(config) for name, parse in SECTIONS.items()}
+
+
+def source_settings(config: dict) -> List[dict]:
+    """
+    🔹 Источники из секции `sources` конфига, проверенные до начала синхронизации.
+    - Без name или path источник пропускается с предупреждением
+    - Неверный числовой параметр (scan_workers, interval_sec, wait_sec, timeout_sec:
+      строка, ноль потоков, отрицательное время) — предупреждение и значение по умолчанию,
+      а не ошибка посреди обхода
+    """
+    sources = []
+    for idx, source in enumerate((config or {}).get("sources") or [], 1):
+        if not isinstance(source, dict) or not source.get("name") or not source.get("path"):
+            logger.warning(f"⚠️ Источник #{idx} пропущен: нужны 'name' и 'path'")
+            continue
+        source = dict(source)
+        for key in SOURCE_NUMBERS:
+            error = source_number_error(source, key)
+            if error:
+                logger.warning(
+                    f"⚠️ '{key}' у источника {source['name']} должен быть {error} "
+                    f"(указано {source[key]!r}) — используется значение по умолчанию"
+                )
+                del source[key]
+        sources.append(source)
+    return sources
@@ -1,47 +1,126 @@
 # app/smb_utils.py
 import os
+import time
 from pathlib import Path
-from shutil import copy2
-from typing import List, Tuple, Dict
+from itertools import islice
+from typing import Callable, List, Tuple, Dict, Optional, Iterable, Iterator
 from tqdm import tqdm
-from app.database import load_state, save_state
-from app.hashing import calculate_hash, get_file_info
+from app.copier import copy_file, copy_with_hash, temp_path
+from app.database import (
+    SourceCache, save_changes, load_dest_state, save_dest_changes, next_scan_number, note_dest_content,
+    delete_dest_state, load_block_sum_paths, load_transfers
+)
+from app.dedup import dedup_min_size, find_existing, has_candidates, materialize
+from app.delta import delta_threshold, delta_update
+from app.hashing import QUICK_EXACT_SIZE, QuickFingerprint, calculate_hash, get_file_info, quick_fingerprint
+from app.journal import ChangeLog, finish_run, start_run
 from app.logger import get_logger
+from app.metrics import SourceMetrics
+from app.pipeline import StagePool
+from app.scanner import DirCache, FileEntry, scan_files_parallel
+from app.settings import load_settings
 
 logger = get_logger()
 
+# Сколько ключей кэша подгружать из БД за раз (в lazy-режиме)
+PREFETCH_WINDOW = 5000
 
-def make_relative_key(source_root: Path, file_path: Path) -> str:
+
+def iter_windows(items: Iterable, size: int) -> Iterator[List]:
+    """Нарезает поток на списки по size элементов (для пакетной подгрузки кэша)."""
+    it = iter(items)
+    while True:
+        window = list(islice(it, size))
+        if not window:
+            return
+        yield window
+
+
+def dest_fingerprint(dest_file: Path, expected_size: int) -> Optional[Dict]:
     """
-    Создаёт нормализованный ключ для кэша.
-    Использует os.path.relpath для корректной работы с UNC.
+    Возвращает отпечаток только что записанного файла назначения (mtime/size).
+    При следующем запуске неизменённый файл не придётся хешировать заново.
+    Если копирование не удалось (размер не совпал) — возвращает None.
     """
+    info = get_file_info(dest_file)
+    if not info or info[1] != expected_size:
+        return None
+    mtime, size = info
+    return {"mtime": mtime, "size": size}
+
+
+def file_identity(path: Path) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime_ns, size) файла: любая запись через временный файл и os.replace его меняет."""
     try:
-        rel = os.path.relpath(str(file_path), str(source_root))
-        return os.path.normpath(rel).replace("\\", "/").lower()
-    except Exception as e:
-        logger.warning(f"⚠️ Не удалось вычислить относительный путь для {file_path}: {e}")
-        # Резервный способ
+        st = path.stat()
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def purge_dest_state(source: Path, main_root: Path, current_files: set, dest_cache) -> List[str]:
+    """
+    🔹 Состояние назначения для файлов, которых больше нет в источнике.
+    - Отпечатки (dest_cache) и суммы блоков (block_sums) файлов под main_root,
+      чей ключ не встретился при сканировании
+    - Недокачанные передачи (transfers + .part), чей источник удалён или изменился:
+      такую передачу всё равно пришлось бы начинать заново
+    Сами файлы назначения не удаляются. Возвращает пути, убранные из dest_cache.
+    """
+    prefix = os.path.join(str(main_root), "")
+
+    def key_of(path: str) -> Optional[str]:
+        if not path.startswith(prefix):
+            return None
+        return path[len(prefix):].replace("\\", "/").lower()
+
+    stale_dest = [path for path in dest_cache.keys()
+                  if path.startswith(prefix) and key_of(path) not in current_files]
+    for path in stale_dest:
+        dest_cache.pop(path, None)
+    stale_sums = [path for path in load_block_sum_paths(prefix) if key_of(path) not in current_files]
+
+    abandoned = []
+    for transfer in load_transfers(os.path.join(str(source), "")):
+        if get_file_info(Path(transfer["src_path"])) == (transfer["src_mtime"], transfer["src_size"]):
+            continue  # источник тот же — передачу можно продолжить
+        abandoned.append(transfer["dest_path"])
         try:
-            src_str = str(source_root).rstrip("\\/")
-            file_str = str(file_path)
-            if file_str.lower().startswith(src_str.lower()):
-                rel = file_str[len(src_str):].lstrip("\\/")
-                return rel.replace("\\", "/").lower()
-        except:
+            temp_path(Path(transfer["dest_path"]), "part").unlink()
+        except OSError:
             pass
-        return "unknown/" + file_path.name
+    if stale_sums or abandoned:
+        delete_dest_state(stale_sums, abandoned)
+    if stale_dest or stale_sums or abandoned:
+        logger.info(
+            f"🗑️ Назначение: убрано отпечатков {len(stale_dest)}, сумм блоков {len(stale_sums)}, "
+            f"недокачанных передач {len(abandoned)}"
+        )
+    return stale_dest
 
 
-def list_files(path: Path) -> List[Path]:
-    """Рекурсивно получает список файлов."""
-    if not path.exists():
-        return []
-    try:
-        return [f for f in path.rglob("*") if f.is_file()]
-    except Exception as e:
-        logger.warning(f"⚠️ Ошибка при сканировании {path}: {e}")
-        return []
+class FileTask:
+    """Файл, проходящий через стадии конвейера sync_folder."""
+    __slots__ = (
+        "src", "cached", "src_hash", "algo", "quick", "target_files", "main_target",
+        "old_info", "status", "dest_record", "written", "saved"
+    )
+
+    def __init__(
+        self, src: FileEntry, cached: Optional[Dict], target_files: List[Path], main_target: Path, algo: str
+    ):
+        self.src = src
+        self.cached = cached
+        self.src_hash: Optional[str] = None
+        self.algo = algo                         # алгоритм, которым посчитан src_hash
+        self.quick: Optional[str] = None         # быстрый отпечаток (начало/середина/конец)
+        self.target_files = target_files
+        self.main_target = main_target
+        self.old_info: Optional[Tuple[float, int]] = None
+        self.status: Optional[str] = None        # "added" / "modified" / None — без изменений
+        self.dest_record: Optional[Dict] = None  # пересчитанный отпечаток назначения
+        self.written: Optional[Dict] = None      # отпечаток назначения после копирования
+        self.saved = 0                           # байт сэкономлено дедупликацией
 
 
 def sync_folder(
@@ -49,18 +128,59 @@ def sync_folder(
     source_path: str,
     dest_paths: List[str],
     report_path_root: str,
-    dry_run: bool = False
-) -> Tuple[List[Tuple[str, str, Dict]], Dict[str, int]]:
+    dry_run: bool = False,
+    scan_workers: int = 1,
+    settings: Optional[Dict[str, dict]] = None,
+    throttle: Optional[Callable[[int], None]] = None,
+    deep_verify: bool = False,
+    source_cache: Optional[SourceCache] = None,
+    dest_cache: Optional[Dict[str, Dict]] = None,
+    metrics: Optional[SourceMetrics] = None,
+    run_id: Optional[int] = None
+) -> Tuple[int, Dict[str, int]]:
     """
     Синхронизирует сетевую папку с локальной.
     Исправлено: корректная обработка UNC-путей.
+    scan_workers > 1 — обход подпапок источника параллельно.
+
+    settings — настройки стадий запуска (app.settings.load_settings); без них — значения
+    по умолчанию. Модули их не запоминают: каждый вызов работает со своими.
+
+    Конвейер: сканирование → проверка кэша → хеширование → копирование → обновление состояния.
+    Стадии связаны ограниченными очередями, число потоков задаётся в settings["pipeline"]
+    (hash_workers, copy_workers, queue_size), так что чтение по сети и запись
+    на локальный диск идут одновременно.
+    throttle(n) вызывается на каждые n байт, прочитанных из источника (лимит скорости).
+
+    Проверка изменений по уровням: mtime/size из кэша → быстрый отпечаток
+    (начало/середина/конец) → полный хеш. Отпечатку файла больше QUICK_EXACT_SIZE
+    доверяют только с hashing.quick_trust_large. deep_verify=True пропускает первые два
+    уровня и пересчитывает полные хеши источника и назначения (и сканирует все папки).
+
+    source_cache/dest_cache — «тёплые» кэши, которые вызывающий (демон) держит
+    между запусками: тогда они не загружаются из БД заново и не закрываются.
+
+    metrics — время по фазам и счётчики источника (SourceMetrics); демон передаёт
+    один объект на несколько проходов, чтобы накопить их до отчёта.
+
+    Изменённые файлы пишутся пачками в журнал change_log запуска run_id (без него
+    регистрируется отдельный запуск); возвращается их число и статистика.
     """
+    started = time.perf_counter()
+    settings = settings or load_settings({})
+    hashing, pipeline, scan = settings["hashing"], settings["pipeline"], settings["scan"]
+    algorithm = hashing["algorithm"]
+    chunk_size = hashing["chunk_kb"] * 1024
+    if metrics is None:
+        metrics = SourceMetrics(name, settings["metrics"]["slowest_files"])
+    # Все чтения источника проходят через счётчик байт (и ограничение скорости)
+    read_source = metrics.reader(throttle)
     source = Path(source_path)
     logger.info(f"📁 Источник: {source}")
 
     if not source.exists():
         logger.warning(f"⚠️ Источник недоступен: {source}")
-        return [], {"added": 0, "modified": 0, "copied": 0}
+        return 0, {"added": 0, "modified": 0, "copied": 0, "deduped": 0, "saved_bytes": 0, "errors": 0}
 
     # 🔹 Нормализуем пути назначения
     dest_dirs = []
@@ -75,140 +195,357 @@ def sync_folder(
     else:
         report_root = None
 
-    # 🔹 Загружаем кэш
-    db = load_state()
-    source_cache = db.get(name, {})
+    # 🔹 Загружаем кэш только этого источника (если вызывающий не держит его в памяти)
+    warm = source_cache is not None
+    with metrics.timer("db_load"):
+        if source_cache is None:
+            source_cache = SourceCache(name)
+        if dest_cache is None:
+            dest_cache = load_dest_state(name)
+
+    # 🔹 Отслеживание изменений: в БД пишется только то, что поменялось
+    pending: Dict[str, Dict] = {}
+    dest_pending: Dict[str, Dict] = {}
+    dest_removed: set = set()
 
-    stats = {"added": 0, "modified": 0, "copied": 0}
-    changed_files: List[Tuple[str, str, Dict]] = []
+    def flush_changes(deletes=()) -> None:
+        with metrics.timer("db_save"):
+            save_changes(name, pending, deletes)
+            save_dest_changes(name, dest_pending, dest_removed)
+        pending.clear()
+        dest_pending.clear()
+        dest_removed.clear()
 
-    files = list_files(source)
-    total_files = len(files)
+    # 🔹 Кэш папок: неизменённые папки не перечитываются; каждый N-й запуск — полное сканирование
+    dir_cache = None
+    if scan["dir_cache"]:
+        full_scan = deep_verify or next_scan_number(name) % scan["full_rescan_every"] == 0
+        dir_cache = DirCache(name, trusted=not full_scan)
+        if full_scan:
+            logger.info(f"🔎 '{name}': полное сканирование (без кэша папок)")
+
+    keep_quick = hashing["quick_fingerprint"]     # снимать и хранить быстрые отпечатки
+    use_quick = keep_quick and not deep_verify    # доверять им при проверке
+    # Отпечаток большого файла (начало/середина/конец) не видит правку между участками
+    # при том же размере: доверять ему — явный выбор, такие правки ловит плановый --deep-verify
+    trust_large = keep_quick and hashing["quick_trust_large"]
+
+    def wants_quick(size: int) -> bool:
+        """Отпечаток доказывает равенство, если покрывает весь файл (или большим доверяем явно)."""
+        return keep_quick and (size <= QUICK_EXACT_SIZE or trust_large)
+    stats = {"added": 0, "modified": 0, "copied": 0, "deduped": 0, "saved_bytes": 0, "errors": 0}
+    own_run = run_id is None
+    if own_run:
+        run_id = start_run("folder", dry_run)
+    change_log = ChangeLog(run_id, name, settings["journal"]["batch_rows"])
+
+    def hash_stage(task: FileTask) -> None:
+        """Хеш источника (если нужен до копирования) и сравнение с назначением."""
+        if detect_change(task) and not dry_run:
+            copy_pool.put(task)
+        else:
+            state_pool.put(task)
+
+    def detect_change(task: FileTask) -> bool:
+        """Определяет task.status; True — файл нужно копировать."""
+        try:
+            src = task.src
+            # 🔹 Один stat назначения: и наличие, и метаданные
+            task.old_info = get_file_info(task.main_target)
+            metrics.add("stat_dest")
+
+            # 🔹 mtime сбился, размер тот же: отпечаток вместо полного хеша.
+            # Запись старым алгоритмом отпечатком не подтверждаем — её надо перехешировать
+            cached = task.cached
+            resolved = task.src_hash is not None
+            if (task.src_hash is None and use_quick and cached and cached["quick"] and
+                cached["algo"] == task.algo and
+                cached["size"] == src.size and wants_quick(src.size)):
+                if src.size <= QUICK_EXACT_SIZE:
+                    # Отпечаток читает файл целиком — полный хеш в том же проходе, без повторного чтения
+                    quick = QuickFingerprint(src.size)
+                    with metrics.timer("quick", src.path, src.size):
+                        file_hash = calculate_hash(Path(src.path), read_source, task.algo, chunk_size, quick)
+                    task.quick = quick.hexdigest() if file_hash else None
+                else:
+                    file_hash = None
+                    with metrics.timer("quick", src.path, src.size):
+                        task.quick = quick_fingerprint(Path(src.path), src.size, read_source)
+                if task.quick and task.quick == cached["quick"]:
+                    task.src_hash = cached["hash"]
+                    task.algo = cached["algo"]
+                    metrics.add("quick_hits")
+                elif file_hash:
+                    task.src_hash = file_hash
+                    metrics.add("cache_misses")
+            if not resolved and task.src_hash is None:
+                metrics.add("cache_misses")
+
+            # 🔹 Кэш промахнулся, но изменение видно без хеша (нет файла / другой размер):
+            # хеш посчитается при копировании — источник читается один раз
+            if task.src_hash is None and not dry_run:
+                if not task.old_info:
+                    task.status = "added"
+                elif task.old_info[1] != src.size:
+                    task.status = "modified"
+                if task.status:
+                    return True
+
+            if task.src_hash is None:
+                # Отпечаток — из тех же блоков: источник по сети читается один раз
+                quick = QuickFingerprint(src.size) if wants_quick(src.size) and task.quick is None else None
+                with metrics.timer("source_hash", src.path, src.size):
+                    task.src_hash = calculate_hash(Path(src.path), read_source, task.algo, chunk_size, quick)
+                if not task.src_hash:
+                    return False
+                if quick is not None:
+                    task.quick = quick.hexdigest()
+
+            if not task.old_info:
+                task.status = "added"
+                return True
+
+            old_mtime, old_size = task.old_info
+            # 🔹 Хешируем назначение, только если оно изменилось с прошлой записи
+            # (сравниваем только хеши одного алгоритма)
+            dest_cached = dest_cache.get(str(task.main_target))
+            if (dest_cached and not deep_verify and
+                dest_cached["size"] == old_size and
+                dest_cached["mtime"] == old_mtime and
+                dest_cached["algo"] == task.algo):
+                dest_hash = dest_cached["hash"]
+                metrics.add("dest_cache_hits")
+            else:
+                with metrics.timer("dest_hash", str(task.main_target), old_size):
+                    dest_hash = calculate_hash(task.main_target, algorithm=task.algo, chunk_size=chunk_size)
+                metrics.add("dest_hashed")
+                if dest_hash:
+                    task.dest_record = {
+                        "hash": dest_hash, "mtime": old_mtime, "size": old_size, "algo": task.algo
+                    }
+            if dest_hash and task.src_hash != dest_hash:
+                task.status = "modified"
+            elif wants_quick(old_size) and task.quick is None and dest_hash == task.src_hash:
+                # Старая запись без отпечатка: снимаем его с локальной копии (содержимое то же)
+                with metrics.timer("quick"):
+                    task.quick = quick_fingerprint(task.main_target, old_size)
+            return task.status is not None
+        except Exception as e:
+            logger.error(f"❌ Ошибка при обработке файла {task.src.path}: {e}")
+            return False
+
+    def copy_stage(task: FileTask) -> None:
+        """Копирование во все папки назначения за одно чтение источника (хеш — попутно, если неизвестен)."""
+        try:
+            # Основное назначение не подменилось — копирование не удалось, даже если хеш известен
+            before = file_identity(task.main_target)
+            threshold = delta_threshold(settings["delta"])
+            dedup_size = dedup_min_size(settings["dedup"])
+            if (task.status == "modified" and threshold is not None and
+                task.src.size >= threshold and task.old_info):
+                copied_hash = delta_copy(task)
+            elif task.status == "added" and dedup_size is not None and task.src.size >= dedup_size:
+                copied_hash = dedup_copy(task)
+            else:
+                copied_hash = copy_all(task)
+            if copied_hash:
+                task.src_hash = copied_hash
+            if file_identity(task.main_target) != before:
+                task.written = dest_fingerprint(task.main_target, task.src.size)
+            if task.written and wants_quick(task.src.size) and task.quick is None:
+                # Отпечаток с локальной копии — без лишних чтений по сети
+                with metrics.timer("quick"):
+                    task.quick = quick_fingerprint(task.main_target, task.src.size)
+        finally:
+            state_pool.put(task)
+
+    def copy_all(task: FileTask) -> Optional[str]:
+        """Полное копирование во все назначения за одно чтение источника."""
+        with metrics.timer("copy", task.src.path, task.src.size):
+            copied_hash = copy_with_hash(
+                Path(task.src.path), task.target_files, task.algo, read_source,
+                known_hash=task.src_hash, settings=settings["copy"]
+            )
+        if copied_hash:
+            metrics.add("bytes_written", task.src.size * len(task.target_files))
+        return copied_hash
+
+    def delta_copy(task: FileTask) -> Optional[str]:
+        """Большой изменённый файл: поблочно обновляем основное назначение, остальные — из него."""
+        src_file = Path(task.src.path)
+        with metrics.timer("delta", task.src.path, task.src.size):
+            file_hash = delta_update(
+                src_file, task.main_target, task.old_info, task.algo, read_source, metrics.writer(),
+                settings["delta"]
+            )
+        if not file_hash:
+            return copy_all(task)
+        for dest_file in task.target_files:
+            if dest_file == task.main_target:
+                continue
+            try:
+                with metrics.timer("copy", str(dest_file), task.src.size):
+                    copy_file(task.main_target, dest_file, settings["copy"]["backend"])
+                metrics.add("bytes_written", task.src.size)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обновления {dest_file}: {e}")
+        return file_hash
+
+    def dedup_copy(task: FileTask) -> Optional[str]:
+        """Новый файл: если такое содержимое уже есть в назначении — ссылка вместо копии."""
+        src_file = Path(task.src.path)
+        if task.src_hash is None:
+            # Без кандидатов того же размера хешировать заранее незачем: копируем за одно чтение
+            if not has_candidates(task.src.size, task.algo):
+                return copy_all(task)
+            with metrics.timer("source_hash", task.src.path, task.src.size):
+                task.src_hash = calculate_hash(src_file, read_source, task.algo, chunk_size)
+            if not task.src_hash:
+                return None
+        origin = find_existing(task.src.size, task.algo, task.src_hash)
+        if origin is None:
+            return copy_all(task)
+        with metrics.timer("dedup", task.src.path, task.src.size):
+            _, task.saved = materialize(origin, task.target_files, settings["dedup"]["mode"])
+        metrics.add("bytes_written", task.src.size * len(task.target_files) - task.saved)
+        return task.src_hash
+
+    def state_stage(task: FileTask) -> None:
+        """Единственный поток, меняющий кэш, статистику и журнал изменений."""
+        try:
+            src = task.src
+            copied = dry_run or task.written is not None
+            if task.status and not copied:
+                # Файл не записан: не считаем его скопированным и не пишем в журнал —
+                # следующий запуск увидит расхождение и повторит копирование
+                stats["errors"] += 1
+                logger.error(f"❌ {name}: не удалось записать {src.rel_path} в назначение")
+            if not task.src_hash:
+                return
+
+            # 🔹 Обновляем кэш (только если запись изменилась)
+            record = {
+                "hash": task.src_hash, "mtime": src.mtime, "size": src.size,
+                "algo": task.algo, "quick": task.quick
+            }
+            if task.cached != record:
+                source_cache[src.key] = pending[src.key] = record
+
+            dest_key = str(task.main_target)
+            if task.dest_record:
+                dest_cache[dest_key] = dest_pending[dest_key] = task.dest_record
+            if task.status and not dry_run:
+                if task.written:
+                    task.written["hash"] = task.src_hash
+                    task.written["algo"] = task.algo
+                    dest_cache[dest_key] = dest_pending[dest_key] = task.written
+                    note_dest_content(dest_key, task.written)
+                    dest_removed.discard(dest_key)
+                    if task.saved:
+                        stats["deduped"] += 1
+                        stats["saved_bytes"] += task.saved
+                elif dest_cache.pop(dest_key, None) is not None:
+                    dest_pending.pop(dest_key, None)
+                    dest_removed.add(dest_key)
+
+            if copied and task.status == "added":
+                stats["added"] += 1
+                stats["copied"] += 1
+                change_log.add(src.rel_path, "added", src.size, src.mtime)
+            elif copied and task.status == "modified":
+                old_mtime, old_size = task.old_info
+                stats["modified"] += 1
+                stats["copied"] += 1
+                change_log.add(src.rel_path, "modified", src.size, src.mtime, old_size, old_mtime)
+
+            # 🔹 Сохраняем изменения каждые 50 записей
+            if len(pending) + len(dest_pending) >= 50:
+                flush_changes()
+        finally:
+            pbar.update(1)
+
+    # 🔹 Потоковое сканирование: обработка начинается до окончания обхода
+    current_files = set()
 
     with tqdm(
-        total=total_files,
         desc=f"🔄 {name}",
         unit="ф",
         ncols=100,
         leave=False,
-        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]"
+        bar_format="{desc}: {n_fmt} ф [{elapsed}, {rate_fmt}]"
     ) as pbar:
-        for src_file in files:
-            try:
-                # ✅ Используем os.path.relpath
-                try:
-                    rel_path_str = os.path.relpath(str(src_file), str(source))
-                    relative_path = Path(rel_path_str)
-                except Exception as e:
-                    logger.warning(f"⚠️ relpath failed for {src_file}: {e}")
-                    pbar.update(1)
-                    continue
-
-                # 🔹 Целевые пути: НОРМАЛИЗОВАННЫЕ
-                target_files = []
-                for d in dest_dirs:
-                    try:
-                        # Гарантируем, что путь корректный
-                        target = d / name / relative_path
-                        target_files.append(target)
-                    except Exception as e:
-                        logger.error(f"❌ Ошибка построения пути назначения: {d} / {name} / {relative_path} | {e}")
-                        continue
-
-                main_target = (report_root / relative_path) if report_root else target_files[0] if target_files else None
-                if not main_target:
-                    pbar.update(1)
-                    continue
-
-                src_info = get_file_info(src_file)
-                if not src_info:
-                    pbar.update(1)
-                    continue
-                src_mtime, src_size = src_info
-
-                # 🔹 Генерируем ключ для кэша
-                cache_key = make_relative_key(source, src_file)
-                cached = source_cache.get(cache_key)
-
-                # 🔹 Проверяем по mtime и size (с погрешностью 2 сек)
-                if (cached and
-                    cached["size"] == src_size and
-                    abs(cached["mtime"] - src_mtime) <= 2.0):
-                    src_hash = cached["hash"]
-                else:
-                    src_hash = calculate_hash(src_file)
-                    if not src_hash:
+        migrate_budget = hashing["rehash_per_run"]
+        queue_size = pipeline["queue_size"]
+        state_pool = StagePool(f"state-{name}", state_stage, 1, queue_size)
+        copy_pool = StagePool(f"copy-{name}", copy_stage, pipeline["copy_workers"], queue_size)
+        hash_pool = StagePool(f"hash-{name}", hash_stage, pipeline["hash_workers"], queue_size)
+        try:
+            window_size = PREFETCH_WINDOW if source_cache.lazy else 256
+            scanned = metrics.timed_iter("scan", scan_files_parallel(source, scan_workers, dir_cache=dir_cache))
+            for window in iter_windows(scanned, window_size):
+                source_cache.prefetch(f.key for f in window)
+                for src in window:
+                    current_files.add(src.key)
+                    # 🔹 Проверка по кэшу: mtime и size (с погрешностью 2 сек)
+                    relative_path = Path(src.rel_path)
+                    target_files = [d / name / relative_path for d in dest_dirs]
+                    main_target = (report_root / relative_path) if report_root else target_files[0] if target_files else None
+                    if not main_target:
                         pbar.update(1)
                         continue
-
-                # 🔹 Обновляем кэш
-                if name not in db:
-                    db[name] = {}
-                db[name][cache_key] = {
-                    "hash": src_hash,
-                    "mtime": src_mtime,
-                    "size": src_size
-                }
-
-                # 🔹 Сохраняем кэш каждые 50 файлов
-                if len(db[name]) % 50 == 0:
-                    save_state(db)
-
-                # 🔹 Копирование
-                if not main_target.exists():
-                    if not dry_run:
-                        for dest_file in target_files:
-                            try:
-                                # 🔹 Гарантируем, что родительская папка создана
-                                dest_file.parent.mkdir(parents=True, exist_ok=True)
-                                copy2(src_file, dest_file)
-                            except PermissionError as e:
-                                logger.error(f"❌ Нет прав на запись: {dest_file} | {e}")
-                            except Exception as e:
-                                logger.error(f"❌ Ошибка копирования {src_file} → {dest_file}: {e}")
-                    stats["added"] += 1
-                    stats["copied"] += 1
-                    changed_files.append((str(relative_path), "added", {
-                        "size": src_size,
-                        "mtime": src_mtime
-                    }))
-                else:
-                    old_info = get_file_info(main_target)
-                    old_mtime, old_size = old_info if old_info else ("unknown", "unknown")
-                    dest_hash = calculate_hash(main_target)
-                    if dest_hash and src_hash != dest_hash:
-                        if not dry_run:
-                            for dest_file in target_files:
-                                try:
-                                    dest_file.parent.mkdir(parents=True, exist_ok=True)
-                                    copy2(src_file, dest_file)
-                                except PermissionError as e:
-                                    logger.error(f"❌ Нет прав на запись: {dest_file} | {e}")
-                                except Exception as e:
-                                    logger.error(f"❌ Ошибка обновления {dest_file}: {e}")
-                        stats["modified"] += 1
-                        stats["copied"] += 1
-                        changed_files.append((str(relative_path), "modified", {
-                            "size": src_size,
-                            "mtime": src_mtime,
-                            "old_size": old_size,
-                            "old_mtime": old_mtime
-                        }))
-            except Exception as e:
-                logger.error(f"❌ Ошибка при обработке файла {src_file}: {e}")
-            finally:
-                pbar.update(1)
+                    task = FileTask(src, source_cache.get(src.key), target_files, main_target, algorithm)
+                    cached = task.cached
+                    if (cached and not deep_verify and
+                        cached["size"] == src.size and
+                        abs(cached["mtime"] - src.mtime) <= 2.0):
+                        # 🔹 Хеш старым алгоритмом: постепенно пересчитываем (не больше бюджета за запуск)
+                        if cached["algo"] != task.algo and migrate_budget > 0:
+                            migrate_budget -= 1
+                        else:
+                            task.src_hash = cached["hash"]
+                            task.algo = cached["algo"]
+                            task.quick = cached["quick"]
+                            metrics.add("cache_hits")
+                    hash_pool.put(task)
+        finally:
+            # 🔹 Дожидаемся стадий по порядку: хеширование → копирование → состояние
+            hash_pool.close()
+            copy_pool.close()
+            state_pool.close()
 
     # 🔹 Очистка кэша: удаляем записи для удалённых файлов
-    current_files = {make_relative_key(source, f) for f in files}
-    if name in db:
-        stale_keys = [k for k in db[name].keys() if k not in current_files]
-        for k in stale_keys:
-            del db[name][k]
-        if stale_keys:
-            logger.debug(f"🗑️ Удалено {len(stale_keys)} устаревших записей из кэша '{name}'")
+    stale_keys = [k for k in source_cache.keys() if k not in current_files]
+    for k in stale_keys:
+        del source_cache[k]
+    if stale_keys:
+        logger.debug(f"🗑️ Удалено {len(stale_keys)} устаревших записей из кэша '{name}'")
+    # Источник пропал посреди прохода — не трогаем состояние назначения (и контрольные точки докачки)
+    main_root = report_root or (dest_dirs[0] / name if dest_dirs else None)
+    if main_root is not None and source.exists():
+        dest_removed.update(purge_dest_state(source, main_root, current_files, dest_cache))
 
     # 🔹 Финальное сохранение
-    save_state(db)
-    logger.info(f"✅ Кэш для '{name}' полностью сохранён.")
-    return changed_files, stats
\ No newline at end of file
+    flush_changes(stale_keys)
+    change_log.flush()
+    if own_run:
+        finish_run(run_id)
+    if dir_cache is not None:
+        with metrics.timer("db_save"):
+            dir_cache.save()
+        if dir_cache.skipped:
+            logger.info(f"📂 '{name}': папок без перечитывания: {dir_cache.skipped}")
+    if not warm:
+        source_cache.close()
+
+    # 🔹 Метрики прохода: stat источника — только для файлов из перечитанных папок
+    metrics.add("files", len(current_files))
+    metrics.add("stat_source", len(current_files) - (dir_cache.replayed if dir_cache is not None else 0))
+    metrics.wall_sec += time.perf_counter() - started
+    metrics.runs += 1
+    if stats["deduped"]:
+        logger.info(
+            f"🔗 '{name}': {stats['deduped']} файлов без копирования (дедупликация), "
+            f"сэкономлено {stats['saved_bytes'] / (1024 * 1024):.1f} МБ"
+        )
+    logger.info(f"✅ Изменения кэша '{name}' переданы на запись.")
+    return change_log.count, stats
\ No newline at end of file
@@ -1,274 +1,363 @@
 # app/sync_core.py
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import time
 import threading
 from pathlib import Path
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Optional, Tuple, Set
 from app.logger import get_logger
 from app.config_loader import load_config
+from app.database import close_writer, flush_writes, writer_session, writer_stats
+from app.journal import RunChanges, finish_run, get_run, mark_reported, prune_journal, start_run
+from app.metrics import SourceMetrics, run_snapshot
+from app.prober import Prober
+from app.scheduler import Scheduler, host_of
 from app.reporter import save_html_report
+from app.settings import load_settings, source_settings
 
 logger = get_logger()
 
-# Глобальные переменные
-_successful_sources: Set[str] = set()
-_sync_results: Dict[str, List[Tuple[str, str, Dict]]] = {}
-_sync_stats: Dict[str, Dict[str, int]] = {}
-_dest_paths: List[str] = []
-_report_root: str = ""
-_dry_run: bool = False
-_lock = threading.Lock()
-
-# Управление фоновым потоком
-_monitor_active = False
-_monitor_thread: threading.Thread | None = None
-
-
-def can_ping(host: str) -> bool:
-    """Проверяет доступность хоста через ping."""
-    import subprocess
-    try:
-        result = subprocess.run(
-            ["ping", "-n", "1", "-w", "1000", host],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
-
-
-def is_source_accessible(path: str) -> bool:
-    """Проверяет доступность источника: ping + exists."""
-    try:
-        if path.startswith("\\\\"):
-            parts = path.split("\\")
-            if len(parts) > 2:
-                host = parts[2]
-                if not can_ping(host):
-                    return False
-            else:
-                return False
-        return Path(path).exists()
-    except Exception:
-        return False
-
-
-def sync_one_folder_wrapper(source: dict) -> Tuple[str, List[Tuple[str, str, Dict]], Dict[str, int]]:
-    """Обёртка для выполнения в потоке."""
-    name = source["name"]
-    path = source["path"]
-    logger.info(f"🔍 Попытка синхронизировать: {name} ({path})")
-    try:
-        from app.smb_utils import sync_folder
-        result, stats = sync_folder(name, path, _dest_paths, _report_root, _dry_run)
-        return name, result, stats
-    except Exception as e:
-        logger.error(f"❌ Критическая ошибка при синхронизации {name}: {e}")
-        return name, [], {"added": 0, "modified": 0, "copied": 0}
-
-
-def prepare_results_by_bureau(
-    all_results: Dict[str, List[Tuple[str, str, Dict]]],
+DEFAULT_RUN = {
+    "wait_unavailable_sec": 60,  # сколько ждать появления недоступного источника (у источника — свой wait_sec)
+    "monitor_interval": 2.0,     # как часто перепроверять недоступные источники
+    "source_timeout_sec": 3600.0,  # крайний срок синхронизации источника (у источника — свой timeout_sec)
+}
+
+
+def empty_stats() -> Dict[str, int]:
+    return {"added": 0, "modified": 0, "copied": 0, "deduped": 0, "saved_bytes": 0, "errors": 0}
+
+
+def prepare_stats_by_bureau(
     all_stats: Dict[str, Dict[str, int]],
     sources: List[dict]
-) -> Tuple[Dict, Dict]:
-    """Группирует результаты по бюро."""
-    results_by_bureau = {}
+) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """Группирует статистику источников по бюро (списки файлов отчёт читает из журнала)."""
     stats_by_bureau = {}
     for source in sources:
         name = source["name"]
         buro = source.get("buro", "Без бюро")
-        results_by_bureau.setdefault(buro, {})[name] = all_results.get(name, [])
-        stats_by_bureau.setdefault(buro, {})[name] = all_stats.get(name, {
-            "added": 0, "modified": 0, "copied": 0
-        })
-    return results_by_bureau, stats_by_bureau
+        stats_by_bureau.setdefault(buro, {})[name] = all_stats.get(name, empty_stats())
+    return stats_by_bureau
+
+
+class SyncRun:
+    """
+    🔹 Один запуск синхронизации по одному конфигу.
+    - Всё состояние запуска (результаты, планировщик, проверка доступности) — в объекте:
+      в одном процессе можно вести несколько независимых запусков
+    - Доступные источники синхронизируются сразу; недоступные перепроверяются
+      каждые monitor_interval секунд до своего крайнего срока (wait_sec источника
+      или wait_unavailable_sec), после чего запуск на них больше не ждёт
+    - Завершение каждого источника будит главный цикл (Condition): запуск
+      заканчивается сразу после последнего источника, без опроса по таймеру
+    - У синхронизации источника тоже есть крайний срок (timeout_sec источника или
+      source_timeout_sec, отсчёт — с получения слота планировщика): зависшее чтение
+      по SMB не держит запуск, источник попадает в given_up, отчёт формируется.
+      Источники идут в фоновых (daemon) потоках — зависший поток не мешает завершить процесс
+    - Настройки хеширования/копирования/дельты/дедупликации/сканирования/метрик/отчёта
+      разбираются при создании запуска (self.stages) и передаются стадиям явно:
+      запуски с разными конфигами в одном процессе друг на друга не влияют
+    - Время по фазам и счётчики каждого источника (metrics) попадают в отчёт
+    - Изменённые файлы пишутся в журнал change_log под номером запуска (run_id);
+      отчёт читает их оттуда, у прерванного запуска они остаются в БД
+    """
 
+    def __init__(self, config: Optional[dict], dry_run: bool = False, deep_verify: bool = False):
+        config = config or {}
+        self.dry_run = dry_run
+        self.deep_verify = deep_verify
+        self.sources: List[dict] = source_settings(config)
+        if config:
+            if not self.sources:
+                logger.warning("⚠️ Список источников пуст")
+            else:
+                logger.info(f"📋 Найдено источников: {len(self.sources)}")
+
+        # Пути назначения
+        dest_paths = (config.get("destination") or {}).get("paths", [])
+        if isinstance(dest_paths, str):
+            dest_paths = [dest_paths]
+        self.dest_paths: List[str] = dest_paths
+        self.report_root = dest_paths[0] if dest_paths else ""
+
+        section = config.get("run") or {}
+        self.settings = dict(DEFAULT_RUN)
+        for key, default in DEFAULT_RUN.items():
+            value = section.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+                self.settings[key] = type(default)(value)
+
+        self.stages = load_settings(config)
+        self.scheduler = Scheduler(self.stages["scheduler"])
+        self.prober = Prober(config)
+        hashing = self.stages["hashing"]
+        logger.info(f"🔑 Алгоритм хеширования: {hashing['algorithm']} | Блок: {hashing['chunk_kb']} КБ")
+
+        self.metrics: Dict[str, SourceMetrics] = {}
+        self.wall_sec = 0.0
+        self.db_stats: Dict[str, float] = {}
+        self.run_id: Optional[int] = None
+        self.results: Dict[str, int] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.completed: Set[str] = set()
+        self.given_up: Set[str] = set()
+        self._running: Dict[str, float] = {}  # источник → крайний срок синхронизации (monotonic)
+        self._timeouts: Dict[str, float] = {}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_file(cls, config_path: str, dry_run: bool = False, deep_verify: bool = False) -> "SyncRun":
+        config = load_config(config_path)
+        if not config:
+            logger.error("❌ Конфиг не загружен — формируем пустой отчёт")
+        return cls(config, dry_run, deep_verify)
+
+    def sync_source(
+        self,
+        source: dict,
+        source_cache=None,
+        dest_cache: Optional[Dict[str, Dict]] = None,
+        metrics: Optional[SourceMetrics] = None,
+        run_id: Optional[int] = None
+    ) -> Tuple[str, int, Dict[str, int]]:
+        """
+        Синхронизация одного источника (source_cache/dest_cache — тёплые кэши демона,
+        metrics — накопитель метрик демона; без него создаётся новый для этого запуска,
+        run_id — запуск в журнале изменений, по умолчанию текущий).
+        Возвращает (имя, число изменений, статистика).
+        """
+        name = source["name"]
+        path = source["path"]
+        host = host_of(path)
+        if metrics is None:
+            metrics = self.metrics[name] = self.new_metrics(name)
+        try:
+            from app.smb_utils import sync_folder
+            with self.scheduler.source_slot(host, on_wait=lambda sec: metrics.record("slot_wait", sec)):
+                self._arm_deadline(name)
+                logger.info(f"🔍 Попытка синхронизировать: {name} ({path})")
+                result, stats = sync_folder(
+                    name, path, self.dest_paths, self.report_root, self.dry_run,
+                    scan_workers=source.get("scan_workers", 1),
+                    settings=self.stages,
+                    throttle=self.scheduler.throttler(host, on_wait=lambda sec: metrics.record("throttle", sec)),
+                    deep_verify=self.deep_verify,
+                    source_cache=source_cache,
+                    dest_cache=dest_cache,
+                    metrics=metrics,
+                    run_id=run_id if run_id is not None else self.run_id
+                )
+            logger.info(f"⏱️ {name}: {metrics.describe()}")
+            return name, result, stats
+        except Exception as e:
+            logger.error(f"❌ Критическая ошибка при синхронизации {name}: {e}")
+            return name, 0, empty_stats()
+
+    def new_metrics(self, name: str) -> SourceMetrics:
+        """Накопитель метрик источника с настройками этого запуска."""
+        return SourceMetrics(name, self.stages["metrics"]["slowest_files"])
+
+    def save_report(self, stats_by_bureau, changes: RunChanges, metrics=None, note=None) -> Path:
+        """HTML-отчёт с настройками отчёта и метрик этого запуска."""
+        return save_html_report(
+            stats_by_bureau, datetime.now(), changes, metrics, note,
+            settings=self.stages["report"], prometheus_file=self.stages["metrics"]["prometheus_file"]
+        )
 
-def background_monitor(sources: List[dict], interval: float = 2.0) -> None:
+    def _submit(self, source: dict) -> None:
+        """Запускает синхронизацию источника в фоновом потоке; число одновременных — по слотам планировщика."""
+        name = source["name"]
+        timeout = source.get("timeout_sec", self.settings["source_timeout_sec"])
+        with self._cond:
+            # Срок отсчитывается с получения слота (_arm_deadline): очередь к планировщику не в счёт
+            self._running[name] = float("inf")
+            self._timeouts[name] = float(timeout)
+        threading.Thread(target=self._work, args=(source,), name=f"sync-{name}", daemon=True).start()
+
+    def _work(self, source: dict) -> None:
+        try:
+            outcome = self.sync_source(source)
+        except Exception as e:
+            logger.error(f"❌ Ошибка в потоке {source['name']}: {e}")
+            outcome = None
+        self._finish(source["name"], outcome)
+
+    def _arm_deadline(self, name: str) -> None:
+        """Источник получил слот: с этого момента идёт его крайний срок."""
+        with self._cond:
+            timeout = self._timeouts.get(name, 0)
+            if name in self._running and timeout > 0:
+                self._running[name] = time.monotonic() + timeout
+                self._cond.notify_all()
+
+    def _finish(self, name: str, outcome: Optional[Tuple[str, int, Dict[str, int]]]) -> None:
+        """Завершение источника: записывает результат и будит главный цикл."""
+        with self._cond:
+            if name not in self._running:
+                logger.warning(f"⌛ {name}: завершился после крайнего срока — в отчёт запуска не вошёл")
+                return
+            del self._running[name]
+            if outcome is not None:
+                folder_name, result, stats = outcome
+                self.results[folder_name] = result
+                self.stats[folder_name] = stats
+                self.completed.add(folder_name)
+                logger.info(f"✅ Успешно: {folder_name}")
+            self._cond.notify_all()
+
+    def _deadline(self, source: dict, started: float) -> float:
+        wait = source.get("wait_sec", self.settings["wait_unavailable_sec"])
+        return started + float(wait)
+
+    def run(self) -> Optional[Path]:
+        """
+        Синхронизирует все источники и формирует отчёт; возвращает путь к отчёту.
+        Изменения кэша дописываются в БД (flush), соединение остаётся открытым.
+        """
+        with writer_session():
+            return self._run()
+
+    def _run(self) -> Optional[Path]:
+        logger.info("🚀 Запуск синхронизации...")
+        started = time.monotonic()
+        self.run_id = start_run("sync", self.dry_run)
+        logger.info(f"🧾 Запуск №{self.run_id} (журнал изменений в БД)")
+        prune_journal(self.stages["journal"]["keep_days"])
+        db_before = writer_stats()
+
+        # 1. Проверка доступности — все источники параллельно
+        reachable = self.prober.check([src["path"] for src in self.sources])
+        waiting: Dict[str, Tuple[dict, float]] = {}
+        for src in self.sources:
+            if not reachable.get(src["path"]):
+                logger.warning(f"⏸️ Источник недоступен: {src['name']} → {src['path']}")
+                waiting[src["name"]] = (src, self._deadline(src, started))
+        if waiting:
+            logger.info(
+                f"🔁 Ожидаем {len(waiting)} недоступных источников: "
+                f"проверка каждые {self.settings['monitor_interval']:.0f} с, до крайнего срока источника"
+            )
+
+        # 2. Доступные — сразу
+        for src in self.sources:
+            if src["name"] not in waiting:
+                self._submit(src)
+
+        # 3. Главный цикл: просыпается по завершению источника, к следующей проверке
+        # или к ближайшему крайнему сроку
+        next_probe = time.monotonic() + self.settings["monitor_interval"]
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                for name, (src, deadline) in list(waiting.items()):
+                    if now >= deadline:
+                        del waiting[name]
+                        self.given_up.add(name)
+                        logger.warning(f"🛑 {name}: не появился до крайнего срока — пропускаем")
+                for name, deadline in list(self._running.items()):
+                    if now >= deadline:
+                        del self._running[name]
+                        self.given_up.add(name)
+                        logger.warning(
+                            f"🛑 {name}: синхронизация не уложилась в {self._timeouts[name]:.0f} с — "
+                            f"отчёт формируется без неё"
+                        )
+                if not waiting and not self._running:
+                    break
+                deadlines = list(self._running.values())
+                if waiting:
+                    deadlines += [next_probe, *(d for _, d in waiting.values())]
+                timeout = min(deadlines) - now
+                if timeout == float("inf"):
+                    self._cond.wait()
+                    continue
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+                if not waiting:
+                    continue
+            # Проверка — вне блокировки: завершения источников записываются без ожидания
+            next_probe = time.monotonic() + self.settings["monitor_interval"]
+            pending = [src for src, _ in waiting.values()]
+            reachable = self.prober.check([src["path"] for src in pending])
+            for src in pending:
+                if reachable.get(src["path"]):
+                    logger.info(f"🔁 Источник появился: {src['name']}")
+                    del waiting[src["name"]]
+                    self._submit(src)
+
+        logger.info(
+            f"✅ Синхронизировано {len(self.completed)}/{len(self.sources)} "
+            f"за {time.monotonic() - started:.1f} с"
+        )
+        self.scheduler.log_summary()
+        # Дописываем накопленные изменения кэша и журнала
+        finish_run(self.run_id)
+        flush_started = time.monotonic()
+        flush_writes()
+        db_after = writer_stats()
+        self.db_stats = {key: max(0, db_after[key] - db_before[key]) for key in db_after}
+        self.db_stats["flush_wait_sec"] = time.monotonic() - flush_started
+        self.wall_sec = time.monotonic() - started
+        return self.report()
+
+    def report(self) -> Optional[Path]:
+        """Формирует HTML-отчёт по результатам запуска."""
+        stats_by_bureau = prepare_stats_by_bureau(self.stats, self.sources)
+        metrics = run_snapshot(self.metrics, self.wall_sec, self.db_stats)
+        try:
+            report_path = self.save_report(stats_by_bureau, RunChanges([self.run_id]), metrics)
+            mark_reported([self.run_id], str(report_path))
+            logger.info(f"📄 ОТЧЁТ СФОРМИРОВАН: {report_path}")
+            return report_path
+        except Exception as e:
+            logger.error(f"❌ Ошибка при генерации отчёта: {e}")
+            logger.exception(e)
+            return None
+
+
+def report_run(run_id: int, config_path: str = "config.yaml") -> Optional[Path]:
     """
-    🔁 Фоновый мониторинг: проверяет недоступные источники КАЖДЫЕ 2 СЕКУНДЫ.
-    Как только источник стал доступен — сразу синхронизирует.
-    Работает параллельно с основной синхронизацией.
+    Отчёт по журналу изменений запуска run_id — например, прерванного:
+    в change_log есть всё, что успело записаться до сбоя. Бюро источников — из конфига.
     """
-    global _successful_sources, _monitor_active, _sync_results, _sync_stats
-    logger.info(f"🔁 Фоновый мониторинг запущен: проверка каждые {interval:.1f} секунд...")
-
-    while _monitor_active:
-        time.sleep(interval)
-        if not _monitor_active:
-            break
-
-        candidates = []
-        with _lock:
-            for src in sources:
-                if src["name"] not in _successful_sources and is_source_accessible(src["path"]):
-                    candidates.append(src)
-
-        if not candidates:
-            continue
-
-        logger.info(f"🔁 Мгновенная синхронизация: найдено {len(candidates)} доступных источников")
-        max_workers = min(5, len(candidates))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(sync_one_folder_wrapper, src): src["name"]
-                for src in candidates
-            }
-            for future in as_completed(futures):
-                name = futures[future]
-                try:
-                    folder_name, result, stats = future.result()
-                    with _lock:
-                        _sync_results[folder_name] = result
-                        _sync_stats[folder_name] = stats
-                        _successful_sources.add(folder_name)
-                    logger.info(f"✅ Мгновенно синхронизировано: {folder_name}")
-                except Exception as e:
-                    logger.error(f"❌ Ошибка в фоне {name}: {e}")
-
-    logger.info("✅ Фоновый мониторинг остановлен.")
-
-
-def start_sync(config_path: str = "config.yaml", dry_run: bool = False) -> None:
+    run = get_run(run_id)
+    if run is None:
+        logger.error(f"❌ Запуск №{run_id} не найден в журнале")
+        return None
+    changes = RunChanges([run_id])
+    config = load_config(config_path) or {}
+    stages = load_settings(config)
+    all_stats = {}
+    for name, count in changes.counts().items():
+        stats = all_stats[name] = empty_stats()
+        stats.update(count)
+        stats["copied"] = 0 if run["dry_run"] else count["added"] + count["modified"]
+    sources = [src for src in config.get("sources", []) or [] if src["name"] in all_stats]
+    known = {src["name"] for src in sources}
+    sources += [{"name": name} for name in sorted(all_stats) if name not in known]
+
+    started = datetime.fromtimestamp(run["started"]).strftime("%Y-%m-%d %H:%M:%S")
+    state = "завершён" if run["finished"] else "прерван — в отчёте изменения, записанные до остановки"
+    report_path = save_html_report(
+        prepare_stats_by_bureau(all_stats, sources), datetime.now(), changes,
+        note=f"По журналу изменений: запуск №{run_id} от {started} ({state})",
+        settings=stages["report"], prometheus_file=stages["metrics"]["prometheus_file"]
+    )
+    mark_reported([run_id], str(report_path))
+    flush_writes()
+    logger.info(f"📄 ОТЧЁТ СФОРМИРОВАН: {report_path}")
+    return report_path
+
+
+def start_sync(config_path: str = "config.yaml", dry_run: bool = False, deep_verify: bool = False) -> None:
     """
-    Главная функция.
-    - Запускает фоновый мониторинг СРАЗУ
-    - Основная синхронизация работает параллельно
-    - Фон проверяет каждые 2 секунды
+    Главная функция разового запуска.
+    - Доступные источники синхронизируются сразу, недоступные ждём до их крайнего срока
     - Отчёт — в конце
+    - deep_verify: полная сверка хешей, без доверия mtime и быстрым отпечаткам
     """
-    global _successful_sources, _sync_results, _sync_stats
-    global _dest_paths, _report_root, _dry_run, _monitor_active, _monitor_thread
-
-    # Сброс состояния
-    _successful_sources = set()
-    _sync_results = {}
-    _sync_stats = {}
-    _dry_run = dry_run
-    _monitor_active = False
-    _monitor_thread = None
-
-    logger.info("🚀 Запуск синхронизации...")
-    start_time = time.time()
-
-    # Загрузка конфига
-    config = load_config(config_path)
-    if not config:
-        logger.error("❌ Конфиг не загружен — формируем пустой отчёт")
-        sources = []
-    else:
-        sources = config.get("sources", [])
-        if not sources:
-            logger.warning("⚠️ Список источников пуст")
-        else:
-            logger.info(f"📋 Найдено источников: {len(sources)}")
-
-    # Пути назначения
-    destination = config.get("destination", {}) if config else {}
-    dest_paths = destination.get("paths", [])
-    if isinstance(dest_paths, str):
-        dest_paths = [dest_paths]
-    _dest_paths = dest_paths
-    _report_root = dest_paths[0] if dest_paths else ""
-
-    # 1. Проверка доступности
-    accessible_sources = []
-    delayed_sources = []
-
-    for src in sources:
-        if is_source_accessible(src["path"]):
-            accessible_sources.append(src)
-        else:
-            logger.warning(f"⏸️ Источник недоступен: {src['name']} → {src['path']}")
-            delayed_sources.append(src)
-
-    # Запускаем фоновый мониторинг ДО основной синхронизации
-    expected_total = len(sources)
-    if delayed_sources:
-        _monitor_active = True
-        _monitor_thread = threading.Thread(
-            target=background_monitor,
-            args=(sources, 2.0),
-            daemon=True
-        )
-        _monitor_thread.start()
-        logger.info(f"🔁 Фоновый мониторинг запущен: будет проверять каждые 2 секунды. Ожидаем {len(delayed_sources)} источников.")
-    else:
-        logger.info("✅ Все источники доступны. Фоновый мониторинг не нужен.")
-
-    # 2. Основная синхронизация доступных источников
-    if accessible_sources:
-        max_workers = min(20, len(accessible_sources))
-        logger.info(f"🔄 Синхронизируем {len(accessible_sources)} источников...")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(sync_one_folder_wrapper, src): src["name"]
-                for src in accessible_sources
-            }
-            for future in as_completed(futures):
-                name = futures[future]
-                try:
-                    folder_name, result, stats = future.result()
-                    _sync_results[folder_name] = result
-                    _sync_stats[folder_name] = stats
-                    _successful_sources.add(folder_name)
-                    logger.info(f"✅ Успешно: {folder_name}")
-                except Exception as e:
-                    logger.error(f"❌ Ошибка в потоке {name}: {e}")
-    else:
-        logger.info("✅ Нет доступных источников для синхронизации.")
-
-    # 3. Умное ожидание: ждём, пока фон найдёт оставшиеся, но не бесконечно
-    elapsed = time.time() - start_time
-    wait_time = max(60.0 - elapsed, 5.0)  # минимум 5 секунд ожидания
-    check_interval = 0.5
-    checks_without_progress = 0
-    last_count = len(_successful_sources)
-
-    logger.info(f"⏱️ Ожидание появления недоступных источников: {wait_time:.1f} сек...")
-
-    # Ждём, но с отслеживанием прогресса
-    for _ in range(int(wait_time / check_interval)):
-        time.sleep(check_interval)
-        current_count = len(_successful_sources)
-        if current_count > last_count:
-            checks_without_progress = 0  # был прогресс
-            last_count = current_count
-            logger.debug(f"🟢 Прогресс: синхронизировано {_successful_sources}")
-        else:
-            checks_without_progress += 1
-
-        # Если уже все синхронизированы — выходим
-        if current_count >= expected_total:
-            logger.info("✅ Все источники синхронизированы.")
-            break
-
-        # Если 10 секунд без прогресса — прекращаем
-        if checks_without_progress >= (10.0 / check_interval):
-            logger.warning(f"🛑 Прекращаем ожидание: нет прогресса более 10 секунд. Успешно: {current_count}/{expected_total}")
-            break
-    else:
-        logger.info(f"⏳ Время ожидания исчерпано. Успешно синхронизировано: {len(_successful_sources)}/{expected_total}")
-
-    # 4. Останавливаем фоновый мониторинг
-    if _monitor_active:
-        _monitor_active = False
-        if _monitor_thread and _monitor_thread.is_alive():
-            _monitor_thread.join(timeout=2)
-        logger.info("✅ Фоновый мониторинг остановлен.")
-    else:
-        logger.info("✅ Фоновый мониторинг не был запущен.")
-
-    # 5. Формирование отчёта
-    results_by_bureau, stats_by_bureau = prepare_results_by_bureau(_sync_results, _sync_stats, sources)
-    try:
-        report_path = save_html_report(results_by_bureau, stats_by_bureau, datetime.now())
-        logger.info(f"📄 ОТЧЁТ СФОРМИРОВАН: {report_path}")
-    except Exception as e:
-        logger.error(f"❌ Ошибка при генерации отчёта: {e}")
-        logger.exception(e)
-
-    logger.info("✅ Синхронизация завершена.")
\ No newline at end of file
+    SyncRun.from_file(config_path, dry_run, deep_verify).run()
+    # Дописываем накопленные изменения кэша и закрываем соединение с БД
+    close_writer()
+    logger.info("✅ Синхронизация завершена.")
@@ -0,0 +1,153 @@
+# app/watcher.py
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from app.logger import get_logger
+
+logger = get_logger()
+
+# Флаги inotify (linux/inotify.h)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+def inotify_available() -> bool:
+    """inotify есть только в Linux; в остальных ОС демон опрашивает источники по интервалу."""
+    return _load_libc() is not None
+
+
+class TreeWatcher:
+    """
+    🔹 Следит за деревом папок через inotify и отмечает, что в нём что-то изменилось.
+    - Подпапки добавляются в наблюдение по мере появления
+    - Переполнение очереди событий тоже считается изменением (пересканирование всё покажет)
+    - Для SMB/CIFS-монтирований ядро видит только локальные изменения:
+      правки на самом ПК сотрудника ловит опрос по интервалу
+    - Если лимит наблюдений (fs.inotify.max_user_watches) исчерпан — OSError,
+      вызывающий переходит на опрос
+    """
+
+    def __init__(self, root: Path):
+        libc = _load_libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify недоступен")
+        self._libc = libc
+        self.root = root
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._watches: Dict[int, str] = {}
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        try:
+            self._add_tree(str(root))
+        except OSError:
+            os.close(self.fd)
+            raise
+        self._thread = threading.Thread(target=self._run, name=f"watch-{root.name}", daemon=True)
+        self._thread.start()
+
+    def _add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOSPC, errno.ENOMEM):
+                raise OSError(err, f"лимит inotify исчерпан ({path})")
+            return  # папка успела исчезнуть или нет прав — пропускаем
+        self._watches[wd] = path
+
+    def _add_tree(self, root: str) -> None:
+        self._add_watch(root)
+        for dir_path, dir_names, _ in os.walk(root):
+            for dir_name in dir_names:
+                self._add_watch(os.path.join(dir_path, dir_name))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self.fd], [], [], 1.0)
+                if not ready:
+                    continue
+                data = os.read(self.fd, 64 * 1024)
+            except (OSError, ValueError):
+                if self._stop.is_set():
+                    return
+                continue
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _, name_len = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + name_len].rstrip(b"\0")
+                offset += _EVENT.size + name_len
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and wd in self._watches:
+                    try:
+                        self._add_tree(os.path.join(self._watches[wd], os.fsdecode(name)))
+                    except OSError as e:
+                        logger.warning(f"⚠️ Не удалось следить за новой папкой в {self.root}: {e}")
+                self._dirty.set()
+
+    def consume(self) -> bool:
+        """True, если с прошлого вызова в дереве были изменения."""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            return True
+        return False
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def watch_tree(root: Path) -> Optional[TreeWatcher]:
+    """TreeWatcher для root или None, если уведомления недоступны (тогда — опрос)."""
+    if not inotify_available():
+        return None
+    try:
+        return TreeWatcher(root)
+    except OSError as e:
+        logger.warning(f"⚠️ Уведомления об изменениях недоступны для {root}: {e} — используется опрос")
+        return None
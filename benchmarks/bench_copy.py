@@ -0,0 +1,72 @@
+# benchmarks/bench_copy.py
+"""
+Пропускная способность способов копирования (app/copier.py) по сравнению с shutil.copy2.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_copy
+    python -m benchmarks.bench_copy --sizes 4M,256M --dest D:/tmp/bench --repeat 5
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from app import copier
+from benchmarks.bench_hashing import parse_size
+
+DEFAULT_SIZES = "1M,16M,256M"
+
+
+def bench_backend(src: Path, dest_dir: Path, backend: str, repeat: int) -> float:
+    """Лучшее время копирования из repeat прогонов."""
+    best = float("inf")
+    for i in range(repeat):
+        dest = dest_dir / f"{backend}_{i}.bin"
+        started = time.perf_counter()
+        if backend == "copy2":
+            shutil.copy2(src, dest)
+        elif backend == "copy_with_hash":
+            copier.copy_with_hash(src, [dest])
+        else:
+            used = copier.copy_file(src, dest, backend)
+            if used != backend:
+                return float("nan")  # бэкенд не поддерживается для этих томов
+        best = min(best, time.perf_counter() - started)
+        dest.unlink()
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение способов копирования")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Размеры файлов через запятую")
+    parser.add_argument("--src", default="", help="Папка для исходного файла (по умолчанию — временная)")
+    parser.add_argument("--dest", default="", help="Папка назначения (по умолчанию — та же временная)")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на замер")
+    args = parser.parse_args()
+
+    backends = ["copy2"] + copier.available_backends() + ["copy_with_hash"]
+    print(f"{'Размер':>8} | " + " | ".join(f"{b:>15}" for b in backends))
+    with tempfile.TemporaryDirectory() as tmp:
+        src_dir = Path(args.src or tmp)
+        dest_dir = Path(args.dest or tmp)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        for size_str in args.sizes.split(","):
+            size = parse_size(size_str)
+            src = src_dir / f"bench_src_{size}.bin"
+            with src.open("wb") as f:
+                f.write(os.urandom(size))
+            cells = []
+            for backend in backends:
+                seconds = bench_backend(src, dest_dir, backend, args.repeat)
+                if seconds != seconds:  # nan
+                    cells.append("не поддерж.")
+                else:
+                    cells.append(f"{size / (1024 * 1024) / seconds:9.0f} МБ/с")
+            print(f"{size_str:>8} | " + " | ".join(f"{c:>15}" for c in cells))
+            src.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_hashing.py
+"""
+Микро-бенчмарк алгоритмов хеширования на типичных размерах наших файлов.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_hashing
+    python -m benchmarks.bench_hashing --sizes 64K,4M,300M --repeat 5 --chunk-kb 1024
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from app import hashing
+
+# Мелкие документы, средние детали .stc, крупные сборки CAD
+DEFAULT_SIZES = "16K,256K,4M,64M,256M"
+
+
+def parse_size(value: str) -> int:
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper()
+    if value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def bench_file(path: Path, algorithm: str, repeat: int, chunk_size: int = hashing.CHUNK_SIZE) -> float:
+    """Лучшее время из repeat прогонов (файл уже в кэше ОС — меряем CPU, а не диск)."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hashing.calculate_hash(path, algorithm=algorithm, chunk_size=chunk_size)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение алгоритмов хеширования")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Размеры файлов через запятую (16K,4M,...)")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на замер")
+    parser.add_argument("--chunk-kb", type=int, default=hashing.CHUNK_SIZE // 1024, help="Размер блока чтения, КБ")
+    args = parser.parse_args()
+
+    algorithms = list(hashing.HASH_ALGORITHMS)
+    if "xxh3_128" not in algorithms:
+        print("ℹ️ Пакет xxhash не установлен — xxh3_128 пропущен")
+
+    print(f"Блок чтения: {args.chunk_kb} КБ, повторов: {args.repeat}")
+    print(f"{'Размер':>10} | " + " | ".join(f"{a:>14}" for a in algorithms))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_str in args.sizes.split(","):
+            size = parse_size(size_str)
+            path = Path(tmp) / f"bench_{size}.bin"
+            with path.open("wb") as f:
+                f.write(os.urandom(size))
+            cells = []
+            for algorithm in algorithms:
+                seconds = bench_file(path, algorithm, args.repeat, args.chunk_kb * 1024)
+                mb_s = size / (1024 * 1024) / seconds if seconds else float("inf")
+                cells.append(f"{mb_s:9.0f} МБ/с")
+            print(f"{size_str:>10} | " + " | ".join(f"{c:>14}" for c in cells))
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_index.py
+"""
+Память и скорость кэша в памяти: словарь словарей (как было) против CompactIndex.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_index
+    python -m benchmarks.bench_index --entries 3000000 --files-per-dir 40
+"""
+import argparse
+import gc
+import hashlib
+import random
+import time
+import tracemalloc
+
+from app.index import CompactIndex
+
+
+def synthetic_rows(entries: int, files_per_dir: int):
+    """Строки (key, hash, mtime, size, algo, quick), похожие на кэш реального источника."""
+    rng = random.Random(42)
+    for i in range(entries):
+        d = i // files_per_dir
+        key = f"проекты/цех-{d % 97}/заказ_{d}/деталь_{i % files_per_dir:03d}.stc"
+        digest = hashlib.sha256(i.to_bytes(8, "little")).hexdigest()
+        quick = digest[:32]
+        yield key, digest, 1.7e9 + rng.random() * 1e7, rng.randint(1_000, 50_000_000), "sha256", quick
+
+
+def build_dict(rows):
+    return {
+        key: {"hash": h, "mtime": m, "size": s, "algo": a, "quick": q}
+        for key, h, m, s, a, q in rows
+    }
+
+
+def measure(label: str, build, entries: int, files_per_dir: int):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = build(synthetic_rows(entries, files_per_dir))
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    keys = [row[0] for row in synthetic_rows(min(entries, 100_000), files_per_dir)]
+    started = time.perf_counter()
+    for key in keys:
+        index.get(key)
+    lookup_us = (time.perf_counter() - started) / len(keys) * 1e6
+
+    print(f"{label:>14} | {current / (1024 * 1024):10.1f} МБ | {current / entries:8.0f} Б/запись | "
+          f"загрузка {elapsed:6.2f} с | get {lookup_us:5.2f} мкс")
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Память кэша: dict против CompactIndex")
+    parser.add_argument("--entries", type=int, default=1_000_000, help="Число записей")
+    parser.add_argument("--files-per-dir", type=int, default=25, help="Файлов в одной папке")
+    args = parser.parse_args()
+
+    print(f"Записей: {args.entries}, файлов в папке: {args.files_per_dir}")
+    index = measure("dict of dicts", build_dict, args.entries, args.files_per_dir)
+    del index
+    index = measure("CompactIndex", CompactIndex.from_rows, args.entries, args.files_per_dir)
+    del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# benchmarks/bench_sync.py
+"""
+Сквозной бенчмарк синхронизации на синтетической шаре с имитацией сетевых задержек.
+
+Сценарии (по порядку, на одном дереве и одной БД):
+    cold   — первый запуск: пустая БД и пустое назначение
+    warm   — повторный запуск без изменений
+    churn  — изменена доля --churn файлов (по умолчанию 1 %)
+    touch  — у всех файлов сдвинут mtime, содержимое прежнее
+
+Каждая последовательность идёт в отдельном процессе (чистые настройки модулей,
+своя БД, логи и отчёты во временной папке). Результат — JSON для сравнения между коммитами.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sync --output bench.json
+    python -m benchmarks.bench_sync --files 20000 --latency-ms 2 --read-ms 1 --bandwidth-mbps 60
+    python -m benchmarks.bench_sync --baseline bench_main.json --output bench_branch.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+SCENARIOS = ["cold", "warm", "churn", "touch"]
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def git_revision() -> Dict[str, object]:
+    """Коммит, на котором сделан замер (и есть ли незакоммиченные правки)."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, timeout=30
+        ).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except (OSError, subprocess.SubprocessError):
+        return {"commit": None, "dirty": None}
+
+
+def run_sequence(params: dict) -> List[Dict[str, object]]:
+    """
+    🔹 Одна последовательность сценариев; выполняется в дочернем процессе.
+    Рабочая папка (шара, назначение, БД, логи, отчёты) — params["workdir"].
+    """
+    workdir = Path(params["workdir"])
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)  # БД и логи приложения — относительные пути
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(workdir)  # отчёты — в Desktop рабочей папки
+
+    from app.config_loader import load_config
+    from app.database import close_writer
+    from app.logger import get_logger
+    from app.metrics import PHASES
+    from app.sync_core import SyncRun
+    from benchmarks.latency import SimulatedLatency
+    from benchmarks.synthetic import churn, generate_tree, touch_all
+
+    get_logger().setLevel(logging.WARNING)
+
+    share = workdir / "share"
+    sources = []
+    per_source = max(1, params["files"] // params["sources"])
+    tree = {"files": 0, "dirs": 0, "bytes": 0}
+    for i in range(params["sources"]):
+        root = share / f"ПК-{i + 1:02d}"
+        info = generate_tree(root, per_source, params["depth"], params["fanout"],
+                             params["sizes"], params["seed"] + i)
+        for key in tree:
+            tree[key] += info[key]
+        sources.append({"name": f"ПК-{i + 1:02d}", "path": str(root), "buro": "Бенчмарк",
+                        "scan_workers": params["scan_workers"]})
+
+    config = load_config(params["config"]) if params["config"] else {}
+    config = dict(config or {}, sources=sources, destination={"paths": [str(workdir / "dest")]})
+
+    class TimedRun(SyncRun):
+        report_seconds = 0.0
+
+        def report(self):
+            started = time.perf_counter()
+            try:
+                return super().report()
+            finally:
+                self.report_seconds = time.perf_counter() - started
+
+    results = []
+    for scenario in SCENARIOS:
+        if scenario != "cold" and scenario not in params["scenarios"]:
+            continue
+        changed = 0
+        if scenario == "churn":
+            changed = sum(churn(Path(s["path"]), params["churn"], params["seed"]) for s in sources)
+        elif scenario == "touch":
+            changed = sum(touch_all(Path(s["path"])) for s in sources)
+
+        latency = SimulatedLatency(share, params["latency_ms"], params["read_ms"],
+                                   params["bandwidth_mbps"])
+        run = TimedRun(config)
+        started = time.perf_counter()
+        with latency:
+            run.run()
+        seconds = time.perf_counter() - started
+
+        totals: Dict[str, int] = {}
+        for stats in run.stats.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        if scenario in params["scenarios"]:
+            results.append({
+                "scenario": scenario,
+                "seconds": round(seconds, 4),
+                "sync_seconds": round(seconds - run.report_seconds, 4),
+                "report_seconds": round(run.report_seconds, 4),
+                "files_changed": changed,
+                "stats": totals,
+                "io": latency.summary(),
+                "phases": {
+                    phase: round(sum(m.phases[phase][0] for m in run.metrics.values()), 4)
+                    for phase in PHASES
+                },
+                "tree": tree,
+            })
+    close_writer()
+    return results
+
+
+def _worker(params: dict, queue) -> None:
+    try:
+        queue.put(("ok", run_sequence(params)))
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(params: dict) -> List[Dict[str, object]]:
+    """Запускает последовательность в новом процессе (spawn) и возвращает её результаты."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_worker, args=(params, queue))
+    process.start()
+    status, payload = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(payload)
+    return payload
+
+
+def summarize(runs: List[List[Dict[str, object]]]) -> List[Dict[str, object]]:
+    """Лучший прогон каждого сценария + все замеры времени (для оценки разброса)."""
+    summary = []
+    for samples in zip(*runs):
+        best = dict(min(samples, key=lambda r: r["seconds"]))
+        best["samples"] = [r["seconds"] for r in samples]
+        summary.append(best)
+    return summary
+
+
+def compare(current: List[Dict[str, object]], baseline_path: Path) -> None:
+    """Печатает изменение времени сценариев относительно сохранённого JSON."""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    before = {r["scenario"]: r for r in baseline.get("results", [])}
+    rev = baseline.get("meta", {}).get("commit") or "?"
+    print(f"\nСравнение с {baseline_path} (коммит {rev}):")
+    for result in current:
+        old = before.get(result["scenario"])
+        if not old:
+            continue
+        delta = (result["seconds"] - old["seconds"]) / old["seconds"] * 100 if old["seconds"] else 0.0
+        mark = "⚠️" if delta > 10 else "✅"
+        print(f"  {mark} {result['scenario']:>6}: {old['seconds']:8.3f} с → {result['seconds']:8.3f} с ({delta:+.1f} %)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронизации на синтетической шаре")
+    parser.add_argument("--files", type=int, default=2000, help="Файлов всего (делятся между источниками)")
+    parser.add_argument("--sources", type=int, default=2, help="Число источников (ПК)")
+    parser.add_argument("--depth", type=int, default=3, help="Глубина дерева папок")
+    parser.add_argument("--fanout", type=int, default=4, help="Подпапок на уровень")
+    parser.add_argument("--sizes", default="small", help="Профиль размеров: small | mixed | cad | «4K-256K:70,256K-4M:30»")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scan-workers", type=int, default=4, help="scan_workers источников")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Задержка запроса метаданных, мс")
+    parser.add_argument("--read-ms", type=float, default=1.0, help="Задержка запроса чтения, мс")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="Скорость чтения шары, МБ/с (0 — без ограничения)")
+    parser.add_argument("--churn", type=float, default=0.01, help="Доля изменяемых файлов в сценарии churn")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую")
+    parser.add_argument("--config", default="", help="Конфиг с настройками (hashing/copy/scan/...); источники — синтетические")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов всей последовательности")
+    parser.add_argument("--workdir", default="", help="Рабочая папка (по умолчанию — временная, удаляется)")
+    parser.add_argument("--output", default="", help="Куда записать JSON с результатами")
+    parser.add_argument("--baseline", default="", help="JSON прошлого замера для сравнения")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    params = {
+        "files": args.files, "sources": max(1, args.sources), "depth": args.depth,
+        "fanout": args.fanout, "sizes": args.sizes, "seed": args.seed,
+        "scan_workers": args.scan_workers, "latency_ms": args.latency_ms,
+        "read_ms": args.read_ms, "bandwidth_mbps": args.bandwidth_mbps,
+        "churn": args.churn, "scenarios": scenarios,
+        "config": str(Path(args.config).resolve()) if args.config else "",
+    }
+
+    runs = []
+    for i in range(max(1, args.repeat)):
+        base = Path(args.workdir).resolve() if args.workdir else Path(tempfile.mkdtemp(prefix="bench_sync_"))
+        workdir = base / f"run_{i + 1}"
+        shutil.rmtree(workdir, ignore_errors=True)
+        try:
+            runs.append(run_isolated(dict(params, workdir=str(workdir))))
+        finally:
+            if not args.workdir:
+                shutil.rmtree(base, ignore_errors=True)
+
+    results = summarize(runs)
+    print(f"{'Сценарий':>8} | {'всего, с':>9} | {'синхр., с':>9} | {'отчёт, с':>8} | {'изменено':>8} | "
+          f"{'скопировано':>11} | {'stat':>6} | {'листинг':>7} | {'чтений':>7}")
+    for r in results:
+        print(f"{r['scenario']:>8} | {r['seconds']:9.3f} | {r['sync_seconds']:9.3f} | {r['report_seconds']:8.3f} | "
+              f"{r['stats'].get('added', 0) + r['stats'].get('modified', 0):8d} | {r['stats'].get('copied', 0):11d} | "
+              f"{r['io']['stat']:6d} | {r['io']['scandir']:7d} | {r['io']['read']:7d}")
+
+    report = {
+        "meta": dict(git_revision(), python=platform.python_version(), platform=platform.platform(),
+                     timestamp=datetime.now().isoformat(timespec="seconds"), repeat=args.repeat),
+        "params": params,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n📄 Результаты: {args.output}")
+    if args.baseline:
+        compare(results, Path(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/latency.py
+"""
+Имитация медленной сетевой шары на локальной папке: задержка на каждую операцию
+с файловой системой под заданным корнем.
+
+Подменяются os.stat / os.lstat / os.scandir / open (через них работают pathlib,
+сканер, хеширование и копирование), чтение из открытых файлов замедляется
+на каждый вызов read/readinto. Пути вне корня (назначение, БД) не замедляются.
+Копирование через copy_file_range/sendfile идёт мимо read() — для честного
+замера чтения по «сети» используйте backend: readinto.
+"""
+import builtins
+import io
+import os
+import threading
+import time
+from typing import Dict
+
+
+class SimulatedLatency:
+    """
+    🔹 Контекстный менеджер: пока он активен, корень root ведёт себя как SMB-шара.
+    - op_ms — задержка запроса метаданных (stat, открытие файла, страница листинга папки)
+    - read_ms — задержка одного запроса чтения
+    - bandwidth_mbps — пропускная способность, МБ/с (0 — без ограничения)
+    - page_entries — записей в одной «странице» листинга папки (SMB2 QUERY_DIRECTORY)
+    Счётчики операций и суммарная задержка — в ops и delayed_sec.
+    """
+
+    def __init__(self, root, op_ms: float = 2.0, read_ms: float = 1.0,
+                 bandwidth_mbps: float = 0.0, page_entries: int = 512):
+        self.root = os.path.abspath(os.fspath(root))
+        self.op_sec = op_ms / 1000
+        self.read_sec = read_ms / 1000
+        self.bytes_per_sec = bandwidth_mbps * 1024 * 1024
+        self.page_entries = max(1, page_entries)
+        self.ops: Dict[str, int] = {"stat": 0, "scandir": 0, "open": 0, "read": 0}
+        self.read_bytes = 0
+        self.delayed_sec = 0.0
+        self._lock = threading.Lock()
+        self._saved = None
+
+    def _covers(self, path) -> bool:
+        if isinstance(path, int):
+            return False
+        try:
+            return os.fspath(path).startswith(self.root)
+        except TypeError:
+            return False
+
+    def _delay(self, op: str, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            self.ops[op] += 1
+            self.read_bytes += nbytes
+            self.delayed_sec += seconds
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def __enter__(self) -> "SimulatedLatency":
+        self._saved = (os.stat, os.lstat, os.scandir, builtins.open, io.open)
+        orig_stat, orig_lstat, orig_scandir, orig_open, _ = self._saved
+
+        def stat(path, *args, **kwargs):
+            if self._covers(path):
+                self._delay("stat", self.op_sec)
+            return orig_stat(path, *args, **kwargs)
+
+        def lstat(path, *args, **kwargs):
+            if self._covers(path):
+                self._delay("stat", self.op_sec)
+            return orig_lstat(path, *args, **kwargs)
+
+        def scandir(path="."):
+            if not self._covers(path):
+                return orig_scandir(path)
+            return _SlowScandir(orig_scandir(path), self)
+
+        def open_(file, mode="r", *args, **kwargs):
+            f = orig_open(file, mode, *args, **kwargs)
+            if self._covers(file):
+                self._delay("open", self.op_sec)
+                if "r" in mode and "+" not in mode:
+                    return _SlowFile(f, self)
+            return f
+
+        os.stat, os.lstat, os.scandir = stat, lstat, scandir
+        builtins.open = io.open = open_
+        return self
+
+    def __exit__(self, *exc) -> None:
+        os.stat, os.lstat, os.scandir, builtins.open, io.open = self._saved
+        self._saved = None
+
+    def summary(self) -> Dict[str, float]:
+        return dict(self.ops, read_mb=round(self.read_bytes / (1024 * 1024), 2),
+                    delayed_sec=round(self.delayed_sec, 3))
+
+
+class _SlowScandir:
+    """Итератор os.scandir: запрос на открытие листинга и на каждую страницу записей."""
+
+    def __init__(self, it, owner: SimulatedLatency):
+        self._it = it
+        self._owner = owner
+        self._count = 0
+        owner._delay("scandir", owner.op_sec)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        entry = next(self._it)
+        self._count += 1
+        if self._count % self._owner.page_entries == 0:
+            self._owner._delay("scandir", self._owner.op_sec)
+        return entry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._it.close()
+
+
+class _SlowFile:
+    """Файл источника: каждый read/readinto — один сетевой запрос (+ время передачи)."""
+
+    def __init__(self, f, owner: SimulatedLatency):
+        self._f = f
+        self._owner = owner
+
+    def _charge(self, nbytes: int) -> None:
+        owner = self._owner
+        transfer = nbytes / owner.bytes_per_sec if owner.bytes_per_sec else 0.0
+        owner._delay("read", owner.read_sec + transfer, nbytes)
+
+    def read(self, size: int = -1):
+        data = self._f.read(size)
+        self._charge(len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        n = self._f.readinto(buffer)
+        self._charge(n or 0)
+        return n
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
@@ -0,0 +1,134 @@
+# benchmarks/synthetic.py
+"""
+Генератор синтетических «шар» для бенчмарков: дерево папок с заданным числом файлов,
+распределением размеров и глубиной, а также изменения дерева между прогонами
+(правка части файлов, массовая смена mtime).
+
+Одинаковые параметры и seed дают одинаковое дерево — замеры сравнимы между коммитами.
+"""
+import os
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_hashing import parse_size
+
+# Профили размеров: (доля файлов, от, до); внутри диапазона — равномерно по логарифму
+SIZE_PROFILES: Dict[str, List[Tuple[float, str, str]]] = {
+    "small": [(1.0, "1K", "64K")],
+    # Документы + детали .stc + редкие крупные сборки
+    "mixed": [(0.70, "4K", "256K"), (0.25, "256K", "4M"), (0.05, "4M", "32M")],
+    "cad": [(0.40, "16K", "512K"), (0.45, "512K", "8M"), (0.14, "8M", "64M"), (0.01, "64M", "256M")],
+}
+
+EXTENSIONS = [".stc", ".stc", ".stc", ".pdf", ".docx", ".xlsx", ".dwg"]
+
+
+def parse_profile(spec: str) -> List[Tuple[float, int, int]]:
+    """
+    Профиль по имени (small | mixed | cad) или в виде «4K-256K:70,256K-4M:30».
+    Возвращает [(доля, от, до)] с долями, нормированными к 1.
+    """
+    if spec in SIZE_PROFILES:
+        parts = [(share, parse_size(lo), parse_size(hi)) for share, lo, hi in SIZE_PROFILES[spec]]
+    else:
+        parts = []
+        for item in spec.split(","):
+            bounds, _, share = item.partition(":")
+            lo, _, hi = bounds.partition("-")
+            parts.append((float(share or 1), parse_size(lo), parse_size(hi or lo)))
+    total = sum(share for share, _, _ in parts)
+    if not parts or total <= 0:
+        raise ValueError(f"Пустой профиль размеров: {spec}")
+    return [(share / total, lo, max(lo, hi)) for share, lo, hi in parts]
+
+
+def pick_size(rng: random.Random, profile: List[Tuple[float, int, int]]) -> int:
+    point = rng.random()
+    for share, lo, hi in profile:
+        point -= share
+        if point <= 0:
+            break
+    if lo == hi:
+        return lo
+    return int(lo * (hi / lo) ** rng.random()) if lo > 0 else rng.randint(0, hi)
+
+
+def _write(path: Path, size: int, rng: random.Random) -> None:
+    with path.open("wb") as f:
+        left = size
+        while left > 0:
+            n = min(left, 1 << 20)
+            f.write(rng.randbytes(n))
+            left -= n
+
+
+def generate_tree(
+    root: Path,
+    files: int,
+    depth: int = 3,
+    fanout: int = 4,
+    profile: str = "mixed",
+    seed: int = 42
+) -> Dict[str, int]:
+    """
+    🔹 Создаёт дерево root/Заказ_N/Узел_M/... глубины depth по fanout подпапок
+    и раскладывает по всем папкам files файлов с размерами из профиля.
+    Возвращает {"files", "dirs", "bytes"}.
+    """
+    rng = random.Random(seed)
+    sizes = parse_profile(profile)
+    dirs = [root]
+    level = [root]
+    for d in range(depth):
+        level = [
+            parent / (f"Заказ_{i:03d}" if d == 0 else f"Узел_{i:02d}")
+            for parent in level for i in range(fanout)
+        ]
+        dirs.extend(level)
+    for path in dirs:
+        path.mkdir(parents=True, exist_ok=True)
+
+    total = 0
+    for i in range(files):
+        folder = dirs[rng.randrange(len(dirs))]
+        size = pick_size(rng, sizes)
+        _write(folder / f"деталь_{i:06d}{rng.choice(EXTENSIONS)}", size, rng)
+        total += size
+    return {"files": files, "dirs": len(dirs), "bytes": total}
+
+
+def list_tree(root: Path) -> List[Path]:
+    """Все файлы дерева в стабильном порядке (для воспроизводимого выбора)."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        found.extend(Path(dirpath) / name for name in sorted(filenames))
+    return found
+
+
+def churn(root: Path, fraction: float, seed: int = 42) -> int:
+    """
+    🔹 Правит долю fraction файлов так, как это делают приложения:
+    новый файл того же размера рядом + замена (os.replace), mtime — позже прежнего.
+    Возвращает число изменённых файлов.
+    """
+    rng = random.Random(seed + 1)
+    paths = list_tree(root)
+    chosen = rng.sample(paths, max(1, round(len(paths) * fraction))) if paths else []
+    for path in chosen:
+        st = path.stat()
+        tmp = path.with_name(f"~{path.name}.tmp")
+        _write(tmp, st.st_size, rng)
+        os.replace(tmp, path)
+        os.utime(path, (st.st_atime, st.st_mtime + 60))
+    return len(chosen)
+
+
+def touch_all(root: Path, shift_sec: float = 3600) -> int:
+    """🔹 Сдвигает mtime всех файлов без изменения содержимого (антивирус, восстановление из архива)."""
+    paths = list_tree(root)
+    for path in paths:
+        st = path.stat()
+        os.utime(path, (st.st_atime, st.st_mtime + shift_sec))
+    return len(paths)
@@ -5,11 +5,33 @@ from app.sync_core import start_sync
 
 def main():
     parser = argparse.ArgumentParser(description="Синхронизация сетевых папок")
+    parser.add_argument("command", nargs="?", default="sync", choices=["sync", "daemon", "report"],
+                        help="sync — разовый запуск (по умолчанию), daemon — постоянная работа, "
+                             "report — попросить работающий демон сформировать отчёт "
+                             "(с --run — отчёт по журналу изменений запуска)")
     parser.add_argument("--config", type=str, default="config.yaml", help="Путь к config.yaml")
     parser.add_argument("--dry-run", action="store_true", help="Тестовый запуск")
+    parser.add_argument("--run", type=int, default=None,
+                        help="report: номер запуска в журнале (например, прерванного) — отчёт без демона")
+    parser.add_argument("--deep-verify", action="store_true",
+                        help="Полная сверка хешей (без доверия mtime и быстрым отпечаткам)")
     args = parser.parse_args()
     try:
-        start_sync(config_path=args.config, dry_run=args.dry_run)
+        if args.command == "daemon":
+            from app.daemon import run_daemon
+            run_daemon(config_path=args.config, dry_run=args.dry_run)
+        elif args.command == "report" and args.run is not None:
+            from app.database import close_writer
+            from app.sync_core import report_run
+            report_path = report_run(args.run, config_path=args.config)
+            close_writer()
+            if report_path is None:
+                sys.exit(1)
+        elif args.command == "report":
+            from app.daemon import request_report
+            print(f"📨 Запрос отчёта отправлен: {request_report(args.config)}")
+        else:
+            start_sync(config_path=args.config, dry_run=args.dry_run, deep_verify=args.deep_verify)
     except Exception as e:
         print(f"❌ Ошибка: {e}", file=sys.stderr)
         sys.exit(1)
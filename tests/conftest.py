@@ -0,0 +1,63 @@
+# tests/conftest.py
+import logging
+import sqlite3
+import pytest
+from app import database
+from app.logger import get_logger
+
+# Тесты не пишут в logs/sync.log рабочей копии: остаётся только вывод в консоль (его ловит pytest)
+_logger = get_logger()
+for _handler in list(_logger.handlers):
+    if isinstance(_handler, logging.FileHandler):
+        _logger.removeHandler(_handler)
+        _handler.close()
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """
+    Каждый тест — в своей папке: БД (synced_db.sqlite3 — относительный путь)
+    и отчёты (Desktop в HOME) создаются заново и не видны другим тестам.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    monkeypatch.setattr(database, "_initialized", False)
+    yield tmp_path
+    database.close_writer()
+
+
+@pytest.fixture
+def share(workdir):
+    """Папки источника и назначения внутри рабочей папки теста."""
+    source = workdir / "share" / "ПК-01"
+    dest = workdir / "dest"
+    source.mkdir(parents=True)
+    dest.mkdir()
+    return source, dest
+
+
+def write(path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def sync(source, dest, config=None, **kwargs):
+    """Один проход sync_folder по источнику с настройками из config; изменения дописаны в БД."""
+    from app.settings import load_settings
+    from app.smb_utils import sync_folder
+    result, stats = sync_folder(
+        source.name, str(source), [str(dest)], "", settings=load_settings(config or {}), **kwargs
+    )
+    database.flush_writes()
+    return result, stats
+
+
+def db_rows(sql: str, params=()) -> list:
+    """Строки из БД теста (после сброса очереди писателя)."""
+    database.flush_writes()
+    conn = sqlite3.connect(database.DB_FILE)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,85 @@
+# tests/test_copier.py
+import os
+import pytest
+from app import copier, database, hashing
+from conftest import write
+
+
+@pytest.fixture
+def two_volumes(monkeypatch):
+    """Все назначения — как будто на разных томах (реплик через copy_file нет)."""
+    monkeypatch.setattr(copier, "same_device", lambda a, b: False)
+
+
+@pytest.mark.parametrize("known", [False, True])
+def test_source_read_once_for_all_destinations(workdir, two_volumes, known):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    src = workdir / "src" / "part.stc"
+    write(src, data)
+    dests = [workdir / f"dest{i}" / "part.stc" for i in range(3)]
+    expected = hashing.calculate_hash(src)
+    reads = []
+
+    file_hash = copier.copy_with_hash(
+        src, dests, on_read=reads.append, known_hash=expected if known else None
+    )
+
+    assert file_hash == expected
+    assert sum(reads) == len(data)
+    for dest in dests:
+        assert dest.read_bytes() == data
+        assert dest.stat().st_mtime == src.stat().st_mtime
+
+
+def test_single_destination_with_known_hash(workdir, two_volumes):
+    src = workdir / "src" / "a.txt"
+    write(src, b"payload")
+    reads = []
+    assert copier.copy_with_hash(src, [workdir / "d" / "a.txt"], on_read=reads.append, known_hash="h") == "h"
+    assert sum(reads) == len(b"payload")
+    assert (workdir / "d" / "a.txt").read_bytes() == b"payload"
+
+
+def test_interrupted_transfer_resumes_from_checkpoint(workdir):
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    src = workdir / "src" / "big.bin"
+    write(src, data)
+    dest = workdir / "d" / "big.bin"
+    settings = dict(copier.DEFAULT_COPY, checkpoint_mb=1)
+    expected = hashing.calculate_hash(src, algorithm="sha256")
+
+    def unplugged(reads: list):
+        def on_read(n: int) -> None:
+            reads.append(n)
+            if sum(reads) >= 2 * 1024 * 1024:
+                raise OSError("сеть пропала")
+        return on_read
+
+    assert copier.resumable_copy(src, dest, "sha256", unplugged([]), settings) is None
+    assert not dest.exists() and copier.temp_path(dest, "part").exists()
+
+    reads = []
+    assert copier.resumable_copy(src, dest, "sha256", reads.append, settings) == expected
+    assert sum(reads) <= len(data) - 2 * 1024 * 1024  # начало файла не перечитывается с источника
+    assert dest.read_bytes() == data
+    assert not copier.temp_path(dest, "part").exists()
+    database.flush_writes()
+    assert copier.load_transfer(str(dest)) is None
+
+
+def test_changed_source_restarts_transfer(workdir):
+    src = workdir / "src" / "big.bin"
+    write(src, os.urandom(2 * 1024 * 1024))
+    dest = workdir / "d" / "big.bin"
+    settings = dict(copier.DEFAULT_COPY, checkpoint_mb=1)
+
+    def unplug(n: int) -> None:
+        raise OSError("сеть пропала")
+    copier.resumable_copy(src, dest, "sha256", unplug, settings)
+
+    data = os.urandom(2 * 1024 * 1024 + 1)
+    write(src, data)
+    reads = []
+    expected = hashing.calculate_hash(src, algorithm="sha256")
+    assert copier.resumable_copy(src, dest, "sha256", reads.append, settings) == expected
+    assert sum(reads) == len(data) and dest.read_bytes() == data
@@ -0,0 +1,85 @@
+# tests/test_daemon.py
+import threading
+import time
+import pytest
+import yaml
+from app import daemon
+from app.daemon import Daemon, SourceState
+from app.metrics import SourceMetrics
+from app.watcher import TreeWatcher, inotify_available
+from conftest import write
+
+needs_inotify = pytest.mark.skipif(not inotify_available(), reason="inotify недоступен")
+
+
+def _wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_interval_grows_without_changes_and_resets():
+    state = SourceState({"name": "ПК-01", "path": "/x"}, 10, SourceMetrics("ПК-01"))
+    intervals = []
+    for _ in range(4):
+        state.schedule(False, 50)
+        intervals.append(state.interval)
+    assert intervals == [20, 40, 50, 50]
+    state.schedule(True, 50)
+    assert state.interval == 10
+    assert state.next_due == pytest.approx(time.monotonic() + 10, abs=1)
+
+
+def test_source_interval_overrides_and_ceiling_below_base():
+    state = SourceState({"name": "ПК-01", "path": "/x", "interval_sec": 120}, 10, SourceMetrics("ПК-01"))
+    state.schedule(False, 60)  # потолок меньше базового интервала источника — остаётся базовый
+    assert state.base_interval == 120 and state.interval == 120
+
+
+@needs_inotify
+def test_watcher_sees_new_files_and_folders(workdir):
+    root = workdir / "watched"
+    root.mkdir()
+    watcher = TreeWatcher(root)
+    try:
+        assert not watcher.consume()
+        write(root / "a.txt", b"a")
+        assert _wait_for(watcher.consume)
+        (root / "Новая папка").mkdir()
+        assert _wait_for(watcher.consume)
+        time.sleep(0.2)  # подпапка добавляется в наблюдение потоком watcher
+        write(root / "Новая папка" / "b.txt", b"b")
+        assert _wait_for(watcher.consume)
+    finally:
+        watcher.close()
+
+
+@needs_inotify
+def test_file_created_in_watched_source_triggers_pass(share, monkeypatch):
+    source, dest = share
+    write(source / "first.txt", b"1")
+    config = source.parent.parent / "config.yaml"
+    config.write_text(yaml.safe_dump({
+        "destination": {"paths": [str(dest)]},
+        "sources": [{"name": source.name, "path": str(source), "buro": "БП"}],
+        "daemon": {"interval_sec": 3600, "report_every_min": 0, "watch": True},
+    }, allow_unicode=True), encoding="utf-8")
+    monkeypatch.setattr(daemon, "WATCH_DEBOUNCE", 0.1)
+    monkeypatch.setattr(daemon, "TICK", 0.05)
+
+    runner = Daemon(str(config))
+    thread = threading.Thread(target=runner.run)
+    thread.start()
+    try:
+        state = runner.states[0]
+        assert _wait_for(lambda: (dest / source.name / "first.txt").exists() and state.watcher is not None)
+        assert _wait_for(lambda: not state.running)
+        write(source / "second.txt", b"2")  # следующий проход по интервалу — только через час
+        assert _wait_for(lambda: (dest / source.name / "second.txt").exists())
+    finally:
+        runner.stop()
+        thread.join(10)
+    assert not thread.is_alive()
@@ -0,0 +1,76 @@
+# tests/test_database.py
+from app import database
+from app.database import SourceCache, find_content, note_dest_content, save_changes, save_dest_changes
+from conftest import db_rows
+
+
+class CountingConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.queries = 0
+
+    def execute(self, *args):
+        self.queries += 1
+        return self.conn.execute(*args)
+
+    def close(self):
+        self.conn.close()
+
+
+def _record(n: int) -> dict:
+    return {"hash": f"h{n}", "mtime": 1.0, "size": n, "algo": "sha256", "quick": None}
+
+
+def test_lazy_cache_does_not_query_prefetched_keys(workdir):
+    save_changes("ПК-01", {f"k{i}": _record(i) for i in range(3)})
+    database.flush_writes()
+    cache = SourceCache("ПК-01", lazy=True)
+    cache._conn = counting = CountingConnection(cache._conn)
+
+    cache.prefetch(["k0", "k1", "new"])
+    assert counting.queries == 1
+    assert cache.get("k1")["hash"] == "h1"
+    assert cache.get("new") is None       # новый файл: в пачке его нет — и в БД нет
+    assert counting.queries == 1
+    assert cache.get("k2")["hash"] == "h2"  # вне пачки — отдельный запрос
+    assert counting.queries == 2
+    cache.close()
+
+
+def test_find_content_sees_rows_not_yet_committed(workdir):
+    record = {"hash": "abc", "mtime": 1.0, "size": 100_000, "algo": "sha256"}
+    note_dest_content("/dest/a.bin", record)
+
+    # Строка ещё не передана писателю — находится по памяти
+    assert [r["dest_path"] for r in find_content(100_000, "sha256", "abc")] == ["/dest/a.bin"]
+    assert find_content(100_000, "sha256", "other") == []
+
+    save_dest_changes("ПК-01", {"/dest/a.bin": record})
+    database.flush_writes()
+    assert database._unsaved_content == {}  # после коммита — только в БД
+    assert db_rows("SELECT dest_path FROM dest_cache") == [("/dest/a.bin",)]
+    assert [r["dest_path"] for r in find_content(100_000, "sha256", "abc")] == ["/dest/a.bin"]
+
+
+def test_removed_dest_is_forgotten(workdir):
+    record = {"hash": "abc", "mtime": 1.0, "size": 10, "algo": "sha256"}
+    note_dest_content("/dest/b.bin", record)
+    save_dest_changes("ПК-01", {}, ["/dest/b.bin"])
+    assert find_content(10, "sha256", "abc") == []
+
+
+def test_failed_change_is_rolled_back_and_rest_of_batch_committed(workdir):
+    database.init_db()
+    writer = database.DbWriter(max_delay=60.0)  # всё — в одну пачку
+    insert = "INSERT INTO scan_runs (source_name, scans) VALUES (?, ?)"
+    writer.submit(insert, [("ПК-01", 1)])
+    # Группа второго источника: первая строка вставится, вторая нарушит PRIMARY KEY
+    writer.submit_group([
+        (insert, [("ПК-02", 1)]),
+        (insert, [("ПК-03", 1), ("ПК-03", 2)]),
+    ])
+    writer.submit(insert, [("ПК-04", 1)])
+    writer.close()
+
+    assert db_rows("SELECT source_name FROM scan_runs ORDER BY source_name") == [("ПК-01",), ("ПК-04",)]
+    assert writer.rows == 2
@@ -0,0 +1,69 @@
+# tests/test_dedup.py
+import os
+from app import dedup
+from app.database import find_content
+from app.dedup import find_existing, materialize
+from conftest import sync, write
+
+DEDUP = {"dedup": {"enabled": True, "mode": "hardlink", "min_size_kb": 1}}
+SIZE = 64 * 1024
+
+
+def test_identical_new_file_becomes_hardlink(share):
+    source, dest = share
+    data = os.urandom(SIZE)
+    write(source / "Шаблоны" / "рамка.frw", data)
+    sync(source, dest, DEDUP)
+
+    write(source / "Проект" / "рамка.frw", data)
+    _, stats = sync(source, dest, DEDUP)
+
+    origin = dest / source.name / "Шаблоны" / "рамка.frw"
+    copy = dest / source.name / "Проект" / "рамка.frw"
+    assert stats["added"] == 1 and stats["deduped"] == 1
+    assert stats["saved_bytes"] == SIZE
+    assert os.path.samefile(origin, copy) and copy.read_bytes() == data
+
+
+def test_changed_candidate_is_not_reused(share):
+    source, dest = share
+    data = os.urandom(SIZE)
+    write(source / "a.bin", data)
+    sync(source, dest, DEDUP)
+
+    # Файл назначения изменили после записи: его содержимое уже не то, что в индексе
+    candidate = dest / source.name / "a.bin"
+    st = candidate.stat()
+    os.utime(candidate, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    write(source / "b.bin", data)
+    _, stats = sync(source, dest, DEDUP)
+
+    copy = dest / source.name / "b.bin"
+    assert stats["added"] == 1 and stats["deduped"] == 0 and stats["saved_bytes"] == 0
+    assert not os.path.samefile(candidate, copy) and copy.read_bytes() == data
+
+
+def test_find_existing_checks_size_and_mtime(share):
+    source, dest = share
+    data = os.urandom(SIZE)
+    write(source / "a.bin", data)
+    sync(source, dest, DEDUP)
+    target = dest / source.name / "a.bin"
+    file_hash = find_content(SIZE, "sha256")[0]["hash"]
+
+    assert find_existing(SIZE, "sha256", file_hash) == target
+    target.write_bytes(data + b"!")  # размер изменился
+    assert find_existing(SIZE, "sha256", file_hash) is None
+
+
+def test_materialize_copies_across_volumes(workdir, monkeypatch):
+    origin = workdir / "vol1" / "a.bin"
+    write(origin, b"x" * 100)
+    monkeypatch.setattr(dedup, "same_device", lambda a, b: False)
+    targets = [workdir / "vol2" / "a.bin", workdir / "vol3" / "a.bin"]
+
+    done, saved = materialize(origin, targets)
+
+    assert done == targets and saved == 0
+    for target in targets:
+        assert target.read_bytes() == b"x" * 100 and not os.path.samefile(origin, target)
@@ -0,0 +1,58 @@
+# tests/test_delta.py
+import os
+import pytest
+from app import copier, delta, hashing
+from conftest import db_rows, write
+
+SETTINGS = dict(delta.DEFAULT_DELTA, block_kb=16)
+SIZE = 1024 * 1024
+
+
+@pytest.fixture
+def files(workdir):
+    data = bytearray(os.urandom(SIZE))
+    src, dest = workdir / "src" / "model.cdw", workdir / "dest" / "model.cdw"
+    write(dest, bytes(data))
+    return src, dest, data
+
+
+def _local_copy(backend):
+    """copy_file, сообщающий заданный способ копирования временной копии назначения."""
+    def fake(src_file, dest_file, *args):
+        copier.copy_file(src_file, dest_file, "readinto")
+        return backend
+    return fake
+
+
+def _update(src, dest):
+    writes = []
+    st = dest.stat()
+    file_hash = delta.delta_update(
+        src, dest, (float(st.st_mtime), st.st_size), "sha256", on_write=writes.append, settings=SETTINGS
+    )
+    return file_hash, sum(writes)
+
+
+@pytest.mark.parametrize("backend, base", [("readinto", SIZE), ("reflink", 0)])
+def test_written_bytes_include_local_copy(files, monkeypatch, backend, base):
+    src, dest, data = files
+    data[300_000:300_010] = b"X" * 10
+    write(src, bytes(data))
+    monkeypatch.setattr(delta, "copy_file", _local_copy(backend))
+
+    file_hash, written = _update(src, dest)
+
+    assert dest.read_bytes() == bytes(data)
+    assert file_hash == hashing.calculate_hash(src)
+    assert base <= written <= base + 2 * 16 * 1024  # копия + один-два изменённых блока
+
+
+def test_inserted_bytes_found_by_rolling_window(files):
+    src, dest, data = files
+    write(src, bytes(data[:200_000]) + b"inserted" + bytes(data[200_000:]))
+
+    file_hash, _ = _update(src, dest)
+
+    assert dest.read_bytes() == src.read_bytes()
+    assert file_hash == hashing.calculate_hash(src)
+    assert db_rows("SELECT size FROM block_sums") == [(SIZE + len(b"inserted"),)]
@@ -0,0 +1,44 @@
+# tests/test_index.py
+import hashlib
+from app.index import CompactIndex
+
+
+def _record(data: bytes, algo: str = "sha256", quick=None) -> dict:
+    return {"hash": hashlib.sha256(data).hexdigest(), "mtime": 1.5, "size": len(data), "algo": algo, "quick": quick}
+
+
+def test_round_trip_like_dict():
+    index = CompactIndex()
+    records = {
+        "сборка/деталь01.stc": _record(b"a", quick="ab" * 16),
+        "сборка/узел/деталь01.stc": _record(b"b", algo="blake2b"),
+        "корень.txt": {"hash": None, "mtime": 2.0, "size": 0, "algo": None, "quick": None},
+        "legacy.txt": dict(_record(b"c"), hash="ABC"),  # не каноничный hex хранится как есть
+        "short.bin": dict(_record(b"d", algo="xxh3_128"), hash="0f" * 16),
+    }
+    for key, record in records.items():
+        index[key] = record
+
+    assert len(index) == len(records)
+    assert sorted(index.keys()) == sorted(records)
+    for key, record in records.items():
+        assert key in index and index[key] == record
+    assert index.get("нет/такого") is None and "сборка/" not in index
+
+
+def test_update_pop_and_slot_reuse():
+    index = CompactIndex.from_rows([
+        ("a/1.txt", "aa" * 32, 1.0, 1, "sha256", None),
+        ("a/2.txt", "bb" * 32, 2.0, 2, "sha256", None),
+    ])
+    index["a/1.txt"] = _record(b"new")
+    assert index["a/1.txt"] == _record(b"new") and len(index) == 2
+
+    assert index.pop("a/2.txt")["hash"] == "bb" * 32
+    assert index.pop("a/2.txt", "нет") == "нет" and "a/2.txt" not in index
+    index["b/3.txt"] = {"hash": "XYZ", "mtime": 3.0, "size": 3, "algo": "sha256", "quick": None}
+    index["b/4.txt"] = _record(b"4")
+    assert index["b/3.txt"]["hash"] == "XYZ"  # освободившийся слот не хранит старых данных
+    assert index["b/4.txt"] == _record(b"4")
+    del index["b/3.txt"]
+    assert sorted(index) == ["a/1.txt", "b/4.txt"] and len(index) == 2
@@ -0,0 +1,34 @@
+# tests/test_journal.py
+import sqlite3
+from app import database, journal
+from app.journal import ChangeLog, RunChanges
+
+RUNS = 2500
+
+
+def test_report_over_many_runs(workdir, monkeypatch):
+    # Предел параметров как в старых сборках SQLite (в новых — 32766 и больше)
+    connect = journal._connect
+
+    def limited_connect() -> sqlite3.Connection:
+        conn = connect()
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        return conn
+    monkeypatch.setattr(journal, "_connect", limited_connect)
+
+    for run_id in range(1, RUNS + 1):
+        log = ChangeLog(run_id, "ПК-01" if run_id % 2 else "ПК-02")
+        log.add(f"file{run_id}.txt", "added" if run_id % 3 else "modified", run_id, 1.0, 1, 0.5)
+        log.flush()
+    database.flush_writes()
+
+    # Чётные запуски — проходы, ещё не вошедшие в отчёт: их изменений в нём нет
+    changes = RunChanges(range(1, RUNS + 1, 2))
+    counts = changes.counts()
+    assert set(counts) == {"ПК-01"}
+    assert counts["ПК-01"]["added"] + counts["ПК-01"]["modified"] == RUNS // 2
+    rows = list(changes.iter_source("ПК-01"))
+    assert len(rows) == RUNS // 2
+    assert rows[0][1] == "added" and rows[-1][1] == "modified"
+    assert rows[-1][2] == {"size": rows[-1][2]["size"], "mtime": 1.0, "old_size": 1, "old_mtime": 0.5}
+    assert RunChanges([]).counts() == {}
@@ -0,0 +1,81 @@
+# tests/test_metrics.py
+import json
+import os
+import pytest
+from pathlib import Path
+from app import metrics as metrics_module
+from app.metrics import SourceMetrics, run_snapshot, save_metrics
+
+
+def snapshot_of(files: int, copy_sec: float) -> dict:
+    metrics = SourceMetrics("ПК-01")
+    metrics.add("files", files)
+    metrics.add("cache_hits", files - 1)
+    metrics.add("cache_misses")
+    metrics.record("copy", copy_sec, path="a/b.bin", size=10)
+    return run_snapshot({"ПК-01": metrics}, 2.5, db={"commits": 3})
+
+
+def test_save_metrics_writes_json_and_prom(tmp_path):
+    report = tmp_path / "Отчет_2026-10-17.html"
+    json_path, prom_path = save_metrics(report, snapshot_of(4, 1.25), tmp_path / "prom")
+
+    assert json_path == tmp_path / "Отчет_2026-10-17.metrics.json"
+    data = json.loads(json_path.read_text(encoding="utf-8"))
+    assert data["wall_sec"] == 2.5 and data["db"] == {"commits": 3}
+    assert data["totals"]["counters"]["files"] == 4
+    assert data["totals"]["phases"]["copy"] == {"seconds": 1.25, "count": 1}
+    assert data["totals"]["cache_hit_ratio"] == 0.75
+    assert data["sources"][0]["slowest"] == [{"path": "a/b.bin", "phase": "copy", "seconds": 1.25, "size": 10}]
+
+    assert prom_path == tmp_path / "prom" / "metrics.prom"
+    lines = prom_path.read_text(encoding="utf-8").splitlines()
+    assert "sync_run_seconds 2.5" in lines
+    assert 'sync_files{source="ПК-01"} 4' in lines
+    assert 'sync_phase_seconds{source="ПК-01",phase="copy"} 1.25' in lines
+    assert 'sync_cache_hit_ratio{source="ПК-01"} 0.75' in lines
+    assert "sync_db_commits 3" in lines
+    assert "# TYPE sync_run_seconds gauge" in lines
+
+    # Временные файлы после записи не остаются
+    leftovers = [p for p in tmp_path.rglob("*") if p.name.endswith(".tmp")]
+    assert leftovers == []
+
+
+def test_prom_file_from_config(tmp_path):
+    target = tmp_path / "node_exporter" / "sync.prom"
+    _, prom_path = save_metrics(tmp_path / "r.html", snapshot_of(2, 0.5), tmp_path, str(target))
+    assert prom_path == target and "sync_files" in target.read_text(encoding="utf-8")
+    assert not (tmp_path / "metrics.prom").exists()
+
+
+def test_replace_is_atomic(tmp_path, monkeypatch):
+    report = tmp_path / "r.html"
+    save_metrics(report, snapshot_of(2, 0.5), tmp_path)
+    prom = tmp_path / "metrics.prom"
+    old_prom = prom.read_text(encoding="utf-8")
+
+    # Пока новый файл пишется, читатель видит старый целиком; новый подменяет его одним os.replace
+    seen = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        seen.append((Path(dst).name, Path(dst).read_text(encoding="utf-8"), Path(src).read_text(encoding="utf-8")))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(metrics_module.os, "replace", replace)
+    save_metrics(report, snapshot_of(7, 3.0), tmp_path)
+    by_name = {name: (before, after) for name, before, after in seen}
+    assert set(by_name) == {"r.metrics.json", "metrics.prom"}
+    assert by_name["metrics.prom"][0] == old_prom
+    assert 'sync_files{source="ПК-01"} 7' in by_name["metrics.prom"][1]
+    assert 'sync_files{source="ПК-01"} 7' in prom.read_text(encoding="utf-8")
+
+    # Сбой на подмене: прежний файл остаётся целым
+    def broken(src, dst):
+        raise OSError("диск недоступен")
+
+    monkeypatch.setattr(metrics_module.os, "replace", broken)
+    with pytest.raises(OSError):
+        save_metrics(report, snapshot_of(9, 1.0), tmp_path)
+    assert json.loads((tmp_path / "r.metrics.json").read_text(encoding="utf-8"))["totals"]["counters"]["files"] == 7
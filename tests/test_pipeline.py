@@ -0,0 +1,75 @@
+# tests/test_pipeline.py
+import logging
+import threading
+import time
+from app import smb_utils
+from app.pipeline import StagePool
+from conftest import db_rows, sync, write
+
+
+def test_close_drains_queued_items():
+    done = []
+    pool = StagePool("slow", lambda item: (time.sleep(0.001), done.append(item)), workers=2, maxsize=4)
+    for item in range(100):
+        pool.put(item)  # очередь меньше числа задач: put ждёт (обратное давление)
+    pool.close()
+    assert sorted(done) == list(range(100))
+    assert not any(t.is_alive() for t in pool.threads)
+
+
+def test_failing_item_does_not_stop_stage(caplog):
+    done = []
+    lock = threading.Lock()
+
+    def work(item):
+        if item % 10 == 0:
+            raise OSError(f"сбой на {item}")
+        with lock:
+            done.append(item)
+
+    pool = StagePool("copy", work, workers=3, maxsize=2)
+    with caplog.at_level(logging.ERROR):
+        for item in range(50):
+            pool.put(item)
+        pool.close()
+    assert sorted(done) == [i for i in range(50) if i % 10]
+    assert sum("Ошибка в стадии 'copy'" in r.message for r in caplog.records) == 5
+
+
+def test_chained_stages_forward_after_error():
+    # Как в sync_folder: стадия копирования передаёт задачу дальше в finally, даже после ошибки
+    state = []
+    state_pool = StagePool("state", state.append)
+
+    def copy_stage(item):
+        try:
+            if item == 3:
+                raise OSError("диск отключён")
+        finally:
+            state_pool.put(item)
+
+    copy_pool = StagePool("copy", copy_stage, workers=2)
+    for item in range(10):
+        copy_pool.put(item)
+    copy_pool.close()
+    state_pool.close()
+    assert sorted(state) == list(range(10))
+
+
+def test_failed_copy_keeps_state_of_other_files(share, monkeypatch):
+    source, dest = share
+    for i in range(6):
+        write(source / f"f{i}.txt", f"file {i}".encode())
+    real_copy = smb_utils.copy_with_hash
+
+    def flaky_copy(src, *args, **kwargs):
+        if src.name == "f3.txt":
+            raise OSError("диск отключён")  # исключение выходит из стадии копирования
+        return real_copy(src, *args, **kwargs)
+    monkeypatch.setattr(smb_utils, "copy_with_hash", flaky_copy)
+
+    _, stats = sync(source, dest, {"pipeline": {"copy_workers": 2, "queue_size": 1}})
+
+    assert stats["added"] == 5 and stats["errors"] == 1
+    assert db_rows("SELECT COUNT(*) FROM change_log") == [(5,)]
+    assert sorted(p.name for p in (dest / source.name).iterdir()) == [f"f{i}.txt" for i in range(6) if i != 3]
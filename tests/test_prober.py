@@ -0,0 +1,90 @@
+# tests/test_prober.py
+import asyncio
+import threading
+import time
+import pytest
+from app import prober
+from app.prober import Prober
+
+SHARE = "//pc-01/РАБОТА"
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    """Поддельное TCP-подключение: ПК из списка up отвечают, остальные молчат до таймаута."""
+    calls = []
+    up = set()
+    closed = []
+
+    class Writer:
+        def close(self):
+            pass
+
+        async def wait_closed(self):
+            closed.append(True)
+
+    async def open_connection(host, port):
+        calls.append(host)
+        if host in up:
+            return None, Writer()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(prober.asyncio, "open_connection", open_connection)
+    monkeypatch.setattr(prober.os.path, "isdir", lambda path: True)
+    return calls, up, closed
+
+
+def test_backoff_grows_to_ceiling_with_jitter(monkeypatch):
+    probe = Prober({"probe": {"backoff_base": 2, "backoff_max": 20}})
+    monkeypatch.setattr(prober.random, "uniform", lambda a, b: b)
+    assert [probe._backoff(n) for n in range(1, 7)] == [2, 4, 8, 16, 20, 20]
+    monkeypatch.setattr(prober.random, "uniform", lambda a, b: a)
+    assert [probe._backoff(n) for n in range(1, 4)] == [1, 2, 4]  # разброс — до половины паузы
+
+
+def test_unreachable_host_times_out_and_backs_off(connects):
+    calls, up, _ = connects
+    probe = Prober({"probe": {"connect_timeout": 0.2, "backoff_base": 60}})
+
+    started = time.monotonic()
+    assert probe.check([SHARE]) == {SHARE: False}
+    assert time.monotonic() - started < 2
+    state = probe.hosts["pc-01"]
+    assert state.failures == 1 and state.retry_at > time.monotonic() + 25
+
+    up.add("pc-01")
+    assert probe.check([SHARE]) == {SHARE: False}  # пауза после неудачи: ПК не опрашивается
+    assert calls == ["pc-01"]
+
+    state.retry_at = 0.0
+    assert probe.check([SHARE]) == {SHARE: True}
+    assert state.failures == 0 and calls == ["pc-01", "pc-01"]
+
+
+def test_connection_closed_after_probe(connects):
+    _, up, closed = connects
+    up.add("pc-01")
+    assert Prober().check([SHARE]) == {SHARE: True}
+    assert closed == [True]
+
+
+def test_hung_stat_does_not_block_other_probes(workdir, monkeypatch):
+    release = threading.Event()
+    started = []
+
+    def isdir(path):
+        if path.endswith("hung"):
+            started.append(path)
+            release.wait(30)  # шара повисла
+        return True
+    monkeypatch.setattr(prober.os.path, "isdir", isdir)
+    probe = Prober({"probe": {"stat_timeout": 0.2}})
+    hung, fine = str(workdir / "hung"), str(workdir / "fine")
+    try:
+        for _ in range(20):  # больше, чем было потоков в общем пуле
+            assert probe.check([hung, fine]) == {hung: False, fine: True}
+        assert started == [hung]  # пока прошлый stat висит, новый не запускается
+    finally:
+        release.set()
+    probe._stalled[hung].join(5)
+    assert probe.check([hung]) == {hung: True}
@@ -0,0 +1,92 @@
+# tests/test_reporter.py
+import json
+from datetime import datetime, timedelta
+from app import database, reporter
+from app.journal import ChangeLog, RunChanges
+
+
+def _report(dt: datetime) -> dict:
+    stamp = dt.strftime("%Y-%m-%d_%H-%M-%S")
+    return {"date": dt.isoformat(timespec="seconds"), "path": f"Все даты/{stamp[:10]}/Отчет_{stamp}.html", "changes": 1}
+
+
+def _months(index_html: str) -> list:
+    return [line.split("отчётов: ")[1].split("<")[0] for line in index_html.splitlines() if "отчётов: " in line]
+
+
+def test_new_report_does_not_read_whole_manifest(workdir, monkeypatch):
+    settings = dict(reporter.DEFAULT_REPORT, index_recent=3)
+    start = datetime.now() - timedelta(days=40)
+    for day in range(5):
+        reporter.update_reports_index(_report(start + timedelta(days=day)), settings)
+
+    def full_read(base_dir):
+        raise AssertionError("журнал прочитан целиком")
+    monkeypatch.setattr(reporter, "load_manifest", full_read)
+    newest = _report(datetime.now())
+    index = reporter.update_reports_index(newest, settings)
+
+    base_dir = reporter.reports_base_dir()
+    lines = (base_dir / reporter.MANIFEST_NAME).read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 6 and json.loads(lines[-1]) == newest
+    html = index.read_text(encoding="utf-8")
+    assert newest["path"] in html
+    assert sum(int(count) for count in _months(html)) == 6
+    month_page = base_dir / reporter.MONTHS_DIR / f"{newest['date'][:7]}.html"
+    assert newest["path"].rsplit("/", 1)[-1] in month_page.read_text(encoding="utf-8")
+
+
+def test_edited_manifest_or_retention_reads_manifest(workdir):
+    settings = dict(reporter.DEFAULT_REPORT, index_recent=3)
+    old = _report(datetime.now() - timedelta(days=30))
+    reporter.update_reports_index(old, settings)
+    reporter.update_reports_index(_report(datetime.now() - timedelta(days=1)), settings)
+
+    # Журнал поправлен вручную — сводка ему больше не соответствует
+    manifest = reporter.reports_base_dir() / reporter.MANIFEST_NAME
+    manifest.write_text(manifest.read_text(encoding="utf-8").splitlines()[1] + "\n", encoding="utf-8")
+    html = reporter.update_reports_index(None, settings).read_text(encoding="utf-8")
+    assert old["path"] not in html and _months(html) == ["1"]
+
+    # Подошёл срок хранения — полный проход убирает старый отчёт
+    reporter.update_reports_index(old, settings)
+    html = reporter.update_reports_index(None, dict(settings, keep_days=7, archive=False)).read_text(encoding="utf-8")
+    assert old["path"] not in html
+
+
+def test_large_source_split_into_pages(workdir):
+    log = ChangeLog(1, "ПК-01")
+    for i in range(5):
+        log.add(f"new{i}.txt", "added", 10, 1.0)
+    for i in range(2):
+        log.add(f"old{i}.txt", "modified", 20, 2.0, 10, 1.0)
+    log.flush()
+    small = ChangeLog(1, "ПК-02")
+    small.add("small.txt", "added", 1, 1.0)
+    small.flush()
+    database.flush_writes()
+
+    stats = {"Бюро": {"ПК-01": {"added": 5, "modified": 2}, "ПК-02": {"added": 1, "modified": 0}}}
+    settings = dict(reporter.DEFAULT_REPORT, page_size=3)
+    report = reporter.save_html_report(stats, datetime(2026, 10, 17, 9, 30), RunChanges([1]), settings=settings)
+
+    pages_dir = report.parent / f"{report.stem}_страницы"
+    assert sorted(p.name for p in pages_dir.iterdir()) == ["1-1.html", "1-2.html", "1-3.html"]
+    html = report.read_text(encoding="utf-8")
+    for k in (1, 2, 3):
+        assert f'href="{pages_dir.name}/1-{k}.html"' in html
+    # Большой источник — только ссылки, маленький — список целиком
+    assert "new0.txt" not in html and "small.txt" in html
+
+    pages = [(pages_dir / f"1-{k}.html").read_text(encoding="utf-8") for k in (1, 2, 3)]
+    assert all(f'href="../{report.name}"' in page for page in pages)
+    assert "страница 1 из 3" in pages[0] and "« предыдущая" not in pages[0]
+    assert 'href="1-2.html"' in pages[0]
+    assert 'href="1-1.html"' in pages[1] and 'href="1-3.html"' in pages[1]
+    assert 'href="1-2.html"' in pages[2] and "следующая »" not in pages[2]
+    # Каждый файл — ровно на одной странице, добавленные раньше изменённых
+    names = [f"new{i}.txt" for i in range(5)] + [f"old{i}.txt" for i in range(2)]
+    for name in names:
+        assert sum(name in page for page in pages) == 1
+    assert all(name in pages[0] for name in names[:3])
+    assert "old1.txt" in pages[2] and "new4.txt" in pages[1]
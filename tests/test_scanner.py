@@ -0,0 +1,45 @@
+# tests/test_scanner.py
+import os
+from app.scanner import DEFAULT_SCAN
+from conftest import sync, write
+
+
+def _edit_in_place(path, data: bytes) -> None:
+    """Правка без пересохранения: mtime файла меняется, mtime папки — нет."""
+    dir_mtime = os.stat(path.parent).st_mtime_ns
+    with path.open("r+b") as f:
+        f.write(data)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    assert os.stat(path.parent).st_mtime_ns == dir_mtime
+
+
+def test_dir_cache_off_by_default():
+    assert DEFAULT_SCAN["dir_cache"] is False
+
+
+def test_in_place_edit_synced_without_dir_cache(share):
+    source, dest = share
+    write(source / "sub" / "part.stc", b"old content")
+    sync(source, dest)
+
+    _edit_in_place(source / "sub" / "part.stc", b"new")
+    _, stats = sync(source, dest)
+
+    assert stats["modified"] == 1
+    assert (dest / source.name / "sub" / "part.stc").read_bytes() == b"new content"
+
+
+def test_dir_cache_misses_in_place_edit_until_full_rescan(share):
+    source, dest = share
+    config = {"scan": {"dir_cache": True, "full_rescan_every": 3}}
+    write(source / "sub" / "part.stc", b"old content")
+    sync(source, dest, config)  # скан №1 — полный, кэш папок заполняется
+
+    _edit_in_place(source / "sub" / "part.stc", b"new")
+    _, stats = sync(source, dest, config)  # скан №2 — папка из кэша
+    assert stats["modified"] == 0  # задокументированное ограничение кэша папок
+
+    _, stats = sync(source, dest, config)  # скан №3 — полный
+    assert stats["modified"] == 1
+    assert (dest / source.name / "sub" / "part.stc").read_bytes() == b"new content"
@@ -0,0 +1,81 @@
+# tests/test_scheduler.py
+import threading
+from app.metrics import SourceMetrics, prometheus_text, run_snapshot
+from datetime import datetime
+from app.scheduler import Scheduler, scheduler_settings
+from app.sync_core import SyncRun
+from conftest import write
+
+
+def test_slot_wait_goes_to_metrics():
+    scheduler = Scheduler(scheduler_settings({"scheduler": {"max_per_host": 1}}))
+    metrics = SourceMetrics("ПК-02")
+    holding = threading.Event()
+    release = threading.Event()
+
+    def first():
+        with scheduler.source_slot("pc"):
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    holding.wait(5)
+    threading.Timer(0.2, release.set).start()
+    with scheduler.source_slot("pc", on_wait=lambda sec: metrics.record("slot_wait", sec)):
+        pass
+    thread.join()
+
+    seconds, count = metrics.phases["slot_wait"]
+    assert count == 1 and seconds >= 0.1
+    assert scheduler.throttled["pc"] == seconds
+
+
+def test_throttle_time_in_report_metrics(share):
+    source, dest = share
+    write(source / "big.bin", b"x" * 80 * 1024)
+    # ~51 КБ/с: чтение файла ждёт лимита
+    run = SyncRun({"destination": {"paths": [str(dest)]}, "scheduler": {"host_rate_mb": 0.05}})
+    run.sync_source({"name": source.name, "path": str(source)})
+
+    metrics = run.metrics[source.name]
+    seconds, count = metrics.phases["throttle"]
+    assert count > 0 and seconds > 0.1
+    assert abs(sum(run.scheduler.throttled.values()) - seconds) < 1e-6
+
+    snapshot = run_snapshot(run.metrics, 1.0)
+    assert snapshot["totals"]["phases"]["throttle"]["seconds"] > 0.1
+    assert f'sync_phase_seconds{{source="{source.name}",phase="throttle"}}' in prometheus_text(snapshot)
+
+
+def test_bad_limits_fall_back_to_defaults():
+    settings = scheduler_settings({"scheduler": {
+        "max_sources": "4",
+        "max_per_host": 0,
+        "host_rate_mb": -1,
+        "global_rate_mb": 2.5,
+        "profiles": [
+            {"from": "08:00", "to": "19:00", "max_per_host": 1, "host_rate_mb": "10"},
+            {"from": "25:00", "to": "26:00", "max_per_host": 1},
+            {"to": "19:00"},
+            "не профиль",
+        ],
+    }})
+    assert settings == {
+        "max_sources": 20,
+        "max_per_host": 2,
+        "global_rate_mb": 2.5,
+        "host_rate_mb": 0,
+        "profiles": [{"start": 480, "end": 1140, "limits": {"max_per_host": 1}}],
+    }
+
+    scheduler = Scheduler(settings)
+    assert scheduler.limits(datetime(2026, 1, 5, 12, 0))["max_per_host"] == 1
+    assert scheduler.limits(datetime(2026, 1, 5, 20, 0))["max_per_host"] == 2
+
+
+def test_run_reads_scheduler_through_settings():
+    run = SyncRun({"scheduler": {"max_per_host": "1", "profiles": [{"from": "22:00", "to": "06:00", "host_rate_mb": 5}]}})
+    assert run.stages["scheduler"]["max_per_host"] == 2
+    assert run.scheduler.limits(datetime(2026, 1, 5, 23, 0))["host_rate_mb"] == 5
+    assert run.scheduler.limits(datetime(2026, 1, 5, 7, 0))["host_rate_mb"] == 0
@@ -0,0 +1,41 @@
+# tests/test_settings.py
+import pytest
+from app.config_loader import ConfigError, validate_config
+from app.settings import source_settings
+from app.sync_core import SyncRun
+from conftest import write
+
+
+def test_bad_source_numbers_fall_back_to_defaults():
+    sources = source_settings({"sources": [
+        {"name": "a", "path": "/a", "scan_workers": "8", "wait_sec": -1, "interval_sec": 0},
+        {"name": "b", "path": "/b", "scan_workers": 0, "timeout_sec": True},
+        {"name": "c", "path": "/c", "scan_workers": 4, "wait_sec": 0, "interval_sec": 1.5, "timeout_sec": 0},
+        {"name": "без пути"},
+        "не словарь",
+    ]})
+    assert sources == [
+        {"name": "a", "path": "/a"},
+        {"name": "b", "path": "/b"},
+        {"name": "c", "path": "/c", "scan_workers": 4, "wait_sec": 0, "interval_sec": 1.5, "timeout_sec": 0},
+    ]
+
+
+def test_validate_config_uses_same_rules():
+    config = {"sources": [{"name": "a", "path": "/a", "scan_workers": 0}], "destination": {"paths": ["/d"]}}
+    with pytest.raises(ConfigError, match="scan_workers"):
+        validate_config(config)
+    config["sources"][0]["scan_workers"] = 2
+    validate_config(config)
+
+
+def test_run_with_string_scan_workers_syncs(share):
+    source, dest = share
+    write(source / "a" / "b.txt", b"b")
+    run = SyncRun({
+        "destination": {"paths": [str(dest)]},
+        "sources": [{"name": source.name, "path": str(source), "scan_workers": "8"}],
+    })
+    run.run()
+    assert run.completed == {source.name}
+    assert (dest / source.name / "a" / "b.txt").read_bytes() == b"b"
@@ -0,0 +1,188 @@
+# tests/test_smb_utils.py
+import os
+from app import copier, database, hashing
+from app.hashing import DEFAULT_HASHING, QUICK_EXACT_SIZE
+from app.metrics import SourceMetrics
+from conftest import db_rows, sync, write
+
+QUICK = {"hashing": {"quick_fingerprint": True}}
+
+
+def _bump_mtime(path, seconds: int = 10) -> None:
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def test_quick_fingerprint_off_by_default():
+    assert DEFAULT_HASHING["quick_fingerprint"] is False
+
+
+def test_quick_fingerprint_does_not_hide_same_size_edit(share):
+    # Правка одного блока большого CAD-файла вне участков отпечатка (начало/середина/конец)
+    source, dest = share
+    data = bytearray(os.urandom(3 * 1024 * 1024))
+    write(source / "model.cdw", bytes(data))
+    sync(source, dest, QUICK)
+
+    data[500_000:500_016] = b"X" * 16
+    (source / "model.cdw").write_bytes(bytes(data))
+    _bump_mtime(source / "model.cdw")
+    _, stats = sync(source, dest, QUICK)
+
+    assert stats["modified"] == 1
+    assert (dest / source.name / "model.cdw").read_bytes() == bytes(data)
+
+
+def test_quick_fingerprint_trusted_for_small_files(share):
+    source, dest = share
+    write(source / "note.txt", b"x" * (QUICK_EXACT_SIZE // 2))
+    sync(source, dest, QUICK)
+
+    _bump_mtime(source / "note.txt")  # mtime сбился, содержимое то же
+    metrics = SourceMetrics(source.name)
+    _, stats = sync(source, dest, QUICK, metrics=metrics)
+
+    assert stats["modified"] == 0
+    assert metrics.counters["quick_hits"] == 1
+
+
+def test_algorithm_migration_not_bypassed_by_quick_fingerprint(share):
+    source, dest = share
+    for i in range(5):
+        write(source / f"f{i}.txt", f"file {i}".encode())
+    sync(source, dest, {"hashing": {"algorithm": "sha256", "quick_fingerprint": True}})
+    assert db_rows("SELECT DISTINCT algo FROM file_cache") == [("sha256",)]
+
+    config = {"hashing": {"algorithm": "blake2b", "quick_fingerprint": True, "rehash_per_run": 3}}
+    sync(source, dest, config)
+    assert db_rows("SELECT algo, COUNT(*) FROM file_cache GROUP BY algo") == [("blake2b", 3), ("sha256", 2)]
+
+    _, stats = sync(source, dest, config)
+    assert db_rows("SELECT DISTINCT algo FROM file_cache") == [("blake2b",)]
+    assert db_rows("SELECT DISTINCT algo FROM dest_cache") == [("blake2b",)]
+    assert stats["modified"] == 0
+
+
+def test_failed_copy_not_counted_or_journaled(share, monkeypatch):
+    source, dest = share
+    write(source / "a.txt", b"first!")
+    sync(source, dest)
+
+    write(source / "a.txt", b"second")  # размер тот же — хеш источника посчитан до копирования
+    _bump_mtime(source / "a.txt")
+
+    def broken_copy(*args, **kwargs):
+        raise OSError("диск отключён")
+    monkeypatch.setattr(copier, "copy_file", broken_copy)
+    _, stats = sync(source, dest)
+
+    assert stats["modified"] == 0 and stats["copied"] == 0
+    assert stats["errors"] == 1
+    assert db_rows("SELECT COUNT(*) FROM change_log WHERE status = 'modified'") == [(0,)]
+
+    monkeypatch.undo()
+    _, stats = sync(source, dest)  # следующий запуск повторяет копирование
+    assert stats["modified"] == 1 and stats["errors"] == 0
+    assert (dest / source.name / "a.txt").read_bytes() == b"second"
+
+
+def test_deleted_source_file_state_purged(share):
+    source, dest = share
+    write(source / "keep.txt", b"keep")
+    write(source / "gone.txt", b"gone")
+    sync(source, dest)
+    gone_dest = str(dest / source.name / "gone.txt")
+    keep_dest = str(dest / source.name / "keep.txt")
+    database.save_block_sums(gone_dest, 4, 1.0, 4, b"")
+    database.save_transfer(gone_dest + ".new", str(source / "gone.txt"), 1.0, 4, "md5", 2, "x")
+    database.save_transfer(keep_dest + ".new", str(source / "keep.txt"),
+                           *hashing.get_file_info(source / "keep.txt"), "md5", 2, "x")
+    part = copier.temp_path(dest / source.name / "gone.txt.new", "part")
+    write(part, b"go")
+    database.flush_writes()
+
+    (source / "gone.txt").unlink()
+    sync(source, dest)
+
+    assert db_rows("SELECT dest_path FROM dest_cache") == [(keep_dest,)]
+    assert db_rows("SELECT COUNT(*) FROM block_sums") == [(0,)]
+    assert db_rows("SELECT dest_path FROM transfers") == [(keep_dest + ".new",)]
+    assert not part.exists()
+    assert (dest / source.name / "gone.txt").exists()  # синхронизация только добавляет
+
+
+def test_streamed_quick_fingerprint_matches_seek_reads(workdir):
+    for size in (0, 100, QUICK_EXACT_SIZE, QUICK_EXACT_SIZE + 1, 1024 * 1024 + 7):
+        data = os.urandom(size)
+        write(workdir / "f.bin", data)
+        quick = hashing.QuickFingerprint(size)
+        assert hashing.calculate_hash(workdir / "f.bin", chunk_size=5000, quick=quick)
+        assert quick.hexdigest() == hashing.quick_fingerprint(workdir / "f.bin", size)
+
+
+def test_same_size_edit_reads_source_once(share):
+    source, dest = share
+    write(source / "note.txt", b"a" * 1000)
+    sync(source, dest, QUICK)
+
+    write(source / "note.txt", b"b" * 1000)
+    _bump_mtime(source / "note.txt")
+    metrics = SourceMetrics(source.name)
+    _, stats = sync(source, dest, QUICK, metrics=metrics)
+
+    assert stats["modified"] == 1
+    # Отпечаток и хеш — одно чтение, второе — копирование
+    assert metrics.counters["bytes_read"] == 2000 and metrics.counters["cache_misses"] == 1
+    assert db_rows("SELECT quick FROM file_cache") == [(hashing.quick_fingerprint(source / "note.txt", 1000),)]
+
+
+def test_large_file_touch_trusted_only_when_opted_in(share):
+    source, dest = share
+    size = 2 * 1024 * 1024
+    write(source / "model.cdw", os.urandom(size))
+    trusting = {"hashing": {"quick_fingerprint": True, "quick_trust_large": True}}
+    sync(source, dest, trusting)
+
+    _bump_mtime(source / "model.cdw")  # резервное копирование «тронуло» файл
+    metrics = SourceMetrics(source.name)
+    _, stats = sync(source, dest, trusting, metrics=metrics)
+    assert stats["modified"] == 0 and metrics.counters["quick_hits"] == 1
+    assert metrics.counters["bytes_read"] == 3 * hashing.QUICK_BLOCK
+
+    _bump_mtime(source / "model.cdw")
+    metrics = SourceMetrics(source.name)
+    sync(source, dest, QUICK, metrics=metrics)  # без явного доверия — полный хеш
+    assert metrics.counters["quick_hits"] == 0 and metrics.counters["bytes_read"] == size
+
+
+def test_deep_verify_catches_edit_hidden_from_large_fingerprint(share):
+    source, dest = share
+    trusting = {"hashing": {"quick_fingerprint": True, "quick_trust_large": True}}
+    data = bytearray(os.urandom(2 * 1024 * 1024))
+    write(source / "model.cdw", bytes(data))
+    sync(source, dest, trusting)
+
+    data[300_000:300_016] = b"X" * 16  # вне участков отпечатка, размер тот же
+    (source / "model.cdw").write_bytes(bytes(data))
+    _bump_mtime(source / "model.cdw")
+    _, stats = sync(source, dest, trusting)
+    assert stats["modified"] == 0  # цена доверия: правку видит только --deep-verify
+
+    _, stats = sync(source, dest, trusting, deep_verify=True)
+    assert stats["modified"] == 1
+    assert (dest / source.name / "model.cdw").read_bytes() == bytes(data)
+
+
+def test_fingerprint_taken_while_hashing_changed_file(share):
+    source, dest = share
+    write(source / "part.stc", b"a" * 5000)
+    sync(source, dest)  # отпечатков ещё нет
+
+    write(source / "part.stc", b"b" * 5000)
+    _bump_mtime(source / "part.stc")
+    metrics = SourceMetrics(source.name)
+    _, stats = sync(source, dest, QUICK, metrics=metrics)
+
+    assert stats["modified"] == 1
+    assert metrics.counters["bytes_read"] == 10000  # хеш с отпечатком + копирование, без третьего чтения
+    assert db_rows("SELECT quick FROM file_cache") == [(hashing.quick_fingerprint(source / "part.stc", 5000),)]
@@ -0,0 +1,68 @@
+# tests/test_sync_core.py
+import threading
+import time
+from app import database
+from app.sync_core import SyncRun
+from app.smb_utils import sync_folder
+from conftest import db_rows, write
+
+
+def test_runs_keep_own_settings(share):
+    source, dest = share
+    write(source / "a.txt", b"content")
+    blake = SyncRun({"hashing": {"algorithm": "blake2b"}, "copy": {"resume_mb": 0}})
+    default = SyncRun({})
+
+    # Второй запуск не переписывает настройки первого
+    assert blake.stages["hashing"]["algorithm"] == "blake2b"
+    assert blake.stages["copy"]["resume_mb"] == 0
+    assert default.stages["hashing"]["algorithm"] == "sha256"
+
+    sync_folder(source.name, str(source), [str(dest)], "", settings=blake.stages)
+    assert db_rows("SELECT algo FROM file_cache") == [("blake2b",)]
+
+
+def test_close_writer_waits_for_other_runs(workdir):
+    with database.writer_session() as writer:
+        database.close_writer()  # другой запуск закончился раньше
+        assert not writer.closed
+        assert database.get_writer() is writer
+    assert writer.closed
+
+
+def test_stalled_source_does_not_block_report(workdir, monkeypatch):
+    from app import smb_utils
+    ok, stuck, dest = workdir / "share" / "ok", workdir / "share" / "stuck", workdir / "dest"
+    write(ok / "a.txt", b"ok")
+    write(stuck / "b.txt", b"stuck")
+    release = threading.Event()
+    real_sync = smb_utils.sync_folder
+
+    def sync_folder(name, *args, **kwargs):
+        if name == "stuck":
+            release.wait(30)  # чтение по SMB зависло
+            return 0, {}
+        return real_sync(name, *args, **kwargs)
+    monkeypatch.setattr(smb_utils, "sync_folder", sync_folder)
+
+    run = SyncRun({
+        "destination": {"paths": [str(dest)]},
+        "run": {"source_timeout_sec": 0.5},
+        "sources": [
+            {"name": "ok", "path": str(ok), "buro": "БП"},
+            {"name": "stuck", "path": str(stuck), "buro": "БП", "timeout_sec": 0.3},
+        ],
+    })
+    started = time.monotonic()
+    try:
+        report = run.run()
+    finally:
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "sync-stuck":
+                thread.join(5)
+
+    assert time.monotonic() - started < 10
+    assert report is not None and report.exists()
+    assert run.completed == {"ok"} and run.given_up == {"stuck"}
+    assert (dest / "ok" / "a.txt").read_bytes() == b"ok"